@@ -0,0 +1,183 @@
+import datetime
+import json
+
+from flask import Blueprint, abort, current_app, g, request
+
+from models import Venue, Artist
+from queries import VENUE_AREA_FIELDS, venue_areas
+from versions import (
+    conditional,
+    venue_version,
+    artist_version,
+    venues_version,
+    artists_version,
+    shows_version,
+)
+from view_data import (
+    venue_detail,
+    artist_detail,
+    search_results,
+    artist_list,
+    show_list,
+    show_fields,
+    calendar_args,
+    show_calendar,
+    browse_args,
+    browse,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+def _default(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError(value)
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=_default, separators=(",", ":"))
+
+
+def json_response(data, status=200):
+    return current_app.response_class(
+        dumps(data), status=status, mimetype="application/json"
+    )
+
+
+def requested_fields():
+    fields = request.args.get("fields")
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(",") if name.strip()}
+
+
+def project(items, fields):
+    # Dicts of the wanted keys; items may be dicts or result rows.
+    items = [getattr(item, "_mapping", item) for item in items]
+    if fields is None:
+        return [dict(item) for item in items]
+    return [{k: v for k, v in item.items() if k in fields} for item in items]
+
+
+def cursors(page):
+    return {"next": page.next_cursor, "prev": page.prev_cursor}
+
+
+@api.before_request
+def read_from_replica():
+    # Every API route is a read.
+    if request.method == "GET":
+        g.read_replica = True
+
+
+# Registered per code: the app's own 404 / 500 page handlers would otherwise
+# take precedence over a blueprint handler for HTTPException.
+@api.errorhandler(400)
+@api.errorhandler(404)
+@api.errorhandler(500)
+def http_error(error):
+    return json_response({"error": error.description}, error.code)
+
+
+@api.route("/venues")
+@conditional(venues_version)
+def venues():
+    fields = requested_fields()
+    areas = venue_areas(genre=request.args.get("genre"))
+    for area in areas:
+        area["venues"] = project(
+            area["venues"],
+            [name for name in VENUE_AREA_FIELDS if not fields or name in fields],
+        )
+    return json_response({"areas": areas})
+
+
+@api.route("/venues/search")
+def search_venues():
+    response, page = search_results(Venue, request.args.get("search_term", ""))
+    if page is not None:
+        response["cursors"] = cursors(page)
+    return json_response(response)
+
+
+@api.route("/venues/browse")
+def browse_venues():
+    response, page = browse(Venue, browse_args())
+    response["cursors"] = cursors(page)
+    return json_response(response)
+
+
+def _detail(detail):
+    if detail is None:
+        abort(404)
+    response, upcoming, past = detail
+    # upcoming_after / past_after continue each list where this page ends.
+    if upcoming is not None:
+        response["cursors"] = {
+            "upcoming_after": upcoming.next_cursor,
+            "past_after": past.next_cursor,
+        }
+    return json_response(response)
+
+
+@api.route("/venues/<int:venue_id>")
+@conditional(venue_version)
+def venue(venue_id):
+    return _detail(venue_detail(venue_id, requested_fields()))
+
+
+@api.route("/artists")
+@conditional(artists_version)
+def artists():
+    artists, page = artist_list(request.args.get("genre"))
+    return json_response(
+        {"data": project(artists, requested_fields()), "cursors": cursors(page)}
+    )
+
+
+@api.route("/artists/search")
+def search_artists():
+    response, page = search_results(Artist, request.args.get("search_term", ""))
+    if page is not None:
+        response["cursors"] = cursors(page)
+    return json_response(response)
+
+
+@api.route("/artists/browse")
+def browse_artists():
+    response, page = browse(Artist, browse_args())
+    response["cursors"] = cursors(page)
+    return json_response(response)
+
+
+@api.route("/artists/<int:artist_id>")
+@conditional(artist_version)
+def artist(artist_id):
+    return _detail(artist_detail(artist_id, requested_fields()))
+
+
+@api.route("/shows")
+@conditional(shows_version)
+def shows():
+    fields = requested_fields()
+    shows, page = show_list(fields)
+    return json_response(
+        {"data": project(shows, show_fields(fields)), "cursors": cursors(page)}
+    )
+
+
+@api.route("/shows/calendar")
+def calendar():
+    fields = requested_fields()
+    response, page = show_calendar(*calendar_args(), fields=fields)
+    response["shows"] = project(response["shows"], show_fields(fields))
+    response["cursors"] = cursors(page)
+    return json_response(response)
@@ -3,8 +3,10 @@
 # ----------------------------------------------------------------------------#
 
 import json
+import functools
 import dateutil.parser
 import babel
+import babel.dates
 from flask import (
     Flask,
     render_template,
@@ -14,6 +16,8 @@ from flask import (
     redirect,
     url_for,
     abort,
+    stream_template,
+    stream_with_context,
 )
 from flask_moment import Moment
 import logging
@@ -22,9 +26,51 @@ from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
 from sqlalchemy import func
-from sqlalchemy.orm import load_only
 import datetime
 from models import *
+from queries import venue_areas, iter_shows
+from view_data import (
+    venue_detail,
+    artist_detail,
+    search_results,
+    artist_list,
+    show_list,
+    calendar_args,
+    show_calendar,
+    browse_args,
+    browse,
+)
+from pagination import page_url, facet_url, buffered
+from pool import init_pool
+from replicas import init_replicas, replica_reads
+from name_index import init_name_index
+from facets import init_facets
+from counters import init_counters
+from profiling import init_profiling
+from plans import init_plans
+from importer import init_importer
+from rollups import init_rollups
+from cards import init_cards
+from bookings import (
+    init_bookings,
+    booking_conflicts,
+    show_end,
+    DEFAULT_SHOW_MINUTES,
+    MAX_SHOW_MINUTES,
+)
+from synthetic import init_synthetic
+from exports import export_response
+from api import api
+from cache import ResponseCache
+from versions import (
+    conditional,
+    init_versions,
+    venue_version,
+    artist_version,
+    venues_version,
+    artists_version,
+    shows_version,
+)
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -33,23 +79,56 @@ from models import *
 app = Flask(__name__)
 moment = Moment(app)
 setup_db(app)
+init_pool(app)
+init_replicas(app)
 migrate = Migrate(app, db)
+init_name_index(app)
+init_facets(app)
+init_versions(app)
+init_counters(app)
+init_profiling(app)
+init_plans(app)
+init_importer(app)
+init_rollups(app)
+init_cards(app)
+init_bookings(app)
+init_synthetic(app)
+response_cache = ResponseCache(app)
+app.register_blueprint(api)
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format="medium"):
-    date = dateutil.parser.parse(value)
-    if format == "full":
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == "medium":
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale="en")
+DATETIME_FORMATS = {
+    "full": "EEEE MMMM, d, y 'at' h:mma",
+    "medium": "EE MM, dd, y h:mma",
+}
+
+
+@functools.lru_cache(maxsize=32)
+def compiled_datetime_format(format, locale):
+    return babel.dates.parse_pattern(format), babel.Locale.parse(locale)
+
+
+def format_datetime(value, format="medium", locale="en"):
+    # Views pass datetimes straight from the database; strings are still
+    # accepted and parsed for callers that have not been converted.
+    if not isinstance(value, datetime.datetime):
+        value = dateutil.parser.parse(value)
+    if value.tzinfo is None:
+        # babel.dates.format_datetime treats naive values as UTC.
+        value = value.replace(tzinfo=babel.dates.UTC)
+    pattern, locale = compiled_datetime_format(
+        DATETIME_FORMATS.get(format, format), locale
+    )
+    return pattern.apply(value, locale)
 
 
 app.jinja_env.filters["datetime"] = format_datetime
+app.jinja_env.globals["page_url"] = page_url
+app.jinja_env.globals["facet_url"] = facet_url
 
 # ----------------------------------------------------------------------------#
 # Controllers.
@@ -66,108 +145,53 @@ def index():
 
 
 @app.route("/venues")
+@replica_reads
+@conditional(venues_version)
+@response_cache.cached("venues")
 def venues():
-    distinct_location = Venue.query.distinct(Venue.city, Venue.state).all()
-    formatted_venues = []
-
-    for location in distinct_location:
-        venues_with_location = Venue.query.filter_by(
-            state=location.state, city=location.city
-        ).all()
-        venue_data = []
-        for venue in venues_with_location:
-            venue_data.append(
-                {
-                    "id": venue.id,
-                    "name": venue.name,
-                    "num_upcoming_shows": len(
-                        Show.query.filter(
-                            Show.start_time > datetime.datetime.now(),
-                            Show.venue_id == venue.id,
-                        ).all()
-                    ),
-                }
-            )
-        formatted_venues.append(
-            {"city": location.city, "state": location.state, "venues": venue_data}
-        )
-
-    return render_template("pages/venues.html", areas=formatted_venues)
+    genre = request.args.get("genre")
+    return render_template(
+        "pages/venues.html", areas=venue_areas(genre=genre), genre=genre
+    )
 
 
-@app.route("/venues/search", methods=["POST"])
+@app.route("/venues/search", methods=["GET", "POST"])
+@replica_reads
 def search_venues():
-    search_term = request.form.get("search_term", "")
-    search_results = []
-    if len(search_term) > 0:
-        search_results = (
-            Venue.query.order_by(Venue.id)
-            .filter(Venue.name.ilike("%{}%".format(search_term)))
-            .options(load_only(*["id", "name"]))
-            .all()
-        )
-
-    response = {"count": len(search_results), "data": []}
-    for venue in search_results:
-        response["data"].append(
-            {
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": len(
-                    Show.query.filter(
-                        Show.start_time > datetime.datetime.now(),
-                        Show.venue_id == venue.id,
-                    ).all()
-                ),
-            }
-        )
+    search_term = request.values.get("search_term", "")
+    response, page = search_results(Venue, search_term)
     return render_template(
         "pages/search_venues.html",
         results=response,
-        search_term=request.form.get("search_term", ""),
+        search_term=search_term,
+        page=page,
+    )
+
+
+@app.route("/venues/browse")
+@replica_reads
+def browse_venues():
+    response, page = browse(Venue, browse_args())
+    return render_template(
+        "pages/browse.html", kind="venues", results=response, page=page
     )
 
 
 @app.route("/venues/<int:venue_id>")
+@replica_reads
+@conditional(venue_version)
+@response_cache.cached("venue:{venue_id}")
 def show_venue(venue_id):
-    venue = Venue.query.filter(Venue.id == venue_id).one_or_none()
-    if venue is None:
+    detail = venue_detail(venue_id)
+    if detail is None:
         abort(404)
-
-    response = {
-        "id": venue.id,
-        "name": venue.name,
-        "genres": venue.genres.split(":"),
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.seeking_talent,
-        "seeking_description": venue.seeking_description,
-        "image_link": venue.image_link,
-        "past_shows": [],
-        "upcoming_shows": [],
-        "past_shows_count": 0,
-        "upcoming_shows_count": 0,
-    }
-
-    shows_at_venue = Show.query.join(Artist).filter(Show.venue_id == venue_id).all()
-    for show in shows_at_venue:
-        show_info = {
-            "artist_id": show.artist.id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": str(show.start_time),
-        }
-        if show.start_time > datetime.datetime.now():
-            response["upcoming_shows"].append(show_info)
-            response["upcoming_shows_count"] += 1
-        else:
-            response["past_shows"].append(show_info)
-            response["past_shows_count"] += 1
-    return render_template("pages/show_venue.html", venue=response)
+    response, upcoming, past = detail
+    return render_template(
+        "pages/show_venue.html",
+        venue=response,
+        upcoming_page=upcoming,
+        past_page=past,
+    )
 
 
 #  Create Venue
@@ -190,7 +214,7 @@ def create_venue_submission():
         state = request.form["state"]
         address = request.form["address"]
         phone = request.form["phone"]
-        genres = ":".join(request.form.getlist("genres"))
+        genres = request.form.getlist("genres")
         facebook_link = request.form["facebook_link"]
     except KeyError as e:
         error = True
@@ -205,7 +229,7 @@ def create_venue_submission():
             state=state,
             address=address,
             phone=phone,
-            genres=genres,
+            genres=Genre.get_or_create(genres),
             facebook_link=facebook_link,
         )
         db.session.add(new_venue)
@@ -219,6 +243,7 @@ def create_venue_submission():
         db.session.close()
 
     if not error:
+        response_cache.purge("venues")
         flash("Venue " + name + " was successfully listed!")
         return render_template("pages/home.html")
     else:
@@ -234,6 +259,7 @@ def delete_venue(venue_id):
 
         venue.delete()
         db.session.commit()
+        response_cache.purge("venue:{}".format(venue_id), "venues", "shows")
         flash("Venue: " + venue.name + " was successfully deleted.")
     except Exception as e:
         db.session.rollback()
@@ -247,86 +273,54 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route("/artists")
+@replica_reads
+@conditional(artists_version)
+@response_cache.cached("artists")
 def artists():
-    formatted_artist = []
-    artists = Artist.query.options(load_only(*["id", "name"])).all()
-    for artist in artists:
-        formatted_artist.append({"id": artist.id, "name": artist.name})
-    return render_template("pages/artists.html", artists=formatted_artist)
+    genre = request.args.get("genre")
+    formatted_artist, page = artist_list(genre)
+    return render_template(
+        "pages/artists.html", artists=formatted_artist, genre=genre, page=page
+    )
 
 
-@app.route("/artists/search", methods=["POST"])
+@app.route("/artists/search", methods=["GET", "POST"])
+@replica_reads
 def search_artists():
-    search_term = request.form.get("search_term", "")
-    search_results = []
-    if len(search_term) > 0:
-        search_results = (
-            Artist.query.order_by(Artist.id)
-            .filter(Artist.name.ilike("%{}%".format(search_term)))
-            .options(load_only(*["id", "name"]))
-            .all()
-        )
-
-    response = {"count": len(search_results), "data": []}
-    for artist in search_results:
-        response["data"].append(
-            {
-                "id": artist.id,
-                "name": artist.name,
-                "num_upcoming_shows": len(
-                    Show.query.filter(
-                        Show.start_time > datetime.datetime.now(),
-                        Show.artist_id == artist.id,
-                    ).all()
-                ),
-            }
-        )
+    search_term = request.values.get("search_term", "")
+    response, page = search_results(Artist, search_term)
     return render_template(
         "pages/search_artists.html",
         results=response,
-        search_term=request.form.get("search_term", ""),
+        search_term=search_term,
+        page=page,
+    )
+
+
+@app.route("/artists/browse")
+@replica_reads
+def browse_artists():
+    response, page = browse(Artist, browse_args())
+    return render_template(
+        "pages/browse.html", kind="artists", results=response, page=page
     )
 
 
 @app.route("/artists/<int:artist_id>")
+@replica_reads
+@conditional(artist_version)
+@response_cache.cached("artist:{artist_id}")
 def show_artist(artist_id):
-    artist = Artist.query.filter(Artist.id == artist_id).one_or_none()
-    if artist is None:
+    detail = artist_detail(artist_id)
+    if detail is None:
         abort(404)
-
-    response = {
-        "id": artist.id,
-        "name": artist.name,
-        "genres": artist.genres.split(":"),
-        "city": artist.city,
-        "state": artist.state,
-        "phone": artist.phone,
-        "website": artist.website,
-        "facebook_link": artist.facebook_link,
-        "seeking_venue": artist.seeking_venue,
-        "seeking_description": artist.seeking_description,
-        "image_link": artist.image_link,
-        "past_shows": [],
-        "upcoming_shows": [],
-        "past_shows_count": 0,
-        "upcoming_shows_count": 0,
-    }
-
-    shows_of_artist = Show.query.join(Venue).filter(Show.artist_id == artist_id).all()
-    for show in shows_of_artist:
-        show_info = {
-            "venue_id": show.venue.id,
-            "venue_name": show.venue.name,
-            "venue_image_link": show.venue.image_link,
-            "start_time": str(show.start_time),
-        }
-        if show.start_time > datetime.datetime.now():
-            response["upcoming_shows"].append(show_info)
-            response["upcoming_shows_count"] += 1
-        else:
-            response["past_shows"].append(show_info)
-            response["past_shows_count"] += 1
-    return render_template("pages/show_artist.html", artist=response)
+    response, upcoming, past = detail
+    return render_template(
+        "pages/show_artist.html",
+        artist=response,
+        upcoming_page=upcoming,
+        past_page=past,
+    )
 
 
 #  Update
@@ -339,7 +333,7 @@ def edit_artist(artist_id):
         abort(404)
 
     form.name.data = artist.name
-    form.genres.data = artist.genres.split(":")
+    form.genres.data = [genre.name for genre in artist.genres]
     form.city.data = artist.city
     form.state.data = artist.state
     form.phone.data = artist.phone
@@ -366,7 +360,7 @@ def edit_artist_submission(artist_id):
         city = request.form["city"]
         state = request.form["state"]
         phone = request.form["phone"]
-        genres = ":".join(request.form.getlist("genres"))
+        genres = request.form.getlist("genres")
         facebook_link = request.form["facebook_link"]
         image_link = request.form["image_link"]
         website = request.form["website"]
@@ -383,7 +377,7 @@ def edit_artist_submission(artist_id):
         artist.city = city
         artist.state = state
         artist.phone = phone
-        artist.genres = genres
+        artist.genres = Genre.get_or_create(genres)
         artist.facebook_link = facebook_link
         artist.website = website
         artist.seeking_venue = seeking_venue
@@ -399,6 +393,7 @@ def edit_artist_submission(artist_id):
         db.session.close()
 
     if not error:
+        response_cache.purge("artist:{}".format(artist_id), "artists")
         flash("Artist " + name + " was successfully Updated!")
         return redirect(url_for("show_artist", artist_id=artist_id))
     else:
@@ -413,7 +408,7 @@ def edit_venue(venue_id):
         abort(404)
 
     form.name.data = venue.name
-    form.genres.data = venue.genres.split(":")
+    form.genres.data = [genre.name for genre in venue.genres]
     form.address.data = venue.address
     form.city.data = venue.city
     form.state.data = venue.state
@@ -442,7 +437,7 @@ def edit_venue_submission(venue_id):
         state = request.form["state"]
         address = request.form["address"]
         phone = request.form["phone"]
-        genres = ":".join(request.form.getlist("genres"))
+        genres = request.form.getlist("genres")
         facebook_link = request.form["facebook_link"]
         image_link = request.form["image_link"]
         website = request.form["website"]
@@ -460,7 +455,7 @@ def edit_venue_submission(venue_id):
         venue.state = state
         venue.address = address
         venue.phone = phone
-        venue.genres = genres
+        venue.genres = Genre.get_or_create(genres)
         venue.facebook_link = facebook_link
         venue.website = website
         venue.seeking_talent = seeking_talent
@@ -476,6 +471,7 @@ def edit_venue_submission(venue_id):
         db.session.close()
 
     if not error:
+        response_cache.purge("venue:{}".format(venue_id), "venues")
         flash("Venue " + name + " was successfully updated!")
         return redirect(url_for("show_venue", venue_id=venue_id))
     else:
@@ -501,7 +497,7 @@ def create_artist_submission():
         city = request.form["city"]
         state = request.form["state"]
         phone = request.form["phone"]
-        genres = ":".join(request.form.getlist("genres"))
+        genres = request.form.getlist("genres")
         facebook_link = request.form["facebook_link"]
     except KeyError as e:
         error = True
@@ -515,7 +511,7 @@ def create_artist_submission():
             city=city,
             state=state,
             phone=phone,
-            genres=genres,
+            genres=Genre.get_or_create(genres),
             facebook_link=facebook_link,
         )
         db.session.add(new_artist)
@@ -529,6 +525,7 @@ def create_artist_submission():
         db.session.close()
 
     if not error:
+        response_cache.purge("artists")
         flash("Artist " + name + " was successfully listed!")
         return render_template("pages/home.html")
     else:
@@ -540,20 +537,35 @@ def create_artist_submission():
 
 
 @app.route("/shows")
+@replica_reads
+@conditional(shows_version)
+@response_cache.cached("shows")
 def shows():
-    response = []
-    shows = Show.query.join(Artist).join(Venue).order_by(Show.venue_id).all()
-    for show in shows:
-        show_info = {
-            "venue_id": show.venue.id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist.id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": str(show.start_time),
-        }
-        response.append(show_info)
-    return render_template("pages/shows.html", shows=response)
+    if request.args.get("all"):
+        # Full listing for exports: stream the page while the cursor is
+        # read instead of building every show before rendering.
+        return Response(
+            stream_with_context(
+                buffered(stream_template("pages/shows.html", shows=iter_shows()))
+            )
+        )
+
+    response, page = show_list()
+    return render_template("pages/shows.html", shows=response, page=page)
+
+
+@app.route("/shows/calendar")
+@replica_reads
+def show_calendar_page():
+    start, end, bucket, city, state = calendar_args()
+    response, page = show_calendar(start, end, bucket, city, state)
+    return render_template(
+        "pages/calendar.html",
+        calendar=response,
+        city=city or "",
+        state=state or "",
+        page=page,
+    )
 
 
 @app.route("/shows/create")
@@ -569,12 +581,19 @@ def create_show_submission():
         print(request.form)
         artist_id = int(request.form["artist_id"])
         venue_id = int(request.form["venue_id"])
-        start_time = request.form["start_time"]
+        start_time = dateutil.parser.parse(request.form["start_time"])
+        duration = int(request.form.get("duration") or DEFAULT_SHOW_MINUTES)
     except KeyError as e:
         error = True
         flash("Incomplete input. Artist could not be listed.")
         print(e)
         abort(500)
+    except (ValueError, OverflowError):
+        flash("Invalid start time or duration. Show could not be listed.")
+        return render_template("forms/new_show.html", form=ShowForm()), 400
+    if not 1 <= duration <= MAX_SHOW_MINUTES:
+        flash("A show lasts 1 to {} minutes.".format(MAX_SHOW_MINUTES))
+        return render_template("forms/new_show.html", form=ShowForm()), 400
 
     # verify if artist and venue exits with input ids
     if not error:
@@ -582,9 +601,30 @@ def create_show_submission():
         artist = Artist.query.filter(Artist.id == artist_id).one_or_none()
         if venue is None or artist is None:
             abort(404)
+
+    conflicts = booking_conflicts(venue_id, artist_id, start_time, duration)
+    if conflicts["venue"] or conflicts["artist"]:
+        for side, shows in conflicts.items():
+            for show in shows:
+                flash(
+                    "The {} is already booked from {:%Y-%m-%d %H:%M} to "
+                    "{:%H:%M} (show {}).".format(
+                        side,
+                        show.start_time,
+                        show_end(show.start_time, show.duration),
+                        show.id,
+                    )
+                )
+        return render_template("forms/new_show.html", form=ShowForm()), 409
+
     # insert a new show to db
     try:
-        new_show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
+        new_show = Show(
+            artist_id=artist_id,
+            venue_id=venue_id,
+            start_time=start_time,
+            duration=duration,
+        )
         db.session.add(new_show)
         db.session.commit()
     except Exception as e:
@@ -596,12 +636,28 @@ def create_show_submission():
         db.session.close()
 
     if not error:
+        response_cache.purge(
+            "shows",
+            "venues",
+            "venue:{}".format(venue_id),
+            "artist:{}".format(artist_id),
+        )
         flash("Show was successfully listed!")
         return render_template("pages/home.html")
     else:
         render_template("errors/500.html")
 
 
+#  Export
+#  ----------------------------------------------------------------
+
+
+@app.route("/export/<any(shows, venues, artists):kind>.<any(ndjson, csv):format>")
+@replica_reads
+def export(kind, format):
+    return export_response(kind, format)
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template("errors/404.html"), 404
@@ -0,0 +1,163 @@
+"""Measure faceted browse: in-process bitset index vs. grouped SQL counts.
+
+Writes into the database named by DATABASE_URL when it is empty, so point
+it at a scratch database; an empty one is migrated and filled by
+synthetic.generate:
+
+    DATABASE_URL=sqlite:////tmp/fyyur_facets.db \
+        python benchmarks/facet_browse.py --shows 1000000
+"""
+
+import argparse
+import datetime
+import math
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import func  # noqa: E402
+
+from app import app  # noqa: E402
+from facets import FACETED, build_facet_index  # noqa: E402
+from models import db, Genre, Show, Venue, Artist  # noqa: E402
+from synthetic import create_schema, generate  # noqa: E402
+
+
+def selections(index, count, seed):
+    # One to three facets per request, values picked the way users land on
+    # them: from the facets of an existing row.
+    rnd = random.Random(seed)
+    ids = list(index.rows)
+    result = []
+    for _ in range(count):
+        state, city, genres, seeking, _ = index.rows[rnd.choice(ids)]
+        options = {
+            "state": {state},
+            "city": {city},
+            "genre": {rnd.choice(genres)} if genres else set(),
+            "seeking": seeking,
+            "upcoming": rnd.random() < 0.5,
+        }
+        picked = rnd.sample(sorted(options), rnd.randint(1, 3))
+        result.append({facet: options[facet] for facet in picked})
+    return result
+
+
+def sql_browse(model, selected):
+    # The same answer from the tables: the match count, and per facet a
+    # GROUP BY with every other facet's filter applied.
+    association, fk, show_fk, seeking = FACETED[model]
+    now = datetime.datetime.now()
+    upcoming = db.session.query(show_fk).filter(Show.start_time > now).scalar_subquery()
+    genre_ids = db.session.query(fk).join(Genre, Genre.id == association.c.genre_id)
+
+    def filters(skip=None):
+        for facet, value in selected.items():
+            if facet == skip:
+                continue
+            if facet in ("state", "city"):
+                yield getattr(model, facet).in_(value)
+            elif facet == "genre":
+                yield model.id.in_(genre_ids.filter(Genre.name.in_(value)))
+            elif facet == "seeking":
+                yield seeking == value
+            else:
+                yield model.id.in_(upcoming) if value else ~model.id.in_(upcoming)
+
+    total = db.session.query(func.count(model.id)).filter(*filters()).scalar()
+    counts = {}
+    for facet in ("state", "city"):
+        column = getattr(model, facet)
+        counts[facet] = dict(
+            db.session.query(column, func.count())
+            .filter(*filters(facet))
+            .group_by(column)
+        )
+    counts["genre"] = dict(
+        db.session.query(Genre.name, func.count())
+        .select_from(model)
+        .join(association, fk == model.id)
+        .join(Genre, Genre.id == association.c.genre_id)
+        .filter(*filters("genre"))
+        .group_by(Genre.name)
+    )
+    for facet, column in (("seeking", seeking), ("upcoming", model.id.in_(upcoming))):
+        counts[facet] = dict(
+            db.session.query(column, func.count())
+            .filter(*filters(facet))
+            .group_by(column)
+        )
+    return total, counts
+
+
+def percentiles(timings):
+    timings.sort()
+    return statistics.median(timings), timings[math.ceil(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shows", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--sql-requests", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with app.app_context():
+        create_schema()
+        if db.session.query(Show.id).first() is None:
+            started = time.perf_counter()
+            generate(args.shows, args.seed)
+            print(
+                "generated {} shows in {:.1f}s".format(
+                    args.shows, time.perf_counter() - started
+                )
+            )
+
+        for model in (Venue, Artist):
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            started = time.perf_counter()
+            index = build_facet_index(model)
+            print(
+                "{:8} {} rows, built in {:.2f}s, peak RSS +{:.1f} MB".format(
+                    model.__tablename__,
+                    len(index),
+                    time.perf_counter() - started,
+                    (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1024,
+                )
+            )
+
+            requests = selections(index, args.requests, args.seed)
+            timings, matched = [], 0
+            for selected in requests:
+                started = time.perf_counter()
+                matches, counts = index.search(selected, datetime.datetime.now())
+                timings.append((time.perf_counter() - started) * 1e6)
+                matched += matches.bit_count()
+            print(
+                "{:8} bitsets  p50 {:10.1f} us  p95 {:10.1f} us  ({:.0f} matches "
+                "per request)".format(
+                    "", *percentiles(timings), matched / len(requests)
+                )
+            )
+
+            timings = []
+            for selected in requests[: args.sql_requests]:
+                started = time.perf_counter()
+                sql_browse(model, selected)
+                timings.append((time.perf_counter() - started) * 1e6)
+            print(
+                "{:8} SQL      p50 {:10.1f} us  p95 {:10.1f} us".format(
+                    "", *percentiles(timings)
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Per-call cost of the `datetime` template filter.
+
+python benchmarks/format_datetime.py
+"""
+
+import datetime
+import os
+import sys
+import timeit
+
+import babel.dates
+import dateutil.parser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import format_datetime  # noqa: E402
+
+
+def legacy_format_datetime(value, format="medium"):
+    # The filter as it was before patterns were cached: every call re-parses
+    # the string and the babel pattern.
+    date = dateutil.parser.parse(value)
+    if format == "full":
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == "medium":
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale="en")
+
+
+def main():
+    value = datetime.datetime(2035, 4, 1, 20, 0)
+    text = str(value)
+    assert format_datetime(value, "full") == legacy_format_datetime(text, "full")
+    assert format_datetime(value) == legacy_format_datetime(text)
+
+    cases = (
+        ("legacy, str input", lambda: legacy_format_datetime(text, "full")),
+        ("cached, str input", lambda: format_datetime(text, "full")),
+        ("cached, datetime input", lambda: format_datetime(value, "full")),
+    )
+    number = 20000
+    for name, call in cases:
+        best = min(timeit.repeat(call, number=number, repeat=5))
+        print("{:24} {:8.2f} us/call".format(name, best / number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
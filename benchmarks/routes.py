@@ -0,0 +1,272 @@
+"""Time every GET route end to end against a generated dataset.
+
+Writes into the database named by DATABASE_URL, so point it at a scratch
+database; an empty one is migrated and filled by synthetic.generate:
+
+    DATABASE_URL=sqlite:////tmp/fyyur_routes.db \
+        python benchmarks/routes.py --shows 100000 --output before.json
+
+and after a change, against the same database:
+
+    DATABASE_URL=sqlite:////tmp/fyyur_routes.db \
+        python benchmarks/routes.py --shows 100000 --compare before.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, Venue, Artist, Show  # noqa: E402
+from synthetic import create_schema, generate  # noqa: E402
+
+SKIPPED = {"static", "profile_page"}
+
+# Extra query strings per route, measured as separate entries.
+VARIANTS = {
+    "/venues": ["?genre=Jazz"],
+    "/artists": ["?genre=Jazz"],
+    "/shows": ["?all=1"],
+    "/shows/calendar": ["?bucket=week", "?city=Austin&state=TX"],
+    "/venues/browse": ["?genre=Jazz&upcoming=1", "?state=TX&city=Austin"],
+    "/artists/browse": ["?genre=Jazz&seeking=1"],
+    "/venues/search": ["?search_term=moon", "?search_term=the"],
+    "/artists/search": ["?search_term=moon", "?search_term=the"],
+    "/api/v1/venues": ["?fields=id,name"],
+    "/api/v1/venues/search": ["?search_term=moon"],
+    "/api/v1/venues/browse": ["?genre=Jazz&genre=Rock&upcoming=0"],
+    "/api/v1/artists/search": ["?search_term=moon"],
+    "/api/v1/shows": ["?fields=start_time,venue_id"],
+    "/api/v1/shows/calendar": ["?bucket=week&from=2020-01-01&to=2020-12-31"],
+}
+
+
+def prepare(shows, seed):
+    # Returns the (venue_id, artist_id) the detail routes are measured with:
+    # the busiest of each, which has the most shows to page through.
+    create_schema()
+    have = db.session.query(db.func.count(Show.id)).scalar()
+    if have == 0:
+        started = time.perf_counter()
+        generate(shows, seed)
+        print(
+            "generated {} shows in {:.1f}s".format(shows, time.perf_counter() - started)
+        )
+    elif have != shows:
+        sys.exit(
+            "database has {} shows, not {}; use an empty database".format(have, shows)
+        )
+    busiest = []
+    for column in (Show.venue_id, Show.artist_id):
+        busiest.append(
+            db.session.query(column)
+            .group_by(column)
+            .order_by(db.func.count().desc(), column)
+            .limit(1)
+            .scalar()
+        )
+    return busiest
+
+
+def urls(venue_id, artist_id):
+    arguments = {
+        "venue_id": venue_id,
+        "artist_id": artist_id,
+        "kind": ["venues", "artists", "shows"],
+        "format": ["ndjson", "csv"],
+    }
+    found = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if "GET" not in rule.methods or rule.endpoint in SKIPPED:
+            continue
+        combinations = [{}]
+        for name in rule.arguments:
+            values = arguments[name]
+            if not isinstance(values, list):
+                values = [values]
+            combinations = [
+                dict(combination, **{name: value})
+                for combination in combinations
+                for value in values
+            ]
+        for values in combinations:
+            path = rule.build(values)[1]
+            found.append(path)
+            found.extend(path + query for query in VARIANTS.get(rule.rule, []))
+    return found
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def fetch(client, url):
+    # Reads the whole body so streamed routes are timed to the last byte.
+    response = client.get(url)
+    size = len(response.get_data())
+    status = response.status_code
+    response.close()
+    return status, size
+
+
+def measure(client, counter, url, warmup, repeat):
+    for _ in range(warmup):
+        fetch(client, url)
+    timings = []
+    counter.count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        status, size = fetch(client, url)
+        timings.append((time.perf_counter() - started) * 1000)
+    queries = counter.count / repeat
+
+    tracemalloc.start()
+    fetch(client, url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "status": status,
+        "bytes": size,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[math.ceil(len(timings) * 0.95) - 1], 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "queries": queries,
+        "peak_alloc_kb": round(peak / 1024, 1),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss /= 1024
+    return round(rss / 1024, 1)
+
+
+def commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def change(old, new):
+    if not old:
+        return ""
+    return "{:+.0f}%".format((new - old) / old * 100)
+
+
+def compare(results, path):
+    with open(path) as f:
+        before = json.load(f)
+    print(
+        "\ncompared with {} ({} shows)".format(
+            before["meta"]["commit"], before["meta"]["shows"]
+        )
+    )
+    for url, stats in results["routes"].items():
+        old = before["routes"].get(url)
+        if old is None:
+            print("{:45} new".format(url))
+            continue
+        print(
+            "{:45} p50 {:>6} p95 {:>6} queries {:>5} -> {:<5} alloc {:>6}".format(
+                url,
+                change(old["p50_ms"], stats["p50_ms"]),
+                change(old["p95_ms"], stats["p95_ms"]),
+                old["queries"],
+                stats["queries"],
+                change(old["peak_alloc_kb"], stats["peak_alloc_kb"]),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--route", action="append", help="Only URLs starting so.")
+    parser.add_argument("--output", help="Write the results as JSON.")
+    parser.add_argument("--compare", help="A previous --output to compare with.")
+    args = parser.parse_args()
+
+    with app.app_context():
+        venue_id, artist_id = prepare(args.shows, args.seed)
+        venues = db.session.query(db.func.count(Venue.id)).scalar()
+        artists = db.session.query(db.func.count(Artist.id)).scalar()
+        dialect = db.engine.dialect.name
+        counter = QueryCounter()
+        event.listen(db.engine, "before_cursor_execute", counter)
+
+    client = app.test_client()
+    results = {
+        "meta": {
+            "commit": commit(),
+            "dialect": dialect,
+            "shows": args.shows,
+            "venues": venues,
+            "artists": artists,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+        },
+        "routes": {},
+    }
+    failed = False
+    for url in urls(venue_id, artist_id):
+        if args.route and not any(url.startswith(prefix) for prefix in args.route):
+            continue
+        stats = measure(client, counter, url, args.warmup, args.repeat)
+        results["routes"][url] = stats
+        failed = failed or stats["status"] != 200
+        print(
+            "{:45} {} p50 {:8.2f} ms  p95 {:8.2f} ms  {:5.1f} queries  "
+            "{:8.1f} KB".format(
+                url,
+                stats["status"],
+                stats["p50_ms"],
+                stats["p95_ms"],
+                stats["queries"],
+                stats["peak_alloc_kb"],
+            )
+        )
+    results["meta"]["peak_rss_mb"] = peak_rss_mb()
+    print("peak RSS {} MB".format(results["meta"]["peak_rss_mb"]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+    if failed:
+        sys.exit("some routes did not return 200")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Measure list-page loading: full ORM entities vs. column rows.
+
+For each list, loads --rows rows three ways and reports, per 10k rows,
+the peak memory while loading, the memory and the tracemalloc blocks still
+held by the result, and the gc-tracked objects it keeps alive:
+
+    orm    full entities, fields copied into dicts (the old list pages)
+    dicts  column rows, each copied into a dict
+    rows   column rows handed on as they are (what view_data returns)
+
+An empty database is migrated and filled by synthetic.generate:
+
+    DATABASE_URL=sqlite:////tmp/fyyur_rows.db \
+        python benchmarks/row_projection.py --shows 100000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import app  # noqa: E402
+from models import db, Venue, Artist, Show, ShowCard  # noqa: E402
+from synthetic import create_schema, generate  # noqa: E402
+from view_data import SHOW_LIST_COLUMNS  # noqa: E402
+
+
+def show_entities(limit):
+    return [
+        {
+            "venue_id": show.venue_id,
+            "venue_name": venue.name,
+            "artist_id": show.artist_id,
+            "artist_name": artist.name,
+            "artist_image_link": artist.image_link,
+            "start_time": show.start_time,
+        }
+        for show, venue, artist in db.session.query(Show, Venue, Artist)
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id)
+        .order_by(Show.start_time, Show.id)
+        .limit(limit)
+    ]
+
+
+def show_rows(limit):
+    return (
+        db.session.query(
+            *[column.label(name) for name, column in SHOW_LIST_COLUMNS.items()],
+            ShowCard.show_id.label("id"),
+        )
+        .order_by(ShowCard.start_time, ShowCard.show_id)
+        .limit(limit)
+        .all()
+    )
+
+
+def venue_entities(limit):
+    return [
+        {
+            "id": venue.id,
+            "name": venue.name,
+            "num_upcoming_shows": venue.upcoming_show_count,
+        }
+        for venue in Venue.query.order_by(Venue.state, Venue.city, Venue.id).limit(
+            limit
+        )
+    ]
+
+
+def venue_rows(limit):
+    return (
+        db.session.query(
+            Venue.id,
+            Venue.name,
+            Venue.city,
+            Venue.state,
+            Venue.upcoming_show_count.label("num_upcoming_shows"),
+        )
+        .order_by(Venue.state, Venue.city, Venue.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def artist_entities(limit):
+    return [
+        {"id": artist.id, "name": artist.name}
+        for artist in Artist.query.order_by(Artist.id).limit(limit)
+    ]
+
+
+def artist_rows(limit):
+    return (
+        db.session.query(Artist.id, Artist.name).order_by(Artist.id).limit(limit).all()
+    )
+
+
+def as_dicts(load):
+    def loader(limit):
+        return [dict(row._mapping) for row in load(limit)]
+
+    return loader
+
+
+LISTS = {
+    "shows": (show_entities, show_rows),
+    "venues": (venue_entities, venue_rows),
+    "artists": (artist_entities, artist_rows),
+}
+
+
+def measure(load, limit):
+    # (rows, seconds, peak bytes, bytes held, blocks held, gc objects held)
+    db.session.remove()
+    load(10)  # compile and cache the statement outside the measurement
+    db.session.remove()
+    gc.collect()
+    objects = len(gc.get_objects())
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = load(limit)
+    elapsed = time.perf_counter() - started
+    snapshot = tracemalloc.take_snapshot()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    gc.collect()
+    tracked = len(gc.get_objects()) - objects
+    return len(result), elapsed, peak, held, blocks, tracked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shows", type=int, default=100000)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with app.app_context():
+        create_schema()
+        if db.session.query(Show.id).first() is None:
+            started = time.perf_counter()
+            generate(args.shows, args.seed)
+            print(
+                "generated {} shows in {:.1f}s".format(
+                    args.shows, time.perf_counter() - started
+                )
+            )
+
+        print(
+            "{:8} {:6} {:>7} {:>10} {:>12} {:>12} {:>12} {:>12}".format(
+                "list",
+                "path",
+                "rows",
+                "time",
+                "peak/10k",
+                "held/10k",
+                "blocks/10k",
+                "gc objs/10k",
+            )
+        )
+        for name, (entities, rows) in LISTS.items():
+            for path, load in (
+                ("orm", entities),
+                ("dicts", as_dicts(rows)),
+                ("rows", rows),
+            ):
+                count, elapsed, peak, held, blocks, tracked = measure(load, args.rows)
+                scale = 10000 / max(count, 1)
+                print(
+                    "{:8} {:6} {:7} {:8.1f}ms {:9.2f} MB {:9.2f} MB {:12.0f} "
+                    "{:12.0f}".format(
+                        name,
+                        path,
+                        count,
+                        elapsed * 1000,
+                        peak * scale / 2**20,
+                        held * scale / 2**20,
+                        blocks * scale,
+                        tracked * scale,
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare name-search latency: sequential ILIKE scan vs. the index backend.
+
+Writes into the database named by DATABASE_URL, so point it at a scratch
+database:
+
+    DATABASE_URL=sqlite:////tmp/fyyur_bench.db \
+        python benchmarks/search_latency.py --rows 100000
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import app  # noqa: E402
+from models import db, Venue, Artist  # noqa: E402
+from search import ScanSearch, auto_backend  # noqa: E402
+from synthetic import create_schema  # noqa: E402
+
+WORDS = (
+    "blue moon park square hop live hall room club jazz rock soul union "
+    "garden station cellar attic loft dust velvet echo harbor lantern "
+    "copper river north south east west grand little old new golden"
+).split()
+
+
+def random_name(rnd):
+    words = [rnd.choice(WORDS).title() for _ in range(rnd.randint(2, 4))]
+    # A rare token per name so selective searches are measured as well as
+    # broad ones that match a large share of the table.
+    words.append("{:05d}".format(rnd.randrange(100000)))
+    return " ".join(words)
+
+
+def seed(rows, rnd, batch_size=5000):
+    for model in (Venue, Artist):
+        have = db.session.query(db.func.count(model.id)).scalar()
+        for start in range(have, rows, batch_size):
+            batch = [
+                {"name": random_name(rnd)} for _ in range(min(batch_size, rows - start))
+            ]
+            db.session.execute(model.__table__.insert(), batch)
+        db.session.commit()
+
+
+def measure(backend, model, terms, repeat):
+    timings = []
+    for _ in range(repeat):
+        for term in terms:
+            started = time.perf_counter()
+            backend.search(model, term)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[math.ceil(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    terms = rnd.sample(WORDS, 4) + ["moon park"]
+    terms += ["{:05d}".format(rnd.randrange(100000)) for _ in range(5)]
+    with app.app_context():
+        create_schema()
+        seed(args.rows, rnd)
+
+        indexed = auto_backend()
+        print("rows per table: {}".format(args.rows))
+        for backend in (ScanSearch(), indexed):
+            for model in (Venue, Artist):
+                p50, p95 = measure(backend, model, terms, args.repeat)
+                print(
+                    "{:8} {:8} p50 {:8.2f} ms  p95 {:8.2f} ms".format(
+                        backend.name, model.__tablename__, p50, p95
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Measure double-booking checks: bounded index range vs. all of a side's shows.
+
+Writes into the database named by DATABASE_URL, so point it at a scratch
+database; an empty one is migrated and filled by synthetic.generate:
+
+    DATABASE_URL=sqlite:////tmp/fyyur_conflicts.db \
+        python benchmarks/show_conflicts.py --shows 1000000
+"""
+
+import argparse
+import datetime
+import math
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import app  # noqa: E402
+from bookings import booking_conflicts, iter_conflicts, show_end  # noqa: E402
+from models import db, Show  # noqa: E402
+from synthetic import create_schema, generate  # noqa: E402
+
+
+def naive_conflicts(venue_id, artist_id, start_time, duration):
+    # Every show of the venue and of the artist, compared in Python.
+    end = show_end(start_time, duration)
+    found = {}
+    for side, column, id in (
+        ("venue", Show.venue_id, venue_id),
+        ("artist", Show.artist_id, artist_id),
+    ):
+        found[side] = [
+            row
+            for row in db.session.query(
+                Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.duration
+            ).filter(column == id)
+            if row.start_time < end
+            and show_end(row.start_time, row.duration) > start_time
+        ]
+    return found
+
+
+def probes(count, seed):
+    # Slots near existing shows, at venues and artists picked the way shows
+    # pick them: busy ones, where a full scan costs the most, come up most.
+    rnd = random.Random(seed)
+    high = db.session.query(db.func.max(Show.id)).scalar()
+    slots = []
+    while len(slots) < count:
+        shows = (
+            db.session.query(Show.venue_id, Show.artist_id, Show.start_time)
+            .filter(Show.id.in_([rnd.randint(1, high), rnd.randint(1, high)]))
+            .all()
+        )
+        if len(shows) < 2:
+            continue
+        slots.append(
+            (
+                shows[0].venue_id,
+                shows[1].artist_id,
+                shows[0].start_time
+                + datetime.timedelta(minutes=15 * rnd.randint(-12, 12)),
+                rnd.choice((60, 90, 120, 180)),
+            )
+        )
+    return slots
+
+
+def measure(check, slots):
+    timings, found = [], 0
+    for slot in slots:
+        started = time.perf_counter()
+        conflicts = check(*slot)
+        timings.append((time.perf_counter() - started) * 1000)
+        found += bool(conflicts["venue"] or conflicts["artist"])
+    timings.sort()
+    return (
+        statistics.median(timings),
+        timings[math.ceil(len(timings) * 0.95) - 1],
+        found,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shows", type=int, default=1000000)
+    parser.add_argument("--probes", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with app.app_context():
+        create_schema()
+        if db.session.query(Show.id).first() is None:
+            started = time.perf_counter()
+            generate(args.shows, args.seed)
+            print(
+                "generated {} shows in {:.1f}s".format(
+                    args.shows, time.perf_counter() - started
+                )
+            )
+        shows = db.session.query(db.func.count(Show.id)).scalar()
+        print("shows: {}".format(shows))
+
+        slots = probes(args.probes, args.seed)
+        for name, check in (("indexed", booking_conflicts), ("naive", naive_conflicts)):
+            p50, p95, found = measure(check, slots)
+            print(
+                "{:8} check p50 {:8.3f} ms  p95 {:8.3f} ms  ({} of {} slots taken)".format(
+                    name, p50, p95, found, len(slots)
+                )
+            )
+
+        for side in ("venue", "artist"):
+            started = time.perf_counter()
+            pairs = sum(1 for _ in iter_conflicts(side))
+            print(
+                "{:8} report {:8.2f} s  {} overlapping pairs".format(
+                    side, time.perf_counter() - started, pairs
+                )
+            )
+        # ru_maxrss is in KiB on Linux.
+        print(
+            "peak RSS {:.1f} MB".format(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
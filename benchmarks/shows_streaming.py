@@ -0,0 +1,80 @@
+"""Compare full /shows rendering: materialized list vs. streamed cursor.
+
+Writes into the database named by DATABASE_URL, so point it at a scratch
+database:
+
+    DATABASE_URL=sqlite:////tmp/fyyur_bench.db \
+        python benchmarks/shows_streaming.py --shows 200000
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask import render_template  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, Show  # noqa: E402
+from queries import iter_shows  # noqa: E402
+from synthetic import create_schema, generate  # noqa: E402
+
+
+def materialized():
+    with app.test_request_context("/shows?all=1"):
+        yield render_template("pages/shows.html", shows=list(iter_shows()))
+
+
+def streamed(client):
+    response = client.get("/shows?all=1", buffered=False)
+    yield from response.response
+    response.close()
+
+
+def run(make_chunks, trace):
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    for chunk in make_chunks():
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return first_byte, total, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shows", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with app.app_context():
+        create_schema()
+        if db.session.query(Show.id).first() is None:
+            generate(args.shows, args.seed)
+
+    client = app.test_client()
+    modes = (("materialized", materialized), ("streamed", lambda: streamed(client)))
+    for name, make_chunks in modes:
+        first_byte, total, size, _ = run(make_chunks, trace=False)
+        _, _, _, peak = run(make_chunks, trace=True)
+        print(
+            "{:12} ttfb {:8.3f} s  total {:8.3f} s  body {:7.1f} MB  peak {:7.1f} MB".format(
+                name, first_byte, total, size / 2**20, peak / 2**20
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import datetime
+
+import click
+from sqlalchemy import and_, exc, or_, text
+
+from models import db, Show
+
+# Double-booking checks. A show occupies [start_time, start_time + duration)
+# and no show is longer than MAX_SHOW_MINUTES, so the shows that can overlap
+# a new one all start within MAX_SHOW_MINUTES before it: one range read of
+# the (venue_id, start_time) or (artist_id, start_time) index, whatever the
+# size of the table.
+
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 12 * 60
+
+SIDES = {"venue": Show.venue_id, "artist": Show.artist_id}
+
+# The constraints the b6e31f0d72c4 migration adds on Postgres.
+EXCLUSIONS = {
+    "venue": "ex_shows_venue_id_during",
+    "artist": "ex_shows_artist_id_during",
+}
+EXCLUSION_DDL = (
+    "ALTER TABLE shows ADD CONSTRAINT {} EXCLUDE USING gist ({} WITH =, "
+    "tsrange(start_time, start_time + duration * interval '1 minute') WITH &&)"
+)
+
+
+def show_end(start_time, duration):
+    return start_time + datetime.timedelta(minutes=duration)
+
+
+def overlapping(column, id, start_time, duration, exclude=None):
+    # Shows on column == id overlapping the given slot.
+    end = show_end(start_time, duration)
+    earliest = start_time - datetime.timedelta(minutes=MAX_SHOW_MINUTES)
+    rows = (
+        db.session.query(
+            Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.duration
+        )
+        .filter(column == id, Show.start_time > earliest, Show.start_time < end)
+        .order_by(Show.start_time)
+        .all()
+    )
+    return [
+        row
+        for row in rows
+        if show_end(row.start_time, row.duration) > start_time and row.id != exclude
+    ]
+
+
+def booking_conflicts(venue_id, artist_id, start_time, duration, exclude=None):
+    # {"venue": [shows], "artist": [shows]}, empty lists when the slot is free.
+    return {
+        "venue": overlapping(Show.venue_id, venue_id, start_time, duration, exclude),
+        "artist": overlapping(Show.artist_id, artist_id, start_time, duration, exclude),
+    }
+
+
+def batch_conflicts(rows, chunk_size=300):
+    # Overlaps for rows about to be inserted together (dicts with venue_id,
+    # artist_id, start_time and duration), against the stored shows and the
+    # earlier rows of the batch that are not themselves in conflict. One
+    # query per side per chunk, an OR of the same index ranges overlapping
+    # reads. Returns {row index: [(side, show id, row index, start, end)]},
+    # with the show id None for an earlier row and the row index None for a
+    # stored show.
+    earliest = datetime.timedelta(minutes=MAX_SHOW_MINUTES)
+    booked = {}
+    for side, column in SIDES.items():
+        booked[side] = {}
+        for start in range(0, len(rows), chunk_size):
+            ranges = [
+                and_(
+                    column == row[column.key],
+                    Show.start_time > row["start_time"] - earliest,
+                    Show.start_time < show_end(row["start_time"], row["duration"]),
+                )
+                for row in rows[start : start + chunk_size]
+            ]
+            shows = db.session.query(
+                column, Show.id, Show.start_time, Show.duration
+            ).filter(or_(*ranges))
+            for key, id, start_time, duration in shows:
+                slots = booked[side].setdefault(key, {})
+                slots[id] = (id, None, start_time, show_end(start_time, duration))
+
+    conflicts = {}
+    for index, row in enumerate(rows):
+        start, end = row["start_time"], show_end(row["start_time"], row["duration"])
+        found = [
+            (side,) + slot
+            for side, column in SIDES.items()
+            for slot in booked[side].get(row[column.key], {}).values()
+            if slot[2] < end and slot[3] > start
+        ]
+        if found:
+            conflicts[index] = found
+            continue
+        for side, column in SIDES.items():
+            slots = booked[side].setdefault(row[column.key], {})
+            slots[("row", index)] = (None, index, start, end)
+    return conflicts
+
+
+def iter_conflicts(side, batch_size=10000):
+    # Every overlapping pair on one side, in one pass over the shows in
+    # (fk, start_time) order: only the shows still running when the next
+    # one starts are kept, so memory stays at a handful of rows.
+    # Yields (fk value, earlier show, later show) as (id, start_time, end).
+    column = SIDES[side]
+    rows = (
+        db.session.query(column, Show.id, Show.start_time, Show.duration)
+        .order_by(column, Show.start_time)
+        .yield_per(batch_size)
+    )
+    key, running = None, []
+    for value, id, start_time, duration in rows:
+        if value != key:
+            key, running = value, []
+        running = [show for show in running if show[2] > start_time]
+        show = (id, start_time, show_end(start_time, duration))
+        for earlier in running:
+            yield key, earlier, show
+        running.append(show)
+
+
+def missing_exclusions():
+    if db.engine.dialect.name != "postgresql":
+        return []
+    present = {
+        name
+        for name, in db.session.execute(
+            text(
+                "SELECT conname FROM pg_constraint "
+                "WHERE conrelid = 'shows'::regclass AND contype = 'x'"
+            )
+        )
+    }
+    return [side for side, name in EXCLUSIONS.items() if name not in present]
+
+
+def init_bookings(app):
+    @app.cli.group("shows")
+    def shows():
+        """Show bookings."""
+
+    @shows.command("conflicts")
+    @click.option("--limit", default=50, show_default=True, help="Pairs to list.")
+    @click.option(
+        "--constrain",
+        is_flag=True,
+        help="On Postgres, add the missing exclusion constraints if clean.",
+    )
+    def conflicts(limit, constrain):
+        """List shows that overlap at the same venue or with the same artist."""
+        found = 0
+        for side in SIDES:
+            count = 0
+            for key, earlier, later in iter_conflicts(side):
+                count += 1
+                if count <= limit:
+                    print(
+                        "{} {}: show {} ({:%Y-%m-%d %H:%M}-{:%H:%M}) overlaps "
+                        "show {} ({:%Y-%m-%d %H:%M}-{:%H:%M})".format(
+                            side, key, *earlier, *later
+                        )
+                    )
+            print("{}: {} overlapping pairs".format(side, count))
+            found += count
+
+        missing = missing_exclusions()
+        if constrain and missing and not found:
+            for side in missing:
+                try:
+                    db.session.execute(
+                        text(EXCLUSION_DDL.format(EXCLUSIONS[side], SIDES[side].name))
+                    )
+                    db.session.commit()
+                except exc.IntegrityError as e:
+                    # A booking came in since the scan.
+                    db.session.rollback()
+                    raise click.ClickException(str(e.orig))
+                print("added {}".format(EXCLUSIONS[side]))
+        elif missing:
+            print(
+                "missing exclusion constraints: {}".format(
+                    ", ".join(EXCLUSIONS[side] for side in missing)
+                )
+            )
+        if found:
+            raise SystemExit(1)
@@ -0,0 +1,243 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, g, request, session
+
+# Entries are tagged with the entities they render. Purging a tag bumps its
+# generation; an entry is only served while every tag it was stored with is
+# still at the generation recorded at store time. That keeps invalidation
+# O(tags) and works across processes without enumerating entries. Each tag
+# also keeps the time of its last purge: a page read from a replica soon
+# after one may predate the write, so it is served but not stored.
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.purges = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def generation(self, tag):
+        return self.generations.get(tag, 0)
+
+    def purged_at(self, tag):
+        return self.purges.get(tag, 0)
+
+    def bump(self, tag):
+        with self.lock:
+            self.generations[tag] = self.generations.get(tag, 0) + 1
+            self.purges[tag] = time.time()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generations.clear()
+            self.purges.clear()
+
+
+class FileSystemBackend:
+    # Shared by every worker on the host: one pickle per entry and one small
+    # file per tag holding its generation and last purge time, both
+    # replaced atomically.
+
+    def __init__(self, directory, max_entries=10000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.sets = 0
+        os.makedirs(os.path.join(directory, "entries"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "tags"), exist_ok=True)
+
+    def _path(self, kind, name):
+        digest = hashlib.sha1(name.encode()).hexdigest()
+        return os.path.join(self.directory, kind, digest)
+
+    def _write(self, path, data):
+        tmp = "{}.{}.{}".format(path, os.getpid(), threading.get_ident())
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        path = self._path("entries", key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # Touch so the LRU sweep sees recently served entries as fresh.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def set(self, key, entry):
+        self._write(self._path("entries", key), pickle.dumps(entry))
+        self.sets += 1
+        if self.sets % 100 == 0:
+            self._evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path("entries", key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        directory = os.path.join(self.directory, "entries")
+        with os.scandir(directory) as it:
+            entries = [(e.stat().st_mtime, e.path) for e in it if e.is_file()]
+        for _, path in sorted(entries)[: max(len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _tag(self, tag):
+        # (generation, purged at); files written before purge times were
+        # kept hold only the generation.
+        try:
+            with open(self._path("tags", tag), "rb") as f:
+                fields = f.read().split() + [0, 0]
+            return int(fields[0]), float(fields[1])
+        except (OSError, ValueError):
+            return 0, 0
+
+    def generation(self, tag):
+        return self._tag(tag)[0]
+
+    def purged_at(self, tag):
+        return self._tag(tag)[1]
+
+    def bump(self, tag):
+        self._write(
+            self._path("tags", tag),
+            "{} {}".format(self.generation(tag) + 1, time.time()).encode(),
+        )
+
+    def clear(self):
+        for kind in ("entries", "tags"):
+            directory = os.path.join(self.directory, kind)
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+
+
+class ResponseCache:
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get("RESPONSE_CACHE", "none")
+        max_entries = app.config.get("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+        if kind == "memory":
+            self.backend = MemoryBackend(max_entries)
+        elif kind == "filesystem":
+            self.backend = FileSystemBackend(
+                app.config["RESPONSE_CACHE_DIR"], max_entries
+            )
+        elif kind != "none":
+            raise ValueError("Unknown RESPONSE_CACHE backend: {}".format(kind))
+        self.ttl = app.config.get("RESPONSE_CACHE_TTL", 300)
+        app.extensions["response_cache"] = self
+
+    def key(self):
+        args = sorted(request.args.items(multi=True))
+        return "{}?{}".format(request.path, args)
+
+    def cached(self, *tags):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Pages render flashed messages, which are per user.
+                if self.backend is None or "_flashes" in session:
+                    return view(*args, **kwargs)
+
+                key = self.key()
+                entry = self.backend.get(key)
+                if entry is not None:
+                    expires, generations, payload = entry
+                    if expires > time.time() and all(
+                        self.backend.generation(tag) == generation
+                        for tag, generation in generations.items()
+                    ):
+                        body, status, headers = payload
+                        return Response(body, status=status, headers=headers)
+                    self.backend.delete(key)
+
+                # Read the route's tag generations before rendering so a purge
+                # that lands while the view runs invalidates what it produced.
+                page_tags = set(tag.format(**kwargs) for tag in tags)
+                generations = {tag: self.backend.generation(tag) for tag in page_tags}
+                g.cache_tags = set()
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                if "_flashes" in session:
+                    return response
+                for tag in g.cache_tags - page_tags:
+                    generations[tag] = self.backend.generation(tag)
+                if self.replica_behind(generations):
+                    return response
+                payload = (
+                    response.get_data(),
+                    response.status_code,
+                    [("Content-Type", response.headers["Content-Type"])],
+                )
+                self.backend.set(key, (time.time() + self.ttl, generations, payload))
+                return response
+
+            return wrapper
+
+        return decorator
+
+    def replica_behind(self, tags):
+        # Whether the view read a replica that may not have replayed the
+        # latest purge of one of tags yet: a replica in rotation was at most
+        # REPLICA_MAX_LAG behind at its last check, REPLICA_CHECK_INTERVAL
+        # ago at most.
+        if g.get("replica") is None:
+            return False
+        replicas = current_app.extensions["replicas"]
+        since = time.time() - replicas.max_lag - replicas.check_interval
+        return any(self.backend.purged_at(tag) > since for tag in tags)
+
+    def purge(self, *tags):
+        if self.backend is None:
+            return
+        for tag in tags:
+            self.backend.bump(tag)
+
+
+def cache_tags(*tags):
+    # Called from a cached view for entities that only appear in its body,
+    # e.g. the artists listed on a venue page.
+    if "cache_tags" in g:
+        g.cache_tags.update(tags)
@@ -0,0 +1,145 @@
+from sqlalchemy import event, except_, func, select
+from sqlalchemy.orm import attributes
+
+from models import db, Venue, Artist, Show, ShowCard
+
+# show_cards: one denormalized row per show (see ShowCard). Kept in step by
+# the mapper events below and by the bulk paths (importer, synthetic), and
+# rebuilt from scratch by `flask cards rebuild`.
+
+cards = ShowCard.__table__
+shows = Show.__table__
+venues = Venue.__table__
+artists = Artist.__table__
+
+# Card column -> the column it copies. changed_at is the latest updated_at
+# of the show, its venue and its artist.
+SOURCES = {
+    "show_id": shows.c.id,
+    "venue_id": shows.c.venue_id,
+    "venue_name": venues.c.name,
+    "venue_city": venues.c.city,
+    "venue_state": venues.c.state,
+    "artist_id": shows.c.artist_id,
+    "artist_name": artists.c.name,
+    "artist_image_link": artists.c.image_link,
+    "start_time": shows.c.start_time,
+    "duration": shows.c.duration,
+    "updated_at": shows.c.updated_at,
+}
+
+# Venue / artist attribute -> the card column that copies it.
+VENUE_COLUMNS = {"name": "venue_name", "city": "venue_city", "state": "venue_state"}
+ARTIST_COLUMNS = {"name": "artist_name", "image_link": "artist_image_link"}
+
+
+def actual_cards():
+    # The cards computed from shows, venues and artists.
+    return select(*SOURCES.values()).select_from(
+        shows.join(venues, venues.c.id == shows.c.venue_id).join(
+            artists, artists.c.id == shows.c.artist_id
+        )
+    )
+
+
+def _latest(connection, *columns):
+    # SQLite's max() with several arguments is the scalar maximum.
+    if connection.dialect.name == "sqlite":
+        return func.max(*columns)
+    return func.greatest(*columns)
+
+
+def _fill(connection, query):
+    changed_at = _latest(
+        connection, shows.c.updated_at, venues.c.updated_at, artists.c.updated_at
+    )
+    connection.execute(
+        cards.insert().from_select(
+            list(SOURCES) + ["changed_at"], query.add_columns(changed_at)
+        )
+    )
+
+
+def shows_carded(connection, show_ids):
+    # (Re)writes the cards of these shows from the tables; shows that no
+    # longer exist lose theirs.
+    show_ids = list(show_ids)
+    if not show_ids:
+        return
+    connection.execute(cards.delete().where(cards.c.show_id.in_(show_ids)))
+    _fill(connection, actual_cards().where(shows.c.id.in_(show_ids)))
+
+
+def after_insert(mapper, connection, show):
+    shows_carded(connection, [show.id])
+
+
+def after_update(mapper, connection, show):
+    shows_carded(connection, [show.id])
+
+
+def after_delete(mapper, connection, show):
+    connection.execute(cards.delete().where(cards.c.show_id == show.id))
+
+
+def _renamed(fk, columns):
+    # A venue or artist edit rewrites the copied columns on its cards, one
+    # UPDATE over the fk index, only when one of them changed.
+    def listener(mapper, connection, target):
+        values = {
+            column: getattr(target, name)
+            for name, column in columns.items()
+            if attributes.get_history(target, name).has_changes()
+        }
+        if values:
+            connection.execute(
+                cards.update()
+                .where(fk == target.id)
+                .values(dict(values, changed_at=target.updated_at))
+            )
+
+    return listener
+
+
+def rebuild_cards(connection):
+    connection.execute(cards.delete())
+    _fill(connection, actual_cards())
+
+
+def card_drift(connection):
+    # Ids of shows whose card is missing, extra or differs from the tables.
+    stored = select(*[cards.c[name] for name in SOURCES])
+    actual = actual_cards()
+    drifted = set()
+    for query in (except_(stored, actual), except_(actual, stored)):
+        drifted.update(row[0] for row in connection.execute(query))
+    return sorted(drifted)
+
+
+def init_cards(app):
+    event.listen(Show, "after_insert", after_insert)
+    event.listen(Show, "after_update", after_update)
+    event.listen(Show, "after_delete", after_delete)
+    event.listen(Venue, "after_update", _renamed(cards.c.venue_id, VENUE_COLUMNS))
+    event.listen(Artist, "after_update", _renamed(cards.c.artist_id, ARTIST_COLUMNS))
+
+    @app.cli.group("cards")
+    def cards_group():
+        """Maintain show_cards, the table show listings read."""
+
+    @cards_group.command("rebuild")
+    def rebuild():
+        """Recompute show_cards from shows, venues and artists."""
+        rebuild_cards(db.session.connection())
+        db.session.commit()
+        print("{} cards".format(db.session.query(ShowCard).count()))
+
+    @cards_group.command("check")
+    def check():
+        """Compare show_cards against shows, venues and artists."""
+        drift = card_drift(db.session.connection())
+        if not drift:
+            print("show_cards matches the shows table")
+            return
+        print("{} show cards drifted: {}".format(len(drift), drift[:20]))
+        raise SystemExit(1)
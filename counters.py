@@ -0,0 +1,218 @@
+import datetime
+
+import click
+import dateutil.parser
+from flask import current_app
+from sqlalchemy import and_, case, event, func, or_, select
+from sqlalchemy.orm import attributes
+
+from models import db, Venue, Artist, Show
+
+# venues/artists.upcoming_show_count and next_show_at, kept so list and
+# search pages read a column instead of counting shows:
+#
+# - a new upcoming show bumps both rows in the same flush;
+# - deleting or moving a show recomputes the rows it touched;
+# - `flask counters roll`, run periodically, recomputes the rows whose
+#   next_show_at has passed; those are exactly the rows whose counts
+#   include a show that is now in the past;
+# - `flask counters reconcile` compares every row against the shows table.
+
+shows = Show.__table__
+
+# (entity table, shows fk column)
+COUNTED = (
+    (Venue.__table__, shows.c.venue_id),
+    (Artist.__table__, shows.c.artist_id),
+)
+
+
+def counter_values(table, fk, now):
+    # Correlated subqueries for both counters; each is a range read of the
+    # (fk, start_time) index.
+    upcoming = and_(fk == table.c.id, shows.c.start_time > now)
+    return {
+        "upcoming_show_count": select(func.count(shows.c.id))
+        .where(upcoming)
+        .scalar_subquery(),
+        "next_show_at": select(func.min(shows.c.start_time))
+        .where(upcoming)
+        .scalar_subquery(),
+    }
+
+
+def refresh_counters(connection, table, fk, ids, now=None, touch=False):
+    # touch also bumps updated_at, for changes that no show write explains
+    # (the page versions would otherwise miss them).
+    ids = [id for id in set(ids) if id is not None]
+    if not ids:
+        return 0
+    now = now or datetime.datetime.now()
+    values = counter_values(table, fk, now)
+    if touch:
+        values["updated_at"] = now
+    return connection.execute(
+        table.update().where(table.c.id.in_(ids)).values(values)
+    ).rowcount
+
+
+def _show_added(connection, start_time, ids, now):
+    if start_time <= now:
+        return
+    for (table, fk), id in zip(COUNTED, ids):
+        connection.execute(
+            table.update()
+            .where(table.c.id == id)
+            .values(
+                upcoming_show_count=table.c.upcoming_show_count + 1,
+                next_show_at=case(
+                    (
+                        or_(
+                            table.c.next_show_at.is_(None),
+                            table.c.next_show_at > start_time,
+                        ),
+                        start_time,
+                    ),
+                    else_=table.c.next_show_at,
+                ),
+            )
+        )
+
+
+def _start_time(show):
+    # The create form passes start_time through as a string.
+    if isinstance(show.start_time, str):
+        return dateutil.parser.parse(show.start_time)
+    return show.start_time
+
+
+def after_insert(mapper, connection, show):
+    now = datetime.datetime.now()
+    _show_added(connection, _start_time(show), (show.venue_id, show.artist_id), now)
+
+
+def after_delete(mapper, connection, show):
+    if _start_time(show) > datetime.datetime.now():
+        for table, fk in COUNTED:
+            refresh_counters(connection, table, fk, [getattr(show, fk.key)])
+
+
+def after_update(mapper, connection, show):
+    # Moving a show to another time, venue or artist: recompute the old and
+    # new rows on each side.
+    changed = {}
+    for table, fk in COUNTED:
+        history = attributes.get_history(show, fk.key)
+        changed[table] = set(history.deleted or ()) | {getattr(show, fk.key)}
+    if not attributes.get_history(show, "start_time").has_changes() and all(
+        len(ids) == 1 for ids in changed.values()
+    ):
+        return
+    for table, fk in COUNTED:
+        refresh_counters(connection, table, fk, changed[table])
+
+
+def roll_counters(now=None):
+    # Returns the number of venue and artist rows recomputed.
+    now = now or datetime.datetime.now()
+    connection = db.session.connection()
+    rolled = 0
+    for table, fk in COUNTED:
+        values = counter_values(table, fk, now)
+        values["updated_at"] = now
+        rolled += connection.execute(
+            table.update().where(table.c.next_show_at <= now).values(values)
+        ).rowcount
+    db.session.commit()
+    return rolled
+
+
+def counter_drift(table, fk, now=None):
+    # [(id, stored count, stored next, actual count, actual next)]. Rows
+    # whose next show has passed are left to the next roll, not drift.
+    now = now or datetime.datetime.now()
+    actual = (
+        select(
+            fk.label("id"),
+            func.count(shows.c.id).label("count"),
+            func.min(shows.c.start_time).label("next"),
+        )
+        .where(shows.c.start_time > now)
+        .group_by(fk)
+        .subquery()
+    )
+    count = func.coalesce(actual.c.count, 0)
+    return db.session.execute(
+        select(
+            table.c.id,
+            table.c.upcoming_show_count,
+            table.c.next_show_at,
+            count,
+            actual.c.next,
+        )
+        .select_from(table.outerjoin(actual, actual.c.id == table.c.id))
+        .where(
+            or_(table.c.next_show_at.is_(None), table.c.next_show_at > now),
+            or_(
+                table.c.upcoming_show_count != count,
+                table.c.next_show_at.is_distinct_from(actual.c.next),
+            ),
+        )
+        .order_by(table.c.id)
+    ).all()
+
+
+def init_counters(app):
+    event.listen(Show, "after_insert", after_insert)
+    event.listen(Show, "after_delete", after_delete)
+    event.listen(Show, "after_update", after_update)
+
+    @app.cli.group("counters")
+    def counters():
+        """Maintain the upcoming show counters on venues and artists."""
+
+    @counters.command("roll")
+    def roll():
+        """Recompute counters whose next show has passed.
+
+        Run this periodically, e.g. every few minutes from cron; until it
+        runs, a count still includes shows that started since the last run.
+        """
+        rolled = roll_counters()
+        if rolled:
+            current_app.extensions["response_cache"].purge("venues", "artists")
+        print("{} rows rolled forward".format(rolled))
+
+    @counters.command("reconcile")
+    @click.option("--repair", is_flag=True, help="Recompute drifted rows.")
+    def reconcile(repair):
+        """Compare the counters against the shows table."""
+        if repair:
+            roll_counters()
+        now = datetime.datetime.now()
+        drifted = False
+        for table, fk in COUNTED:
+            drift = counter_drift(table, fk, now)
+            if not drift:
+                continue
+            drifted = True
+            print("{}: {} rows drifted".format(table.name, len(drift)))
+            for row in drift[:20]:
+                print("  id={} stored=({}, {}) actual=({}, {})".format(*row))
+            if repair:
+                refresh_counters(
+                    db.session.connection(),
+                    table,
+                    fk,
+                    [row[0] for row in drift],
+                    now,
+                    touch=True,
+                )
+        if drifted and repair:
+            db.session.commit()
+            current_app.extensions["response_cache"].purge("venues", "artists")
+            print("drifted rows repaired")
+        elif drifted:
+            raise SystemExit(1)
+        else:
+            print("counters match the shows table")
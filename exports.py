@@ -0,0 +1,190 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+
+from flask import Response, abort, request, stream_with_context
+
+from importer import GENRE_SEPARATOR
+from models import db, Genre, Venue, Artist, ShowCard, venue_genres, artist_genres
+from pagination import buffered
+
+BATCH_SIZE = 1000
+
+VENUE_COLUMNS = [
+    Venue.id,
+    Venue.name,
+    Venue.city,
+    Venue.state,
+    Venue.address,
+    Venue.phone,
+    Venue.website,
+    Venue.facebook_link,
+    Venue.image_link,
+    Venue.seeking_talent,
+    Venue.seeking_description,
+    Venue.updated_at,
+]
+
+ARTIST_COLUMNS = [
+    Artist.id,
+    Artist.name,
+    Artist.city,
+    Artist.state,
+    Artist.phone,
+    Artist.website,
+    Artist.facebook_link,
+    Artist.image_link,
+    Artist.seeking_venue,
+    Artist.seeking_description,
+    Artist.updated_at,
+]
+
+SHOW_COLUMNS = [
+    ShowCard.show_id.label("id"),
+    ShowCard.venue_id,
+    ShowCard.venue_name,
+    ShowCard.artist_id,
+    ShowCard.artist_name,
+    ShowCard.artist_image_link,
+    ShowCard.start_time,
+    ShowCard.duration,
+    ShowCard.updated_at,
+]
+
+
+def _entity_rows(model, columns, association, fk, since):
+    # Rows and their genre links come from two cursors, both ordered by the
+    # entity id, and are merged as they are read.
+    rows = db.session.query(*columns).order_by(model.id)
+    links = (
+        db.session.query(association.c[fk], Genre.name)
+        .join(Genre, Genre.id == association.c.genre_id)
+        .order_by(association.c[fk], Genre.name)
+    )
+    if since is not None:
+        rows = rows.filter(model.updated_at >= since)
+        links = links.join(model, model.id == association.c[fk]).filter(
+            model.updated_at >= since
+        )
+    links = iter(links.yield_per(BATCH_SIZE))
+    link = next(links, None)
+    for row in rows.yield_per(BATCH_SIZE):
+        record = row._asdict()
+        record["genres"] = []
+        while link is not None and link[0] <= row.id:
+            if link[0] == row.id:
+                record["genres"].append(link[1])
+            link = next(links, None)
+        yield record
+
+
+def venue_rows(since=None):
+    return _entity_rows(Venue, VENUE_COLUMNS, venue_genres, "venue_id", since)
+
+
+def artist_rows(since=None):
+    return _entity_rows(Artist, ARTIST_COLUMNS, artist_genres, "artist_id", since)
+
+
+def show_rows(since=None):
+    rows = db.session.query(*SHOW_COLUMNS).order_by(ShowCard.show_id)
+    if since is not None:
+        # changed_at also moves when a rename changes the venue or artist
+        # names carried by the show.
+        rows = rows.filter(ShowCard.changed_at >= since)
+    for row in rows.yield_per(BATCH_SIZE):
+        yield row._asdict()
+
+
+# kind -> (row iterator, column names)
+EXPORTS = {
+    "venues": (venue_rows, [c.key for c in VENUE_COLUMNS] + ["genres"]),
+    "artists": (artist_rows, [c.key for c in ARTIST_COLUMNS] + ["genres"]),
+    "shows": (show_rows, [c.key for c in SHOW_COLUMNS]),
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(value)
+
+
+def ndjson_lines(rows, columns):
+    for row in rows:
+        yield json.dumps(row, default=_json_default) + "\n"
+
+
+def _csv_value(value):
+    # Same conventions `flask import` reads back.
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, list):
+        return GENRE_SEPARATOR.join(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(row[column]) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+FORMATS = {
+    "ndjson": (ndjson_lines, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv"),
+}
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_since():
+    since = request.args.get("since")
+    if not since:
+        return None
+    try:
+        since = datetime.datetime.fromisoformat(since)
+    except ValueError:
+        abort(400)
+    # Stored timestamps are naive local time.
+    if since.tzinfo is not None:
+        since = since.astimezone().replace(tzinfo=None)
+    return since
+
+
+def export_response(kind, format):
+    # Rows are read from a server-side cursor and written as they arrive,
+    # so memory stays at one batch however large the table is.
+    since = export_since()
+    started = datetime.datetime.now()
+    rows, columns = EXPORTS[kind]
+    lines, mimetype = FORMATS[format]
+    chunks = (chunk.encode() for chunk in buffered(lines(rows(since), columns)))
+    headers = {
+        "Content-Disposition": "attachment; filename={}.{}".format(kind, format),
+        # Pass this back as since= to fetch only what changed after this
+        # export started.
+        "X-Next-Since": started.isoformat(),
+        "Vary": "Accept-Encoding",
+    }
+    if request.accept_encodings.quality("gzip") > 0:
+        chunks = gzipped(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
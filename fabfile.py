@@ -5,9 +5,14 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # The test suite, then every GET route against a small generated dataset
+    # in a scratch database; fails on any failed test or non-200 response.
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest -q && rm -f /tmp/fyyur_test.db && "
+            "DATABASE_URL=sqlite:////tmp/fyyur_test.db "
+            "python benchmarks/routes.py --shows 1000 --repeat 3",
+            capture=True,
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
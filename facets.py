@@ -0,0 +1,329 @@
+import datetime
+import heapq
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import attributes
+
+from models import db, Genre, Venue, Artist, Show, venue_genres, artist_genres
+from name_index import SYNC_OVERLAP
+from pagination import Page, encode_cursor
+from versions import table_version
+
+# In-process faceted browse over venues and artists: state, city, genre,
+# seeking (talent / a venue) and upcoming (has a show ahead). Every facet
+# value keeps the ids that have it as one Python int used as a bitset (bit
+# n set for id n), so combining facets is a few big-int ANDs and a count is
+# int.bit_count(). Built on first use, patched when a transaction that
+# touched venues, artists or shows commits, and re-synced with what other
+# workers wrote every INDEX_SYNC_INTERVAL seconds, like name_index.py. A
+# sync re-reads the rows whose own updated_at or one of whose shows'
+# updated_at is recent. Deleting a venue changes the last show of its
+# artists without either, so in other workers those artists can keep
+# counting as "upcoming" until the deleted shows' start times pass.
+
+# model -> (genre association table, its fk, shows fk, seeking column)
+FACETED = {
+    Venue: (venue_genres, venue_genres.c.venue_id, Show.venue_id, Venue.seeking_talent),
+    Artist: (
+        artist_genres,
+        artist_genres.c.artist_id,
+        Show.artist_id,
+        Artist.seeking_venue,
+    ),
+}
+
+VALUE_FACETS = ("state", "city", "genre")
+FLAG_FACETS = ("seeking", "upcoming")
+
+
+def _union(bitsets):
+    bits = 0
+    for bitset in bitsets:
+        bits |= bitset
+    return bits
+
+
+def bit_ids(bits, after=None, before=None, limit=None):
+    # Set bits as ids, ascending; after / before exclude the cursor itself.
+    if after is not None:
+        bits = bits >> (after + 1) << (after + 1)
+    if before is not None:
+        bits &= (1 << before) - 1
+        ids = []
+        while bits and (limit is None or len(ids) < limit):
+            id = bits.bit_length() - 1
+            ids.append(id)
+            bits ^= 1 << id
+        return ids[::-1]
+    ids = []
+    while bits and (limit is None or len(ids) < limit):
+        low = bits & -bits
+        ids.append(low.bit_length() - 1)
+        bits ^= low
+    return ids
+
+
+class FacetIndex:
+    def __init__(self):
+        self.all = 0
+        self.values = {facet: {} for facet in VALUE_FACETS}
+        self.flags = {facet: 0 for facet in FLAG_FACETS}
+        # id -> (state, city, genres, seeking, last show)
+        self.rows = {}
+        # (last show, id) for ids whose last show is still ahead; popped as
+        # time passes, which is all "upcoming" needs without any write.
+        self.expiry = []
+        self.lock = threading.RLock()
+        # Where the last sync left off, as in name_index.NgramIndex.
+        self.version = None
+        self.since = None
+        self.synced_at = None
+        self.sync_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, id, state, city, genres, seeking, last_show_at, now):
+        with self.lock:
+            self.remove(id)
+            bit = 1 << id
+            row = (state or "", city or "", tuple(sorted(genres)), bool(seeking))
+            self.rows[id] = row + (last_show_at,)
+            self.all |= bit
+            for facet, values in zip(VALUE_FACETS, (row[0], row[1], row[2])):
+                for value in values if facet == "genre" else (values,):
+                    self.values[facet][value] = self.values[facet].get(value, 0) | bit
+            if seeking:
+                self.flags["seeking"] |= bit
+            if last_show_at is not None and last_show_at > now:
+                self.flags["upcoming"] |= bit
+                heapq.heappush(self.expiry, (last_show_at, id))
+
+    def remove(self, id):
+        with self.lock:
+            row = self.rows.pop(id, None)
+            if row is None:
+                return
+            clear = ~(1 << id)
+            self.all &= clear
+            for facet, values in zip(VALUE_FACETS, (row[0], row[1], row[2])):
+                for value in values if facet == "genre" else (values,):
+                    bits = self.values[facet][value] & clear
+                    if bits:
+                        self.values[facet][value] = bits
+                    else:
+                        del self.values[facet][value]
+            for facet in FLAG_FACETS:
+                self.flags[facet] &= clear
+
+    def _expire(self, now):
+        while self.expiry and self.expiry[0][0] <= now:
+            last_show_at, id = heapq.heappop(self.expiry)
+            row = self.rows.get(id)
+            # Stale entries (the id was re-added since) are skipped.
+            if row is not None and row[4] == last_show_at:
+                self.flags["upcoming"] &= ~(1 << id)
+
+    def _mask(self, facet, selected):
+        if facet in FLAG_FACETS:
+            flag = self.flags[facet]
+            return flag if selected else self.all & ~flag
+        values = self.values[facet]
+        return _union(values.get(value, 0) for value in selected)
+
+    def search(self, selected, now):
+        # selected: facet -> set of values (value facets, OR-ed) or a bool
+        # (flag facets); facets left out do not filter. Returns the bitset
+        # of matches and, per facet, the counts each value would have with
+        # the other facets' selections applied.
+        with self.lock:
+            self._expire(now)
+            masks = {
+                facet: self._mask(facet, value)
+                for facet, value in selected.items()
+                if value is not None and value != set()
+            }
+            matches = self.all
+            for mask in masks.values():
+                matches &= mask
+
+            counts = {}
+            for facet in VALUE_FACETS + FLAG_FACETS:
+                base = self.all
+                for other, mask in masks.items():
+                    if other != facet:
+                        base &= mask
+                if facet in FLAG_FACETS:
+                    yes = (self.flags[facet] & base).bit_count()
+                    counts[facet] = {"true": yes, "false": base.bit_count() - yes}
+                    continue
+                counts[facet] = {}
+                for value, bits in self.values[facet].items():
+                    count = (bits & base).bit_count()
+                    if count:
+                        counts[facet][value] = count
+            return matches, counts
+
+
+def facet_rows(connection, model, ids=None):
+    # {id: (state, city, genres, seeking, last show)} for ids, or for all.
+    association, fk, show_fk, seeking = FACETED[model]
+    table = model.__table__
+    last_show = (
+        select(func.max(Show.start_time)).where(show_fk == table.c.id).scalar_subquery()
+    )
+    query = select(table.c.id, table.c.state, table.c.city, seeking, last_show)
+    genres = select(fk, Genre.name).join(Genre, Genre.id == association.c.genre_id)
+    if ids is not None:
+        query = query.where(table.c.id.in_(ids))
+        genres = genres.where(fk.in_(ids))
+    rows = {
+        id: [state, city, [], seeking, last_show_at]
+        for id, state, city, seeking, last_show_at in connection.execute(
+            query.execution_options(yield_per=10000)
+        )
+    }
+    for id, name in connection.execute(genres):
+        if id in rows:
+            rows[id][2].append(name)
+    return rows
+
+
+facet_indexes = {}
+_build_lock = threading.Lock()
+
+
+def build_facet_index(model):
+    index = FacetIndex()
+    now = datetime.datetime.now()
+    index.version, index.since = table_version(model), now
+    for id, row in facet_rows(db.session.connection(), model).items():
+        index.add(id, *row, now)
+    index.synced_at = time.monotonic()
+    return index
+
+
+def sync_facet_index(model, index, chunk_size=5000):
+    show_fk = FACETED[model][2]
+    version, started = table_version(model), datetime.datetime.now()
+    since = index.since - SYNC_OVERLAP
+    ids = {id for (id,) in db.session.query(model.id).filter(model.updated_at >= since)}
+    ids.update(
+        id for (id,) in db.session.query(show_fk).filter(Show.updated_at >= since)
+    )
+    if version != index.version:
+        in_db = {id for (id,) in db.session.query(model.id).yield_per(10000)}
+        with index.lock:
+            known = set(index.rows)
+        ids.update(known - in_db, in_db - known)
+    ids = sorted(ids)
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start : start + chunk_size]
+        rows = facet_rows(db.session.connection(), model, chunk)
+        for id in chunk:
+            if id in rows:
+                index.add(id, *rows[id], started)
+            else:
+                index.remove(id)
+    index.version, index.since = version, started
+    index.synced_at = time.monotonic()
+
+
+def get_facet_index(model):
+    index = facet_indexes.get(model)
+    if index is None:
+        with _build_lock:
+            index = facet_indexes.get(model)
+            if index is None:
+                index = facet_indexes[model] = build_facet_index(model)
+    elif time.monotonic() - index.synced_at >= current_app.config[
+        "INDEX_SYNC_INTERVAL"
+    ] and index.sync_lock.acquire(blocking=False):
+        # One request per worker syncs; the others keep serving the index.
+        try:
+            sync_facet_index(model, index)
+        finally:
+            index.sync_lock.release()
+    return index
+
+
+def browse_page(model, selected, after=None, before=None, per_page=50):
+    # (Page of ids, total, facet counts) for the selected facet values;
+    # after / before are (id,) cursors as page_args((int,)) decodes them.
+    after = after[0] if after is not None else None
+    before = before[0] if before is not None else None
+    matches, counts = get_facet_index(model).search(selected, datetime.datetime.now())
+    ids = bit_ids(matches, after, before, per_page + 1)
+    if before is not None:
+        has_more = len(ids) > per_page
+        ids = ids[-per_page:]
+        page = Page(
+            ids,
+            encode_cursor((ids[-1],)) if ids else None,
+            encode_cursor((ids[0],)) if has_more else None,
+        )
+    else:
+        has_more = len(ids) > per_page
+        ids = ids[:per_page]
+        page = Page(
+            ids,
+            encode_cursor((ids[-1],)) if has_more else None,
+            encode_cursor((ids[0],)) if after is not None and ids else None,
+        )
+    return page, matches.bit_count(), counts
+
+
+# Write-through: after each flush, re-read the facet rows of the venues and
+# artists it touched (directly, or through their shows) inside the same
+# transaction, and apply them to built indexes once it commits.
+
+
+def stage_facets(session, model, ids):
+    # Also called by bulk paths that write with Core statements.
+    if model not in facet_indexes:
+        return
+    ids = {id for id in ids if id is not None}
+    if not ids:
+        return
+    rows = facet_rows(session.connection(), model, ids)
+    pending = session.info.setdefault("facet_pending", [])
+    pending.extend((model, id, rows.get(id)) for id in ids)
+
+
+def _after_flush(session, flush_context):
+    touched = {model: set() for model in FACETED}
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, tuple(FACETED)):
+            touched[type(obj)].add(obj.id)
+        elif isinstance(obj, Show):
+            for model, name in ((Venue, "venue_id"), (Artist, "artist_id")):
+                history = attributes.get_history(obj, name)
+                touched[model].update(history.deleted or ())
+                touched[model].add(getattr(obj, name))
+    for model, ids in touched.items():
+        stage_facets(session, model, ids)
+
+
+def _after_commit(session):
+    now = datetime.datetime.now()
+    for model, id, row in session.info.pop("facet_pending", ()):
+        index = facet_indexes.get(model)
+        if index is None:
+            continue
+        if row is None:
+            index.remove(id)
+        else:
+            index.add(id, *row, now)
+
+
+def _after_rollback(session):
+    session.info.pop("facet_pending", None)
+
+
+def init_facets(app):
+    event.listen(db.session, "after_flush", _after_flush)
+    event.listen(db.session, "after_commit", _after_commit)
+    event.listen(db.session, "after_rollback", _after_rollback)
@@ -6,8 +6,11 @@ from wtforms import (
     SelectMultipleField,
     DateTimeField,
     BooleanField,
+    IntegerField,
 )
-from wtforms.validators import DataRequired, AnyOf, URL, Regexp
+from wtforms.validators import DataRequired, AnyOf, URL, Regexp, NumberRange, Optional
+
+from bookings import DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
 
 
 class ShowForm(Form):
@@ -16,6 +19,11 @@ class ShowForm(Form):
     start_time = DateTimeField(
         "start_time", validators=[DataRequired()], default=datetime.today()
     )
+    duration = IntegerField(
+        "duration",
+        validators=[Optional(), NumberRange(min=1, max=MAX_SHOW_MINUTES)],
+        default=DEFAULT_SHOW_MINUTES,
+    )
 
 
 class VenueForm(Form):
@@ -0,0 +1,387 @@
+import csv
+import datetime
+import io
+import json
+import os
+import time
+
+import click
+from flask import current_app
+from sqlalchemy import Integer, func, select, text
+from werkzeug.datastructures import MultiDict
+
+from bookings import batch_conflicts
+from cards import shows_carded
+from counters import COUNTED, refresh_counters
+from facets import stage_facets
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Genre, Venue, Artist, Show, venue_genres, artist_genres
+from rollups import shows_added
+from versions import bump_versions
+
+# kind -> (model, form, genre association table, association fk column)
+KINDS = {
+    "venues": (Venue, VenueForm, venue_genres, "venue_id"),
+    "artists": (Artist, ArtistForm, artist_genres, "artist_id"),
+    "shows": (Show, ShowForm, None, None),
+}
+
+# A CSV row lists several genres in one column, separated the same way the
+# old genres string column was.
+GENRE_SEPARATOR = ":"
+
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+def read_csv(f):
+    for line, row in enumerate(csv.DictReader(f), start=2):
+        row.pop(None, None)
+        yield line, row
+
+
+def read_ndjson(f):
+    for line, raw in enumerate(f, start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield line, json.loads(raw)
+        except ValueError:
+            yield line, raw.rstrip("\n")
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+class RejectFile:
+    # Rejected rows in the input's format with _line and _errors added, so
+    # the file can be fixed up and imported again. Only created on the
+    # first reject.
+
+    def __init__(self, path, format):
+        self.path = path
+        self.format = format
+        self.file = None
+        self.writer = None
+        self.count = 0
+
+    def write(self, line, row, errors):
+        if self.file is None:
+            self.file = open(self.path, "w", newline="")
+        if not isinstance(row, dict):
+            row = {"_raw": row}
+        row = dict(row, _line=line, _errors=errors)
+        if self.format == "csv":
+            if self.writer is None:
+                self.writer = csv.DictWriter(
+                    self.file, fieldnames=list(row), extrasaction="ignore"
+                )
+                self.writer.writeheader()
+            row["_errors"] = json.dumps(errors)
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row, default=str) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def formdata(row):
+    data = MultiDict()
+    for name, value in row.items():
+        if name == "genres" and isinstance(value, str):
+            value = [genre.strip() for genre in value.split(GENRE_SEPARATOR)]
+        for item in value if isinstance(value, list) else [value]:
+            if item is None:
+                continue
+            if isinstance(item, bool):
+                item = "y" if item else "false"
+            data.add(name, str(item))
+    return data
+
+
+def validate(model, form_class, row):
+    # (values, genre names, errors) for one input row, checked with the
+    # same form the create page uses. Blank optional fields take the
+    # column default, or NULL without one, instead of failing e.g. the URL
+    # validator.
+    if not isinstance(row, dict):
+        return None, None, {"_row": ["Not a JSON object."]}
+    data = formdata(row)
+    form = form_class(formdata=data, meta={"csrf": False})
+    form.validate()
+
+    values, errors = {}, {}
+    for field in form:
+        given = bool(data.get(field.name))
+        if field.flags.required and not given:
+            errors[field.name] = ["This field is required."]
+        elif given and field.process_errors:
+            # A value that did not parse, e.g. a bad start_time; DataRequired
+            # would report it as missing.
+            errors[field.name] = field.process_errors
+        elif field.errors and (given or field.flags.required):
+            errors[field.name] = field.errors
+        column = model.__table__.columns.get(field.name)
+        if column is None or field.name in errors:
+            continue
+        if not given:
+            default = column.default
+            values[field.name] = (
+                default.arg if default is not None and default.is_scalar else None
+            )
+        elif isinstance(column.type, Integer):
+            try:
+                values[field.name] = int(field.data)
+            except (TypeError, ValueError):
+                errors[field.name] = ["Not a valid integer."]
+        else:
+            values[field.name] = field.data
+    genres = form.genres.data if "genres" in form else None
+    return values, genres, errors
+
+
+def allocate_ids(table, count):
+    # Ids are assigned up front so genre links can be written with the
+    # rows, without a round trip per row to learn the generated id.
+    connection = db.session.connection()
+    if connection.dialect.name == "postgresql":
+        return (
+            connection.execute(
+                text(
+                    "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+                    "FROM generate_series(1, :count)"
+                ),
+                {"table": table.name, "count": count},
+            )
+            .scalars()
+            .all()
+        )
+    start = (connection.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+    return list(range(start, start + count))
+
+
+def copy_value(value):
+    # COPY ... (FORMAT csv, NULL '\N') input: None is the unquoted \N marker
+    # and every other value is quoted, so "" and "\N" stay strings.
+    if value is None:
+        return r"\N"
+    return '"{}"'.format(str(value).replace('"', '""'))
+
+
+def insert_rows(table, rows):
+    connection = db.session.connection()
+    if connection.dialect.name == "postgresql":
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(",".join(copy_value(row[column]) for column in columns))
+            buffer.write("\n")
+        buffer.seek(0)
+        connection.connection.cursor().copy_expert(
+            "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(
+                table.name, ", ".join(columns)
+            ),
+            buffer,
+        )
+    else:
+        connection.execute(table.insert(), rows)
+
+
+def genre_ids(names):
+    # One lookup for the batch's genre names, plus one insert and one
+    # re-read for any that do not exist yet.
+    ids = dict(db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(names)))
+    missing = [name for name in names if name not in ids]
+    if missing:
+        insert_rows(Genre.__table__, [{"name": name} for name in missing])
+        ids.update(
+            db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(missing))
+        )
+    return ids
+
+
+def existing_ids(model, ids):
+    return {id for (id,) in db.session.query(model.id).filter(model.id.in_(ids))}
+
+
+def import_batch(kind, batch):
+    # Inserts the valid rows of one batch and commits. Returns the rejects
+    # found against the database and the cache tags the batch touched.
+    model, form_class, association, fk = KINDS[kind]
+    now = datetime.datetime.now()
+    rejects, tags = [], {kind}
+
+    if model is Show:
+        venues = existing_ids(Venue, {values["venue_id"] for _, _, values, _ in batch})
+        artists = existing_ids(
+            Artist, {values["artist_id"] for _, _, values, _ in batch}
+        )
+        found = []
+        for line, row, values, _ in batch:
+            errors = {}
+            if values["venue_id"] not in venues:
+                errors["venue_id"] = ["No venue with this id."]
+            if values["artist_id"] not in artists:
+                errors["artist_id"] = ["No artist with this id."]
+            if errors:
+                rejects.append((line, row, errors))
+                continue
+            found.append((line, row, dict(values, updated_at=now)))
+        # Double bookings are rejected like on the create page; on Postgres
+        # the exclusion constraints would otherwise fail the whole batch.
+        conflicts = batch_conflicts([values for _, _, values in found])
+        rows = []
+        for index, (line, row, values) in enumerate(found):
+            if index in conflicts:
+                rejects.append(
+                    (line, row, {"start_time": booking_errors(found, conflicts[index])})
+                )
+                continue
+            rows.append(values)
+            tags.update(
+                (
+                    "venue:{}".format(values["venue_id"]),
+                    "artist:{}".format(values["artist_id"]),
+                )
+            )
+        if rows:
+            tags.add("venues")
+            ids = allocate_ids(model.__table__, len(rows))
+            insert_rows(
+                model.__table__, [dict(row, id=id) for id, row in zip(ids, rows)]
+            )
+            # Core inserts skip the mapper events that keep the counters,
+            # the calendar rollup and the show cards.
+            connection = db.session.connection()
+            shows_carded(connection, ids)
+            for table, fk in COUNTED:
+                refresh_counters(connection, table, fk, [row[fk.key] for row in rows])
+            shows_added(
+                connection, [(row["venue_id"], row["start_time"]) for row in rows]
+            )
+            stage_facets(db.session, Venue, [row["venue_id"] for row in rows])
+            stage_facets(db.session, Artist, [row["artist_id"] for row in rows])
+    else:
+        ids = allocate_ids(model.__table__, len(batch))
+        genres = genre_ids(sorted({name for *_, names in batch for name in names}))
+        insert_rows(
+            model.__table__,
+            [
+                dict(values, id=id, updated_at=now)
+                for id, (_, _, values, _) in zip(ids, batch)
+            ],
+        )
+        links = [
+            {fk: id, "genre_id": genres[name]}
+            for id, (*_, names) in zip(ids, batch)
+            for name in dict.fromkeys(names)
+        ]
+        if links:
+            insert_rows(association, links)
+        bump_versions(db.session.connection(), model.__tablename__)
+        stage_facets(db.session, model, ids)
+
+    db.session.commit()
+    return rejects, tags
+
+
+def booking_errors(found, conflicts):
+    errors = []
+    for side, show_id, index, start, end in conflicts:
+        what = (
+            "show {}".format(show_id)
+            if index is None
+            else "line {}".format(found[index][0])
+        )
+        errors.append(
+            "The {} is already booked from {:%Y-%m-%d %H:%M} to {:%H:%M} "
+            "({}).".format(side, start, end, what)
+        )
+    return errors
+
+
+def import_file(kind, path, format=None, batch_size=1000, rejects_path=None):
+    model, form_class, association, fk = KINDS[kind]
+    name, extension = os.path.splitext(path)
+    format = format or FORMATS.get(extension.lower())
+    if format is None:
+        raise click.UsageError("Cannot tell the format of {}".format(path))
+    rejects = RejectFile(
+        rejects_path or "{}.rejects{}".format(name, extension or ".ndjson"), format
+    )
+    response_cache = current_app.extensions["response_cache"]
+
+    imported = 0
+    started = time.perf_counter()
+    try:
+        with open(path, newline="") as f:
+            # Rows the forms reject wait for the batch they were read with,
+            # so the reject file stays in input order.
+            batch, invalid = [], []
+            for line, row in READERS[format](f):
+                values, genres, errors = validate(model, form_class, row)
+                if errors:
+                    invalid.append((line, row, errors))
+                    continue
+                batch.append((line, row, values, genres or []))
+                if len(batch) < batch_size:
+                    continue
+                batch_rejects, tags = import_batch(kind, batch)
+                for reject in sorted(invalid + batch_rejects, key=lambda r: r[0]):
+                    rejects.write(*reject)
+                imported += len(batch) - len(batch_rejects)
+                response_cache.purge(*tags)
+                batch, invalid = [], []
+            batch_rejects = []
+            if batch:
+                batch_rejects, tags = import_batch(kind, batch)
+                imported += len(batch) - len(batch_rejects)
+                response_cache.purge(*tags)
+            for reject in sorted(invalid + batch_rejects, key=lambda r: r[0]):
+                rejects.write(*reject)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        rejects.close()
+
+    elapsed = time.perf_counter() - started
+    return imported, rejects, elapsed
+
+
+def init_importer(app):
+    @app.cli.command("import")
+    @click.argument("kind", type=click.Choice(list(KINDS)))
+    @click.argument("path")
+    @click.option(
+        "--format",
+        type=click.Choice(sorted(READERS)),
+        help="Defaults to the extension.",
+    )
+    @click.option("--batch-size", default=1000, show_default=True)
+    @click.option("--rejects", help="Where to write rejected rows.")
+    def import_command(kind, path, format, batch_size, rejects):
+        """Import venues, artists or shows from a CSV or NDJSON file.
+
+        Rows are validated with the create forms and inserted in batches;
+        rows that fail are written to a reject file next to the input.
+        Shows refer to existing venues and artists by id.
+        """
+        imported, reject_file, elapsed = import_file(
+            kind, path, format, batch_size, rejects
+        )
+        total = imported + reject_file.count
+        print(
+            "{}: {} imported, {} rejected in {:.1f}s ({:.0f} rows/s)".format(
+                kind, imported, reject_file.count, elapsed, total / (elapsed or 1)
+            )
+        )
+        if reject_file.count:
+            print("rejected rows written to {}".format(reject_file.path))
+        if kind != "shows" and app.config.get("SEARCH_BACKEND") == "memory":
+            print(
+                "app servers pick up the new names within INDEX_SYNC_INTERVAL "
+                "({:.0f}s)".format(app.config["INDEX_SYNC_INTERVAL"])
+            )
@@ -0,0 +1,31 @@
+"""table_versions.changed_at
+
+Revision ID: 34a9c1bed666
+Revises: e5a8c2f19d47
+Create Date: 2026-10-18 16:40:12.204917
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '34a9c1bed666'
+down_revision = 'e5a8c2f19d47'
+branch_labels = None
+depends_on = None
+
+table_versions = sa.table('table_versions', sa.column('changed_at', sa.DateTime))
+
+
+def upgrade():
+    op.add_column('table_versions', sa.Column('changed_at', sa.DateTime(), nullable=True))
+    # Earlier deletes left no timestamp; start from now so no client copy
+    # from before the upgrade counts as fresh.
+    op.execute(table_versions.update().values(changed_at=datetime.datetime.now()))
+
+
+def downgrade():
+    op.drop_column('table_versions', 'changed_at')
@@ -0,0 +1,69 @@
+"""name search indexes
+
+Revision ID: 3c9a7e21b5d4
+Revises: 71343ff28a32
+Create Date: 2026-10-18 10:12:41.512338
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9a7e21b5d4'
+down_revision = '71343ff28a32'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venues', 'artists')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name in TABLES:
+            op.create_index(
+                'ix_{}_name_trgm'.format(name),
+                name,
+                ['name'],
+                postgresql_using='gin',
+                postgresql_ops={'name': 'gin_trgm_ops'},
+            )
+    elif dialect == 'sqlite':
+        for name in TABLES:
+            op.execute(
+                "CREATE VIRTUAL TABLE {0}_fts USING fts5("
+                "name, content='{0}', content_rowid='id', tokenize='trigram')".format(name)
+            )
+            op.execute(
+                "CREATE TRIGGER {0}_fts_ai AFTER INSERT ON {0} BEGIN "
+                "INSERT INTO {0}_fts(rowid, name) VALUES (new.id, new.name); "
+                "END".format(name)
+            )
+            op.execute(
+                "CREATE TRIGGER {0}_fts_ad AFTER DELETE ON {0} BEGIN "
+                "INSERT INTO {0}_fts({0}_fts, rowid, name) "
+                "VALUES ('delete', old.id, old.name); "
+                "END".format(name)
+            )
+            op.execute(
+                "CREATE TRIGGER {0}_fts_au AFTER UPDATE OF name ON {0} BEGIN "
+                "INSERT INTO {0}_fts({0}_fts, rowid, name) "
+                "VALUES ('delete', old.id, old.name); "
+                "INSERT INTO {0}_fts(rowid, name) VALUES (new.id, new.name); "
+                "END".format(name)
+            )
+            op.execute("INSERT INTO {0}_fts({0}_fts) VALUES ('rebuild')".format(name))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for name in TABLES:
+            op.drop_index('ix_{}_name_trgm'.format(name), table_name=name)
+    elif dialect == 'sqlite':
+        for name in TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER IF EXISTS {}_fts_{}'.format(name, suffix))
+            op.execute('DROP TABLE IF EXISTS {}_fts'.format(name))
@@ -0,0 +1,46 @@
+"""show and venue lookup indexes
+
+Revision ID: 5f2c8d94e1a7
+Revises: c71d05e9a3b8
+Create Date: 2026-10-18 13:41:09.382671
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2c8d94e1a7'
+down_revision = 'c71d05e9a3b8'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time']),
+    ('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time']),
+    ('ix_shows_start_time', 'shows', ['start_time']),
+    ('ix_shows_updated_at', 'shows', ['updated_at']),
+    ('ix_venues_city_state', 'venues', ['city', 'state']),
+)
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; on Postgres
+    # build outside it so the tables stay writable during the build.
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,74 @@
+"""show cards read model
+
+Revision ID: 799c850dcf4b
+Revises: c3f9a1d7e254
+Create Date: 2026-10-18 07:10:43.087632
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '799c850dcf4b'
+down_revision = 'c3f9a1d7e254'
+branch_labels = None
+depends_on = None
+
+shows = sa.table('shows', sa.column('id', sa.Integer), sa.column('venue_id', sa.Integer), sa.column('artist_id', sa.Integer), sa.column('start_time', sa.DateTime), sa.column('duration', sa.Integer), sa.column('updated_at', sa.DateTime))
+venues = sa.table('venues', sa.column('id', sa.Integer), sa.column('name', sa.String), sa.column('city', sa.String), sa.column('state', sa.String), sa.column('updated_at', sa.DateTime))
+artists = sa.table('artists', sa.column('id', sa.Integer), sa.column('name', sa.String), sa.column('image_link', sa.String), sa.column('updated_at', sa.DateTime))
+
+
+def upgrade():
+    show_cards = op.create_table('show_cards',
+    sa.Column('show_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('venue_name', sa.String(), nullable=True),
+    sa.Column('venue_city', sa.String(length=120), nullable=True),
+    sa.Column('venue_state', sa.String(length=120), nullable=True),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('artist_name', sa.String(), nullable=True),
+    sa.Column('artist_image_link', sa.String(length=500), nullable=True),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('duration', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['show_id'], ['shows.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('show_id')
+    )
+
+    # changed_at is the latest updated_at of the show, its venue and its
+    # artist; SQLite's max() with several arguments is the scalar maximum.
+    # Filled before the indexes exist, which is quicker than maintaining them
+    # row by row.
+    latest = sa.func.max if op.get_bind().dialect.name == 'sqlite' else sa.func.greatest
+    op.execute(
+        show_cards.insert().from_select(
+            ['show_id', 'venue_id', 'venue_name', 'venue_city', 'venue_state', 'artist_id', 'artist_name', 'artist_image_link', 'start_time', 'duration', 'updated_at', 'changed_at'],
+            sa.select([
+                shows.c.id, shows.c.venue_id, venues.c.name, venues.c.city, venues.c.state,
+                shows.c.artist_id, artists.c.name, artists.c.image_link,
+                shows.c.start_time, shows.c.duration, shows.c.updated_at,
+                latest(shows.c.updated_at, venues.c.updated_at, artists.c.updated_at),
+            ])
+            .select_from(
+                shows.join(venues, venues.c.id == shows.c.venue_id)
+                .join(artists, artists.c.id == shows.c.artist_id)
+            ),
+        )
+    )
+    op.create_index('ix_show_cards_artist_id', 'show_cards', ['artist_id'], unique=False)
+    op.create_index('ix_show_cards_changed_at', 'show_cards', ['changed_at'], unique=False)
+    op.create_index('ix_show_cards_start_time_show_id', 'show_cards', ['start_time', 'show_id'], unique=False)
+    op.create_index('ix_show_cards_venue_id', 'show_cards', ['venue_id'], unique=False)
+    op.create_index('ix_show_cards_venue_state_venue_city_start_time', 'show_cards', ['venue_state', 'venue_city', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_cards_venue_state_venue_city_start_time', table_name='show_cards')
+    op.drop_index('ix_show_cards_venue_id', table_name='show_cards')
+    op.drop_index('ix_show_cards_start_time_show_id', table_name='show_cards')
+    op.drop_index('ix_show_cards_changed_at', table_name='show_cards')
+    op.drop_index('ix_show_cards_artist_id', table_name='show_cards')
+    op.drop_table('show_cards')
@@ -0,0 +1,116 @@
+"""normalize genres
+
+Revision ID: 8e4b1f6a2c90
+Revises: 3c9a7e21b5d4
+Create Date: 2026-10-18 11:02:17.908113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4b1f6a2c90'
+down_revision = '3c9a7e21b5d4'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+genres = sa.table('genres', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+# (entity table, association table, association fk column)
+ENTITIES = (
+    ('venues', 'venue_genres', 'venue_id'),
+    ('artists', 'artist_genres', 'artist_id'),
+)
+
+
+def upgrade():
+    op.create_table('genres',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for entity, association, fk in ENTITIES:
+        op.create_table(association,
+        sa.Column(fk, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([fk], ['{}.id'.format(entity)], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['genres.id'], ),
+        sa.PrimaryKeyConstraint(fk, 'genre_id')
+        )
+        op.create_index(
+            'ix_{}_genre_id_{}'.format(association, fk), association, ['genre_id', fk]
+        )
+
+    bind = op.get_bind()
+    genre_ids = {}
+    for entity, association, fk in ENTITIES:
+        backfill(bind, entity, association, fk, genre_ids)
+
+    for entity, association, fk in ENTITIES:
+        op.drop_column(entity, 'genres')
+
+
+def backfill(bind, entity, association, fk, genre_ids):
+    # Keyset over the entity ids so each batch is a bounded read, then one
+    # insert for new genre names and one executemany for the links.
+    source = sa.table(entity, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+    links = sa.table(association, sa.column(fk, sa.Integer), sa.column('genre_id', sa.Integer))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select([source.c.id, source.c.genres])
+            .where(source.c.id > last_id)
+            .order_by(source.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        parsed = [
+            (row.id, list(dict.fromkeys(name.strip() for name in (row.genres or '').split(':') if name.strip())))
+            for row in rows
+        ]
+        new_names = sorted({name for _, names in parsed for name in names} - set(genre_ids))
+        if new_names:
+            bind.execute(genres.insert(), [{'name': name} for name in new_names])
+            genre_ids.update(
+                bind.execute(
+                    sa.select([genres.c.name, genres.c.id]).where(genres.c.name.in_(new_names))
+                ).fetchall()
+            )
+        values = [
+            {fk: id, 'genre_id': genre_ids[name]} for id, names in parsed for name in names
+        ]
+        if values:
+            bind.execute(links.insert(), values)
+
+
+def downgrade():
+    bind = op.get_bind()
+    for entity, association, fk in ENTITIES:
+        op.add_column(entity, sa.Column('genres', sa.String(length=120), nullable=True))
+        source = sa.table(entity, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        links = sa.table(association, sa.column(fk, sa.Integer), sa.column('genre_id', sa.Integer))
+        joined = {}
+        for id, name in bind.execute(
+            sa.select([links.c[fk], genres.c.name])
+            .select_from(links.join(genres, genres.c.id == links.c.genre_id))
+            .order_by(links.c[fk], genres.c.name)
+        ):
+            joined.setdefault(id, []).append(name)
+        items = list(joined.items())
+        for start in range(0, len(items), BATCH_SIZE):
+            bind.execute(
+                source.update()
+                .where(source.c.id == sa.bindparam('_id'))
+                .values(genres=sa.bindparam('_genres')),
+                [{'_id': id, '_genres': ':'.join(names)} for id, names in items[start:start + BATCH_SIZE]],
+            )
+        op.drop_index('ix_{}_genre_id_{}'.format(association, fk), table_name=association)
+        op.drop_table(association)
+    op.drop_table('genres')
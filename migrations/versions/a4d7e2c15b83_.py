@@ -0,0 +1,52 @@
+"""upcoming show counters
+
+Revision ID: a4d7e2c15b83
+Revises: 5f2c8d94e1a7
+Create Date: 2026-10-18 15:12:44.610392
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d7e2c15b83'
+down_revision = '5f2c8d94e1a7'
+branch_labels = None
+depends_on = None
+
+shows = sa.table('shows', sa.column('id', sa.Integer), sa.column('venue_id', sa.Integer), sa.column('artist_id', sa.Integer), sa.column('start_time', sa.DateTime))
+
+# (entity table, shows fk column)
+COUNTED = (
+    ('venues', 'venue_id'),
+    ('artists', 'artist_id'),
+)
+
+
+def upgrade():
+    for entity, fk in COUNTED:
+        op.add_column(entity, sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(entity, sa.Column('next_show_at', sa.DateTime(), nullable=True))
+        op.create_index(op.f('ix_{}_next_show_at'.format(entity)), entity, ['next_show_at'], unique=False)
+
+    # One correlated UPDATE per table, served by the (fk, start_time) indexes.
+    now = datetime.datetime.now()
+    for entity, fk in COUNTED:
+        table = sa.table(entity, sa.column('id', sa.Integer), sa.column('upcoming_show_count', sa.Integer), sa.column('next_show_at', sa.DateTime))
+        upcoming = sa.and_(shows.c[fk] == table.c.id, shows.c.start_time > now)
+        op.execute(
+            table.update().values(
+                upcoming_show_count=sa.select([sa.func.count(shows.c.id)]).where(upcoming).scalar_subquery(),
+                next_show_at=sa.select([sa.func.min(shows.c.start_time)]).where(upcoming).scalar_subquery(),
+            )
+        )
+
+
+def downgrade():
+    for entity, fk in COUNTED:
+        op.drop_index(op.f('ix_{}_next_show_at'.format(entity)), table_name=entity)
+        op.drop_column(entity, 'next_show_at')
+        op.drop_column(entity, 'upcoming_show_count')
@@ -0,0 +1,53 @@
+"""show durations
+
+Revision ID: b6e31f0d72c4
+Revises: a4d7e2c15b83
+Create Date: 2026-10-18 16:02:31.518264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e31f0d72c4'
+down_revision = 'a4d7e2c15b83'
+branch_labels = None
+depends_on = None
+
+# Postgres only: no two shows of a venue, or of an artist, may overlap.
+# Half-open ranges, so a show may start when the previous one ends.
+EXCLUSIONS = (
+    ('ex_shows_venue_id_during', 'venue_id'),
+    ('ex_shows_artist_id_during', 'artist_id'),
+)
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('duration', sa.Integer(), server_default='120', nullable=False))
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, fk in EXCLUSIONS:
+        # Existing double bookings would fail the whole migration; skip the
+        # constraint instead and leave them to `flask shows conflicts`.
+        savepoint = bind.begin_nested()
+        try:
+            op.execute(
+                "ALTER TABLE shows ADD CONSTRAINT {} EXCLUDE USING gist "
+                "({} WITH =, tsrange(start_time, start_time + duration * interval '1 minute') WITH &&)".format(name, fk)
+            )
+            savepoint.commit()
+        except sa.exc.IntegrityError:
+            savepoint.rollback()
+            print('{} not created: existing shows overlap; fix the ones '
+                  '`flask shows conflicts` lists, then run it with --constrain'.format(name))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name, fk in EXCLUSIONS:
+            op.execute('ALTER TABLE shows DROP CONSTRAINT IF EXISTS {}'.format(name))
+    op.drop_column('shows', 'duration')
@@ -0,0 +1,49 @@
+"""daily show rollup
+
+Revision ID: c3f9a1d7e254
+Revises: b6e31f0d72c4
+Create Date: 2026-10-18 17:20:06.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9a1d7e254'
+down_revision = 'b6e31f0d72c4'
+branch_labels = None
+depends_on = None
+
+shows = sa.table('shows', sa.column('venue_id', sa.Integer), sa.column('start_time', sa.DateTime))
+venues = sa.table('venues', sa.column('id', sa.Integer), sa.column('city', sa.String), sa.column('state', sa.String))
+
+
+def upgrade():
+    show_days = op.create_table('show_days',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('show_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'city', 'state')
+    )
+
+    # SQLite keeps datetimes as text, where CAST would keep only the year.
+    if op.get_bind().dialect.name == 'sqlite':
+        day = sa.func.date(shows.c.start_time)
+    else:
+        day = sa.cast(shows.c.start_time, sa.Date)
+    city = sa.func.coalesce(venues.c.city, '')
+    state = sa.func.coalesce(venues.c.state, '')
+    op.execute(
+        show_days.insert().from_select(
+            ['day', 'city', 'state', 'show_count'],
+            sa.select([day, city, state, sa.func.count()])
+            .select_from(shows.join(venues, venues.c.id == shows.c.venue_id))
+            .group_by(day, city, state),
+        )
+    )
+
+
+def downgrade():
+    op.drop_table('show_days')
@@ -0,0 +1,37 @@
+"""updated_at columns
+
+Revision ID: c71d05e9a3b8
+Revises: 8e4b1f6a2c90
+Create Date: 2026-10-18 12:20:55.071245
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71d05e9a3b8'
+down_revision = '8e4b1f6a2c90'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venues', 'artists', 'shows')
+
+
+def upgrade():
+    # SQLite cannot add a NOT NULL column without a constant default, so add
+    # it nullable, backfill, then tighten where the dialect allows it.
+    now = datetime.datetime.now()
+    for name in TABLES:
+        op.add_column(name, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        table = sa.table(name, sa.column('updated_at', sa.DateTime))
+        op.execute(table.update().values(updated_at=now))
+        if op.get_bind().dialect.name != 'sqlite':
+            op.alter_column(name, 'updated_at', nullable=False)
+
+
+def downgrade():
+    for name in TABLES:
+        op.drop_column(name, 'updated_at')
@@ -0,0 +1,41 @@
+"""table versions and updated_at indexes
+
+Revision ID: e5a8c2f19d47
+Revises: 799c850dcf4b
+Create Date: 2026-10-18 11:02:16.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8c2f19d47'
+down_revision = '799c850dcf4b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_versions = op.create_table('table_versions',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_versions, [{'name': 'venues', 'version': 0}, {'name': 'artists', 'version': 0}])
+    op.create_index(op.f('ix_venues_updated_at'), 'venues', ['updated_at'], unique=False)
+    op.create_index(op.f('ix_artists_updated_at'), 'artists', ['updated_at'], unique=False)
+    op.drop_index('ix_show_cards_venue_id', table_name='show_cards')
+    op.drop_index('ix_show_cards_artist_id', table_name='show_cards')
+    op.create_index('ix_show_cards_venue_id_changed_at', 'show_cards', ['venue_id', 'changed_at'], unique=False)
+    op.create_index('ix_show_cards_artist_id_changed_at', 'show_cards', ['artist_id', 'changed_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_cards_artist_id_changed_at', table_name='show_cards')
+    op.drop_index('ix_show_cards_venue_id_changed_at', table_name='show_cards')
+    op.create_index('ix_show_cards_artist_id', 'show_cards', ['artist_id'], unique=False)
+    op.create_index('ix_show_cards_venue_id', 'show_cards', ['venue_id'], unique=False)
+    op.drop_index(op.f('ix_artists_updated_at'), table_name='artists')
+    op.drop_index(op.f('ix_venues_updated_at'), table_name='venues')
+    op.drop_table('table_versions')
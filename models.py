@@ -1,6 +1,16 @@
-from flask_sqlalchemy import SQLAlchemy
+import datetime
 
-db = SQLAlchemy()
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from replicas import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+# Dialects with INSERT ... ON CONFLICT.
+UPSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
 
 
 def setup_db(app):
@@ -9,8 +19,73 @@ def setup_db(app):
     db.init_app(app)
 
 
+venue_genres = db.Table(
+    "venue_genres",
+    db.Column(
+        "venue_id",
+        db.Integer,
+        db.ForeignKey("venues.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Column("genre_id", db.Integer, db.ForeignKey("genres.id"), primary_key=True),
+    db.Index("ix_venue_genres_genre_id_venue_id", "genre_id", "venue_id"),
+)
+
+artist_genres = db.Table(
+    "artist_genres",
+    db.Column(
+        "artist_id",
+        db.Integer,
+        db.ForeignKey("artists.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Column("genre_id", db.Integer, db.ForeignKey("genres.id"), primary_key=True),
+    db.Index("ix_artist_genres_genre_id_artist_id", "genre_id", "artist_id"),
+)
+
+
+class Genre(db.Model):
+    __tablename__ = "genres"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @classmethod
+    def get_or_create(cls, names):
+        # Two requests may add the same new genre at once: the missing names
+        # are inserted skipping any another transaction got in first, then
+        # read back.
+        names = [name for name in dict.fromkeys(names) if name]
+        if not names:
+            return []
+        existing = {
+            genre.name: genre for genre in cls.query.filter(cls.name.in_(names))
+        }
+        missing = [name for name in names if name not in existing]
+        if missing:
+            insert = UPSERTS.get(db.engine.dialect.name)
+            if insert is not None:
+                db.session.execute(
+                    insert(cls.__table__)
+                    .values([{"name": name} for name in missing])
+                    .on_conflict_do_nothing(index_elements=[cls.name])
+                )
+            else:
+                for name in missing:
+                    try:
+                        with db.session.begin_nested():
+                            db.session.execute(cls.__table__.insert().values(name=name))
+                    except IntegrityError:
+                        pass
+            existing.update(
+                (genre.name, genre) for genre in cls.query.filter(cls.name.in_(missing))
+            )
+        return [existing[name] for name in names]
+
+
 class Venue(db.Model):
     __tablename__ = "venues"
+    __table_args__ = (db.Index("ix_venues_city_state", "city", "state"),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
@@ -23,12 +98,24 @@ class Venue(db.Model):
     )
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
-    genres = db.Column(db.String(120))
+    genres = db.relationship("Genre", secondary=venue_genres, order_by="Genre.name")
     seeking_description = db.Column(
         db.String(500),
         default="We are on the lookout for a local artist to play every two weeks. Please call us.",
     )
     website = db.Column(db.String(120), default="")
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.datetime.now,
+        onupdate=datetime.datetime.now,
+        index=True,
+    )
+    # Maintained by counters.py: upcoming shows and the soonest of them.
+    upcoming_show_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    next_show_at = db.Column(db.DateTime, index=True)
     shows = db.relationship("Show", backref="venue", lazy=True)
 
 
@@ -40,7 +127,7 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.relationship("Genre", secondary=artist_genres, order_by="Genre.name")
     seeking_description = db.Column(
         db.String(500),
         default="Looking for shows to perform at in the San Francisco Bay Area!",
@@ -52,13 +139,107 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     website = db.Column(db.String(120), default="")
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.datetime.now,
+        onupdate=datetime.datetime.now,
+        index=True,
+    )
+    # Maintained by counters.py: upcoming shows and the soonest of them.
+    upcoming_show_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    next_show_at = db.Column(db.DateTime, index=True)
     shows = db.relationship("Show", backref="artist", lazy=True)
 
 
 class Show(db.Model):
     __tablename__ = "shows"
+    __table_args__ = (
+        db.Index("ix_shows_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_shows_artist_id_start_time", "artist_id", "start_time"),
+        db.Index("ix_shows_start_time", "start_time"),
+        db.Index("ix_shows_updated_at", "updated_at"),
+    )
 
     id = db.Column(db.Integer, autoincrement=True, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey("venues.id"), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey("artists.id"), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    # Minutes. On Postgres, exclusion constraints (see the b6e31f0d72c4
+    # migration) keep shows of a venue or an artist from overlapping.
+    duration = db.Column(db.Integer, nullable=False, default=120, server_default="120")
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.datetime.now,
+        onupdate=datetime.datetime.now,
+    )
+
+
+class ShowDay(db.Model):
+    # Shows per day and venue city/state, maintained by rollups.py. A venue
+    # without a city or state is counted under "".
+    __tablename__ = "show_days"
+
+    day = db.Column(db.Date, primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    state = db.Column(db.String(120), primary_key=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ShowCard(db.Model):
+    # One row per show with the venue and artist columns show listings
+    # print, maintained by cards.py so /shows, the calendar and the export
+    # read this table alone instead of joining shows, venues and artists.
+    __tablename__ = "show_cards"
+    __table_args__ = (
+        db.Index("ix_show_cards_start_time_show_id", "start_time", "show_id"),
+        db.Index(
+            "ix_show_cards_venue_state_venue_city_start_time",
+            "venue_state",
+            "venue_city",
+            "start_time",
+        ),
+        db.Index("ix_show_cards_venue_id_changed_at", "venue_id", "changed_at"),
+        db.Index("ix_show_cards_artist_id_changed_at", "artist_id", "changed_at"),
+        db.Index("ix_show_cards_changed_at", "changed_at"),
+    )
+
+    show_id = db.Column(
+        db.Integer, db.ForeignKey("shows.id", ondelete="CASCADE"), primary_key=True
+    )
+    venue_id = db.Column(db.Integer, nullable=False)
+    venue_name = db.Column(db.String)
+    venue_city = db.Column(db.String(120))
+    venue_state = db.Column(db.String(120))
+    artist_id = db.Column(db.Integer, nullable=False)
+    artist_name = db.Column(db.String)
+    artist_image_link = db.Column(db.String(500))
+    start_time = db.Column(db.DateTime, nullable=False)
+    duration = db.Column(db.Integer, nullable=False)
+    # The show's own updated_at, and when any column of this card last
+    # changed (a venue or artist rename included).
+    updated_at = db.Column(db.DateTime, nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+
+class TableVersion(db.Model):
+    # A counter per table, bumped by versions.py on every write and delete,
+    # so the list page versions need not count the rows. changed_at is when
+    # it was last bumped, so Last-Modified also moves on a delete.
+    __tablename__ = "table_versions"
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    changed_at = db.Column(db.DateTime)
+
+
+@event.listens_for(db.session, "before_flush")
+def touch_updated_at(session, flush_context, instances):
+    # onupdate only fires when a column of the row itself changes; genre
+    # edits only touch the association tables, so bump those rows here.
+    for obj in session.dirty:
+        if isinstance(obj, (Venue, Artist)) and session.is_modified(obj):
+            obj.updated_at = datetime.datetime.now()
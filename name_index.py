@@ -0,0 +1,273 @@
+import datetime
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import event, inspect
+
+from models import db, Venue, Artist, TableVersion
+
+Hit = namedtuple("Hit", ["id", "name", "rank"])
+
+INDEXED_MODELS = (Venue, Artist)
+
+# Each worker process builds its own index on first use and applies its own
+# writes as they commit. Writes made by other workers and by bulk imports
+# are picked up by a re-sync every INDEX_SYNC_INTERVAL seconds: names with
+# an updated_at since the last sync, minus SYNC_OVERLAP for transactions
+# that committed late. That covers inserts and renames with one range read
+# of the updated_at index. Rows other workers deleted are only dropped when
+# the index is rebuilt, every INDEX_REBUILD_INTERVAL seconds or after
+# `flask search-index rebuild`, which bumps the REBUILD_VERSION counter.
+SYNC_OVERLAP = datetime.timedelta(minutes=1)
+REBUILD_VERSION = "name_index"
+
+
+def trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class NgramIndex:
+    # Inverted trigram index over lower-cased names. Posting lists are sorted
+    # array('I') of ids (4 bytes per entry) rather than sets of int objects.
+
+    def __init__(self):
+        self.names = {}
+        self.lowered = {}
+        self.postings = {}
+        self.lock = threading.RLock()
+        # Where the last sync left off: the rebuild counter the index was
+        # built at and the time the sync started, and when the index was
+        # built and last synced (monotonic).
+        self.version = None
+        self.since = None
+        self.built_at = None
+        self.synced_at = None
+        self.sync_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, id, name):
+        with self.lock:
+            if id in self.names:
+                self.remove(id)
+            name = name or ""
+            self.names[id] = name
+            self.lowered[id] = name.lower()
+            for gram in trigrams(self.lowered[id]):
+                posting = self.postings.get(gram)
+                if posting is None:
+                    self.postings[gram] = array("I", [id])
+                elif posting[-1] < id:
+                    posting.append(id)
+                else:
+                    posting.insert(bisect_left(posting, id), id)
+
+    def remove(self, id):
+        with self.lock:
+            lowered = self.lowered.pop(id, None)
+            if lowered is None:
+                return
+            del self.names[id]
+            for gram in trigrams(lowered):
+                posting = self.postings[gram]
+                del posting[bisect_left(posting, id)]
+                if not posting:
+                    del self.postings[gram]
+
+    def search(self, term):
+        term = term.lower()
+        grams = trigrams(term)
+        with self.lock:
+            if not grams:
+                candidates = self.lowered
+            else:
+                lists = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+                candidates = set(lists[0])
+                for posting in lists[1:]:
+                    if not candidates:
+                        break
+                    candidates.intersection_update(posting)
+            # Trigram hits are only candidates: "abcd" and "bcab" share grams
+            # without containing each other, so confirm the substring.
+            matches = [id for id in candidates if term in self.lowered[id]]
+            # Rank like pg_trgm similarity: the larger the share of the name
+            # covered by the term, the better the match. Lower sorts first.
+            hits = []
+            for id in matches:
+                coverage = len(grams) / max(len(self.lowered[id]) - 2, 1)
+                hits.append(Hit(id, self.names[id], -coverage))
+            hits.sort(key=lambda hit: (hit.rank, hit.id))
+            return hits
+
+
+name_indexes = {}
+_build_lock = threading.Lock()
+
+
+def rebuild_version():
+    return (
+        db.session.query(TableVersion.version)
+        .filter(TableVersion.name == REBUILD_VERSION)
+        .scalar()
+    )
+
+
+def build_name_index(model):
+    index = NgramIndex()
+    index.version, index.since = rebuild_version(), datetime.datetime.now()
+    for id, name in db.session.query(model.id, model.name).yield_per(10000):
+        index.add(id, name)
+    index.built_at = index.synced_at = time.monotonic()
+    return index
+
+
+def sync_name_index(model, index):
+    started = datetime.datetime.now()
+    changed = db.session.query(model.id, model.name).filter(
+        model.updated_at >= index.since - SYNC_OVERLAP
+    )
+    for id, name in changed.yield_per(10000):
+        index.add(id, name)
+    index.since = started
+    index.synced_at = time.monotonic()
+
+
+def request_rebuild():
+    # Every worker rebuilds its indexes on its next sync.
+    versions = TableVersion.__table__
+    connection = db.session.connection()
+    bumped = connection.execute(
+        versions.update()
+        .where(versions.c.name == REBUILD_VERSION)
+        .values(version=versions.c.version + 1)
+    ).rowcount
+    if not bumped:
+        connection.execute(versions.insert().values(name=REBUILD_VERSION, version=1))
+    db.session.commit()
+
+
+def index_drift(model, index):
+    # Ids whose name is missing, extra or stale against the database, and
+    # trigrams whose posting list is not the sorted ids of the names that
+    # contain them.
+    in_db = {id: name or "" for id, name in db.session.query(model.id, model.name)}
+    with index.lock:
+        in_index = dict(index.names)
+        expected = {}
+        for id in sorted(index.lowered):
+            for gram in trigrams(index.lowered[id]):
+                expected.setdefault(gram, []).append(id)
+        postings = {gram: list(posting) for gram, posting in index.postings.items()}
+    return {
+        "missing": sorted(set(in_db) - set(in_index)),
+        "extra": sorted(set(in_index) - set(in_db)),
+        "stale": sorted(
+            id for id in set(in_db) & set(in_index) if in_db[id] != in_index[id]
+        ),
+        "postings": sorted(
+            gram
+            for gram in expected.keys() | postings.keys()
+            if expected.get(gram) != postings.get(gram)
+        ),
+    }
+
+
+def get_name_index(model):
+    index = name_indexes.get(model)
+    if index is None:
+        with _build_lock:
+            index = name_indexes.get(model)
+            if index is None:
+                index = name_indexes[model] = build_name_index(model)
+    elif time.monotonic() - index.synced_at >= current_app.config[
+        "INDEX_SYNC_INTERVAL"
+    ] and index.sync_lock.acquire(blocking=False):
+        # One request per worker syncs; the others keep serving the index
+        # until a rebuild replaces it.
+        try:
+            if (
+                time.monotonic() - index.built_at
+                >= current_app.config["INDEX_REBUILD_INTERVAL"]
+                or rebuild_version() != index.version
+            ):
+                name_indexes[model] = build_name_index(model)
+            else:
+                sync_name_index(model, index)
+        finally:
+            index.sync_lock.release()
+    return name_indexes[model]
+
+
+# Write-through: collect venue/artist changes per flush and apply them to
+# built indexes only once the transaction commits.
+
+
+def _pending(session):
+    return session.info.setdefault("name_index_pending", [])
+
+
+def _after_flush(session, flush_context):
+    pending = _pending(session)
+    for obj in session.new:
+        if isinstance(obj, INDEXED_MODELS):
+            pending.append((type(obj), obj.id, obj.name))
+    for obj in session.dirty:
+        if isinstance(obj, INDEXED_MODELS):
+            if inspect(obj).attrs.name.history.has_changes():
+                pending.append((type(obj), obj.id, obj.name))
+    for obj in session.deleted:
+        if isinstance(obj, INDEXED_MODELS):
+            pending.append((type(obj), obj.id, None))
+
+
+def _after_commit(session):
+    for model, id, name in session.info.pop("name_index_pending", ()):
+        index = name_indexes.get(model)
+        if index is None:
+            continue
+        if name is None:
+            index.remove(id)
+        else:
+            index.add(id, name)
+
+
+def _after_rollback(session):
+    session.info.pop("name_index_pending", None)
+
+
+def init_name_index(app):
+    event.listen(db.session, "after_flush", _after_flush)
+    event.listen(db.session, "after_commit", _after_commit)
+    event.listen(db.session, "after_rollback", _after_rollback)
+
+    @app.cli.group("search-index")
+    def search_index():
+        """Maintain the in-process name search indexes."""
+
+    @search_index.command("rebuild")
+    def rebuild():
+        """Make every app server rebuild its name indexes on its next sync."""
+        request_rebuild()
+        print(
+            "app servers rebuild their name indexes within INDEX_SYNC_INTERVAL "
+            "({:.0f}s)".format(app.config["INDEX_SYNC_INTERVAL"])
+        )
+
+    @search_index.command("check")
+    def check():
+        """Build the name indexes and compare them against the database."""
+        drifted = False
+        for model in INDEXED_MODELS:
+            drift = index_drift(model, build_name_index(model))
+            for kind, keys in drift.items():
+                if keys:
+                    drifted = True
+                    print("{} {}: {}".format(model.__tablename__, kind, keys[:20]))
+        if drifted:
+            raise SystemExit(1)
+        print("name indexes match the database")
@@ -0,0 +1,157 @@
+import base64
+import datetime
+import json
+from collections import namedtuple
+
+from flask import abort, current_app, request, url_for
+from sqlalchemy import tuple_
+
+Page = namedtuple("Page", ["items", "next_cursor", "prev_cursor"])
+
+
+def encode_cursor(key):
+    values = [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in key
+    ]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(token, types):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if len(values) != len(types):
+            raise ValueError(token)
+        return tuple(
+            (
+                datetime.datetime.fromisoformat(value)
+                if type_ is datetime.datetime
+                else type_(value)
+            )
+            for type_, value in zip(types, values)
+        )
+    except (ValueError, TypeError):
+        abort(400)
+
+
+def cursor_arg(name, types):
+    token = request.args.get(name)
+    return decode_cursor(token, types) if token else None
+
+
+def page_args(types):
+    # (after, before, per_page) from the query string; cursors are opaque
+    # tokens holding the sort key of the last/first row of the adjacent page.
+    after = request.args.get("after")
+    before = request.args.get("before")
+    per_page = current_app.config.get("PER_PAGE", 50)
+    return (
+        decode_cursor(after, types) if after else None,
+        decode_cursor(before, types) if before else None,
+        per_page,
+    )
+
+
+def keyset_page(
+    query, order_by, key, after=None, before=None, per_page=50, descending=False
+):
+    # order_by lists the sort columns, ending in a unique one; key(row)
+    # returns the matching tuple. Each page is a range scan that starts at
+    # the cursor, so its cost does not grow with the page number.
+    sort_key = tuple_(*order_by)
+    forward = [column.desc() if descending else column for column in order_by]
+    backward = [column if descending else column.desc() for column in order_by]
+
+    def beyond(cursor):
+        return sort_key < cursor if descending else sort_key > cursor
+
+    def behind(cursor):
+        return sort_key > cursor if descending else sort_key < cursor
+
+    if before is not None:
+        rows = (
+            query.filter(behind(before)).order_by(*backward).limit(per_page + 1).all()
+        )
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return Page(
+            rows,
+            encode_cursor(key(rows[-1])) if rows else None,
+            encode_cursor(key(rows[0])) if has_more else None,
+        )
+
+    if after is not None:
+        query = query.filter(beyond(after))
+    rows = query.order_by(*forward).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    return Page(
+        rows,
+        encode_cursor(key(rows[-1])) if has_more else None,
+        encode_cursor(key(rows[0])) if after is not None and rows else None,
+    )
+
+
+def list_page(items, key, after=None, before=None, per_page=50):
+    # Same contract as keyset_page for results that are already in memory
+    # and sorted by key.
+    if before is not None:
+        older = [item for item in items if key(item) < before]
+        rows = older[-per_page:]
+        has_more = len(older) > per_page
+        return Page(
+            rows,
+            encode_cursor(key(rows[-1])) if rows else None,
+            encode_cursor(key(rows[0])) if has_more else None,
+        )
+
+    if after is not None:
+        items = [item for item in items if key(item) > after]
+    rows = items[:per_page]
+    return Page(
+        rows,
+        encode_cursor(key(rows[-1])) if len(items) > per_page else None,
+        encode_cursor(key(rows[0])) if after is not None and rows else None,
+    )
+
+
+def page_url(**cursor):
+    # Link to the same view with the current filters and a new cursor; POSTed
+    # search terms are carried over so pages of a search are plain GETs.
+    args = request.values.to_dict(flat=False)
+    args.pop("after", None)
+    args.pop("before", None)
+    args.pop("csrf_token", None)
+    args.update((name, value) for name, value in cursor.items() if value)
+    return url_for(request.endpoint, **dict(request.view_args or {}, **args))
+
+
+def facet_url(name, value, single=False):
+    # Link to the same view with value toggled in the repeated argument
+    # name, back on the first page; single facets hold at most one value.
+    args = request.args.to_dict(flat=False)
+    args.pop("after", None)
+    args.pop("before", None)
+    values = args.get(name, [])
+    if value in values:
+        values.remove(value)
+    elif single:
+        values = [value]
+    else:
+        values.append(value)
+    args[name] = values
+    return url_for(request.endpoint, **dict(request.view_args or {}, **args))
+
+
+def buffered(chunks, size=16384):
+    # Jinja yields many tiny strings while streaming; group them so each
+    # write to the client carries a useful amount of data.
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
@@ -0,0 +1,179 @@
+import json
+import re
+
+import click
+from sqlalchemy import event
+
+from models import db, Genre, Venue, Artist, Show
+from name_index import get_name_index
+from search import get_search_backend
+
+# Each read route with the tables it is allowed to read in full. Everything
+# else must be reached through an index: a sequential scan there means a
+# page whose cost grows with the size of the table. genres is a small lookup
+# table and may always be scanned.
+ALWAYS_SCANNED = {"genres"}
+
+ROUTES = (
+    # Every venue is listed.
+    ("/venues", {"venues"}),
+    ("/venues?genre={genre}", set()),
+    ("/venues/{venue_id}", set()),
+    # Pages walk artists in id order, which SQLite reports as a scan.
+    ("/artists", {"artists"}),
+    ("/artists?genre={genre}", set()),
+    ("/artists/{artist_id}", set()),
+    ("/shows", set()),
+    # Counts come from the show_days rollup; shows are read by start_time.
+    ("/shows/calendar?bucket=week", set()),
+    ("/shows/calendar?city={city}", set()),
+)
+
+# Name search may read the names in full only on the scan backend. The
+# indexed backends must also show their lookup in some plan: the FTS5
+# virtual table on SQLite, the pg_trgm index on Postgres. The memory
+# backend never queries names, so it only has to avoid scans.
+SEARCH_ROUTES = (
+    ("/venues/search?search_term={term}", Venue),
+    ("/artists/search?search_term={term}", Artist),
+)
+SEARCH_LOOKUPS = {"fts5": "{}_fts VIRTUAL TABLE", "trigram": "ix_{}_name_trgm"}
+
+# SQLite reports a rowid-order table scan as a bare "SCAN <table>"; walks
+# of an index ("USING INDEX") and FTS5 lookups ("VIRTUAL TABLE") are not.
+SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)\b(?! USING| VIRTUAL TABLE| ROW)")
+
+
+def _sqlite_scans(connection, statement, parameters):
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    details = [row[-1] for row in rows]
+    scans = set()
+    for detail in details:
+        match = SQLITE_SCAN.match(detail)
+        if match:
+            scans.add(match.group(1))
+    return scans, details
+
+
+def _postgresql_scans(connection, statement, parameters):
+    rows = connection.exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + statement, parameters
+    ).scalar()
+    plan = rows if isinstance(rows, list) else json.loads(rows)
+    scans = set()
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan":
+            scans.add(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return scans, json.dumps(plan, indent=2).splitlines()
+
+
+EXPLAINERS = {"sqlite": _sqlite_scans, "postgresql": _postgresql_scans}
+
+
+def route_urls():
+    # [(url, tables allowed a full scan, text the plans must contain)]
+    genre = Genre.query.order_by(Genre.name).first()
+    values = dict(
+        venue_id=db.session.query(db.func.max(Venue.id)).scalar(),
+        artist_id=db.session.query(db.func.max(Artist.id)).scalar(),
+        genre=genre.name if genre else "Jazz",
+        term="the",
+        city=db.session.query(Venue.city).order_by(Venue.id).limit(1).scalar(),
+    )
+    urls = [(url.format(**values), allowed, None) for url, allowed in ROUTES]
+    backend = get_search_backend().name
+    for url, model in SEARCH_ROUTES:
+        table = model.__tablename__
+        lookup = SEARCH_LOOKUPS.get(backend)
+        if backend == "memory":
+            # The index is built from one read of the names on the first
+            # search; that is not the route's plan.
+            get_name_index(model)
+        urls.append(
+            (
+                url.format(**values),
+                {table} if backend == "scan" else set(),
+                lookup.format(table) if lookup else None,
+            )
+        )
+    return urls
+
+
+def capture_queries(app, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith("SELECT") and not many:
+            statements.append((statement, parameters))
+
+    engine = db.get_engine()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = app.test_client().get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return response.status_code, statements
+
+
+def check_plans(app, verbose=False):
+    # Returns the list of (url, problem, statement, plan) regressions.
+    engine = db.get_engine()
+    explain = EXPLAINERS.get(engine.dialect.name)
+    if explain is None:
+        raise click.ClickException(
+            "No EXPLAIN support for {}".format(engine.dialect.name)
+        )
+
+    regressions = []
+    with app.app_context():
+        urls = route_urls()
+    for url, allowed, lookup in urls:
+        status, statements = capture_queries(app, url)
+        if status != 200:
+            raise click.ClickException("{} returned {}".format(url, status))
+        looked_up = False
+        with engine.connect() as connection:
+            for statement, parameters in statements:
+                scans, plan = explain(connection, statement, parameters)
+                unexpected = scans - allowed - ALWAYS_SCANNED
+                if unexpected:
+                    problem = "full scan of {}".format(", ".join(sorted(unexpected)))
+                    regressions.append((url, problem, statement, plan))
+                if lookup and any(lookup in line for line in plan):
+                    looked_up = True
+                if verbose:
+                    print(url)
+                    print("  " + " ".join(statement.split()))
+                    for line in plan:
+                        print("    " + line)
+        if lookup and not looked_up:
+            regressions.append((url, "no plan uses {}".format(lookup), "", []))
+        print("{}: {} queries checked".format(url, len(statements)))
+    return regressions
+
+
+def init_plans(app):
+    @app.cli.command("check-plans")
+    @click.option("--verbose", is_flag=True, help="Print every query plan.")
+    def check_plans_command(verbose):
+        """Fail if a read route's queries fall back to a full table scan.
+
+        Run it against a seeded database large enough for the planner to
+        prefer indexes; Postgres picks sequential scans on tiny tables.
+        """
+        shows = db.session.query(db.func.count(Show.id)).scalar()
+        if shows < 10000 and db.get_engine().dialect.name == "postgresql":
+            print("warning: only {} shows, plans may not use indexes".format(shows))
+        regressions = check_plans(app, verbose)
+        for url, problem, statement, plan in regressions:
+            print("\n{}: {}".format(url, problem))
+            if statement:
+                print("  " + " ".join(statement.split()))
+            for line in plan:
+                print("    " + line)
+        if regressions:
+            raise SystemExit(1)
+        print("no unexpected full table scans or missing index lookups")
@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+import weakref
+
+from flask import current_app
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+from models import db
+
+# Connection pool settings from config (DB_POOL_*), and pool metrics for
+# /metrics: checkouts, checkout wait time, connections opened, invalidated
+# and timed out, and how many connections are checked out. Every worker
+# process has its own pools, so every worker reports its own numbers
+# (labelled with its pid), one set per engine (labelled pool="primary" or
+# with the replica's bind name).
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {
+            "connects": 0,
+            "checkouts": 0,
+            "checkins": 0,
+            "invalidations": 0,
+            "timeouts": 0,
+        }
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def checkout(self):
+        with self.lock:
+            self.counters["checkouts"] += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def checkin(self):
+        with self.lock:
+            self.counters["checkins"] += 1
+            self.checked_out -= 1
+
+    def waited(self, seconds):
+        with self.lock:
+            self.wait_count += 1
+            self.wait_sum += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait_buckets[i] += 1
+
+
+# engine -> its PoolStats, for every engine watched since the worker started.
+engine_stats = weakref.WeakKeyDictionary()
+
+
+class WaitTimer:
+    # Times how long getting a connection from the pool takes: the wait for a
+    # free connection, plus connecting when a new one has to be opened.
+
+    stats = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.count("timeouts")
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.waited(time.perf_counter() - started)
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool; it keeps the listeners, and
+        # the numbers go on in the same stats.
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(WaitTimer, QueuePool):
+    pass
+
+
+class TimedNullPool(WaitTimer, NullPool):
+    pass
+
+
+def pool_options(config):
+    # SQLite keeps the pool Flask-SQLAlchemy picks for it (NullPool for
+    # files, StaticPool in memory); its connections are local files.
+    if make_url(config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() == "sqlite":
+        return {}
+    options = {"pool_pre_ping": config["DB_POOL_PRE_PING"]}
+    if config["DB_NULL_POOL"]:
+        # Behind PgBouncer in transaction mode: it does the pooling, so
+        # every checkout opens (and every checkin closes) a connection.
+        options["poolclass"] = TimedNullPool
+        return options
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+        pool_recycle=config["DB_POOL_RECYCLE"],
+    )
+    return options
+
+
+def watch_engine(engine):
+    stats = engine_stats[engine] = PoolStats()
+    if isinstance(engine.pool, WaitTimer):
+        engine.pool.stats = stats
+    event.listen(engine, "connect", lambda *args: stats.count("connects"))
+    event.listen(engine, "checkout", lambda *args: stats.checkout())
+    event.listen(engine, "checkin", lambda *args: stats.checkin())
+    event.listen(engine, "invalidate", lambda *args: stats.count("invalidations"))
+
+
+def _metric(lines, name, kind, help, samples):
+    lines.append("# HELP fyyur_db_pool_{} {}".format(name, help))
+    lines.append("# TYPE fyyur_db_pool_{} {}".format(name, kind))
+    for labels, value in samples:
+        lines.append("fyyur_db_pool_{}{{{}}} {}".format(name, labels, value))
+
+
+def _snapshot(stats):
+    with stats.lock:
+        return {
+            "counters": dict(stats.counters),
+            "checked_out": stats.checked_out,
+            "max_checked_out": stats.max_checked_out,
+            "buckets": list(stats.wait_buckets),
+            "wait_count": stats.wait_count,
+            "wait_sum": stats.wait_sum,
+            "wait_max": stats.wait_max,
+        }
+
+
+def metrics_text(engines):
+    # engines: (label, engine) pairs, the primary first.
+    pools = []
+    for label, engine in engines:
+        labels = 'pid="{}",pool="{}"'.format(os.getpid(), label)
+        stats = engine_stats.get(engine) or PoolStats()
+        pools.append((labels, engine.pool, _snapshot(stats)))
+    lines = []
+
+    for name, help in (
+        ("connects", "DBAPI connections opened."),
+        ("checkouts", "Connections checked out of the pool."),
+        ("checkins", "Connections returned to the pool."),
+        ("invalidations", "Connections invalidated (errors, failed pings)."),
+        ("timeouts", "Checkouts that gave up after DB_POOL_TIMEOUT."),
+    ):
+        _metric(
+            lines,
+            name + "_total",
+            "counter",
+            help,
+            [(labels, snap["counters"][name]) for labels, _, snap in pools],
+        )
+
+    _metric(
+        lines,
+        "checked_out",
+        "gauge",
+        "Connections currently checked out.",
+        [(labels, snap["checked_out"]) for labels, _, snap in pools],
+    )
+    _metric(
+        lines,
+        "max_checked_out",
+        "gauge",
+        "Most connections checked out at once since the worker started.",
+        [(labels, snap["max_checked_out"]) for labels, _, snap in pools],
+    )
+    queued = [
+        (labels, pool) for labels, pool, _ in pools if isinstance(pool, QueuePool)
+    ]
+    if queued:
+        _metric(
+            lines,
+            "size",
+            "gauge",
+            "Configured pool size.",
+            [(labels, pool.size()) for labels, pool in queued],
+        )
+        _metric(
+            lines,
+            "idle",
+            "gauge",
+            "Open connections waiting in the pool.",
+            [(labels, pool.checkedin()) for labels, pool in queued],
+        )
+        _metric(
+            lines,
+            "overflow",
+            "gauge",
+            "Connections open beyond the pool size (negative: unused slots).",
+            [(labels, pool.overflow()) for labels, pool in queued],
+        )
+
+    timed = [
+        (labels, snap) for labels, pool, snap in pools if isinstance(pool, WaitTimer)
+    ]
+    if timed:
+        histogram = "fyyur_db_pool_wait_seconds"
+        _metric(
+            lines,
+            "wait_seconds",
+            "histogram",
+            "Time to get a connection from the pool.",
+            [],
+        )
+        for labels, snap in timed:
+            for bound, count in zip(
+                WAIT_BUCKETS + ("+Inf",), snap["buckets"] + [snap["wait_count"]]
+            ):
+                lines.append(
+                    '{}_bucket{{{},le="{}"}} {}'.format(histogram, labels, bound, count)
+                )
+            lines.append(
+                "{}_sum{{{}}} {:.6f}".format(histogram, labels, snap["wait_sum"])
+            )
+            lines.append(
+                "{}_count{{{}}} {}".format(histogram, labels, snap["wait_count"])
+            )
+        _metric(
+            lines,
+            "wait_seconds_max",
+            "gauge",
+            "Longest wait for a connection since the worker started.",
+            [(labels, "{:.6f}".format(snap["wait_max"])) for labels, snap in timed],
+        )
+    return "\n".join(lines) + "\n"
+
+
+def init_pool(app):
+    # Must run before the engine is first used: the options only apply to
+    # an engine created after them.
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    for name, value in pool_options(app.config).items():
+        options.setdefault(name, value)
+
+    if not app.config.get("POOL_METRICS"):
+        return
+
+    # Engines are created lazily, on first use; watch each as it is made.
+    if watch_engine not in db.engine_hooks:
+        db.engine_hooks.append(watch_engine)
+
+    @app.route("/metrics")
+    def metrics():
+        engines = [("primary", db.engine)]
+        replicas = current_app.extensions.get("replicas")
+        if replicas is not None:
+            engines += [(replica.bind, replica.engine) for replica in replicas.replicas]
+        return current_app.response_class(
+            metrics_text(engines), mimetype="text/plain; version=0.0.4"
+        )
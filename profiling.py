@@ -0,0 +1,192 @@
+import hmac
+import json
+import logging
+import threading
+import time
+
+from flask import abort, g, has_request_context, render_template, request
+from flask import signals
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Opt-in (SQL_PROFILING): times every statement and template render of a
+# request, reports them in a Server-Timing header and one JSON log line,
+# writes statements slower than SLOW_QUERY_MS to the slow-query log and
+# keeps per-route totals for /_profile. The page lists every route's SQL
+# timings, so it only exists when PROFILE_TOKEN is set and answers 404 to
+# requests that do not send it.
+
+slow_log = logging.getLogger("fyyur.slow_queries")
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest = None
+
+    def add_query(self, statement, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest = statement
+
+
+class RouteStats:
+    # Totals per (method, route) since the process started.
+
+    def __init__(self):
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def add(self, route, profile, total):
+        with self.lock:
+            stats = self.routes.setdefault(
+                route,
+                {
+                    "requests": 0,
+                    "total_time": 0.0,
+                    "db_time": 0.0,
+                    "queries": 0,
+                    "max_queries": 0,
+                    "max_time": 0.0,
+                    "slowest_time": 0.0,
+                    "slowest": None,
+                },
+            )
+            stats["requests"] += 1
+            stats["total_time"] += total
+            stats["db_time"] += profile.db_time
+            stats["queries"] += profile.queries
+            stats["max_queries"] = max(stats["max_queries"], profile.queries)
+            stats["max_time"] = max(stats["max_time"], total)
+            if profile.slowest_time > stats["slowest_time"]:
+                stats["slowest_time"] = profile.slowest_time
+                stats["slowest"] = profile.slowest
+
+    def worst(self, limit=50):
+        # Routes by total time spent in them, with per-request averages.
+        with self.lock:
+            rows = [dict(stats, route=route) for route, stats in self.routes.items()]
+        for row in rows:
+            row["avg_time"] = row["total_time"] / row["requests"]
+            row["avg_db_time"] = row["db_time"] / row["requests"]
+            row["avg_queries"] = row["queries"] / row["requests"]
+        return sorted(rows, key=lambda row: row["total_time"], reverse=True)[:limit]
+
+
+def _profile():
+    if has_request_context():
+        return g.get("sql_profile")
+    return None
+
+
+def init_profiling(app):
+    if not app.config.get("SQL_PROFILING"):
+        return
+    threshold = app.config.get("SLOW_QUERY_MS", 100) / 1000.0
+    route_stats = RouteStats()
+    app.extensions["route_stats"] = route_stats
+
+    if app.config.get("SLOW_QUERY_LOG"):
+        handler = logging.FileHandler(app.config["SLOW_QUERY_LOG"])
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.INFO)
+
+    # Engine-level so every engine (and every pool connection) is covered.
+    @event.listens_for(Engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        profile = _profile()
+        if profile is not None:
+            profile.add_query(statement, elapsed)
+        if elapsed >= threshold:
+            slow_log.info(
+                json.dumps(
+                    {
+                        "ms": round(elapsed * 1000, 2),
+                        "path": request.full_path if has_request_context() else None,
+                        "statement": " ".join(statement.split()),
+                    }
+                )
+            )
+
+    def before_render(sender, template, context, **extra):
+        if _profile() is not None:
+            g.render_started = time.perf_counter()
+
+    def rendered(sender, template, context, **extra):
+        profile = _profile()
+        if profile is not None and "render_started" in g:
+            profile.render_time += time.perf_counter() - g.pop("render_started")
+
+    # Template timing needs blinker; without it only SQL is timed.
+    if getattr(signals, "signals_available", True):
+        signals.before_render_template.connect(before_render, app, weak=False)
+        signals.template_rendered.connect(rendered, app, weak=False)
+
+    @app.before_request
+    def start_profile():
+        g.sql_profile = RequestProfile()
+
+    @app.after_request
+    def report_profile(response):
+        profile = _profile()
+        if profile is None:
+            return response
+        timings = [
+            'db;dur={:.1f};desc="{} queries"'.format(
+                profile.db_time * 1000, profile.queries
+            ),
+            "render;dur={:.1f}".format(profile.render_time * 1000),
+            "total;dur={:.1f}".format((time.perf_counter() - profile.started) * 1000),
+        ]
+        response.headers.add("Server-Timing", ", ".join(timings))
+        route = "{} {}".format(
+            request.method, request.url_rule.rule if request.url_rule else "-"
+        )
+        path = request.full_path
+        status = response.status_code
+
+        # Logged once the body is sent, so streamed pages include the
+        # queries they run while streaming.
+        def log_profile():
+            total = time.perf_counter() - profile.started
+            route_stats.add(route, profile, total)
+            app.logger.info(
+                json.dumps(
+                    {
+                        "route": route,
+                        "path": path,
+                        "status": status,
+                        "queries": profile.queries,
+                        "db_ms": round(profile.db_time * 1000, 2),
+                        "render_ms": round(profile.render_time * 1000, 2),
+                        "total_ms": round(total * 1000, 2),
+                        "slowest_ms": round(profile.slowest_time * 1000, 2),
+                    }
+                )
+            )
+
+        response.call_on_close(log_profile)
+        return response
+
+    token = app.config.get("PROFILE_TOKEN")
+    if not token:
+        return
+
+    @app.route("/_profile")
+    def profile_page():
+        given = request.headers.get("X-Profile-Token") or request.args.get("token")
+        if not given or not hmac.compare_digest(given.encode(), token.encode()):
+            abort(404)
+        return render_template("pages/profile.html", routes=route_stats.worst())
@@ -0,0 +1,126 @@
+from itertools import groupby
+
+from sqlalchemy import case, func
+
+from models import db, Venue, Artist, Show, ShowCard, Genre
+from pagination import keyset_page
+
+
+def with_genre(query, model, genre):
+    # Served by genres.name (unique) and the (genre_id, <entity>_id) index on
+    # the association table, not by scanning entity rows.
+    return query.join(model.genres).filter(Genre.name == genre)
+
+
+# The keys of each venue in an area, as the API returns them.
+VENUE_AREA_FIELDS = ["id", "name", "num_upcoming_shows"]
+
+
+def venue_areas(genre=None):
+    # Reads the maintained counter (counters.py), so listing venues does not
+    # touch shows at all. Each area's venues are the result rows.
+    query = db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.upcoming_show_count.label("num_upcoming_shows"),
+    )
+    if genre:
+        query = with_genre(query, Venue, genre)
+    rows = query.order_by(Venue.state, Venue.city, Venue.id).all()
+
+    areas = []
+    for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city)):
+        areas.append(
+            {
+                "city": city,
+                "state": state,
+                "venues": list(venues),
+            }
+        )
+    return areas
+
+
+def upcoming_show_counts(model, ids):
+    # The maintained counters for a page of venues or artists, by id; 0 for
+    # ids no longer in the table (a name index that has not synced a delete).
+    counts = dict.fromkeys(ids, 0)
+    if ids:
+        counts.update(
+            db.session.query(model.id, model.upcoming_show_count).filter(
+                model.id.in_(ids)
+            )
+        )
+    return counts
+
+
+def iter_shows(batch_size=1000):
+    # Column projection over a server-side cursor: memory stays at one batch
+    # of tuples however many shows exist.
+    rows = (
+        db.session.query(
+            ShowCard.venue_id,
+            ShowCard.venue_name,
+            ShowCard.artist_id,
+            ShowCard.artist_name,
+            ShowCard.artist_image_link,
+            ShowCard.start_time,
+        )
+        .order_by(ShowCard.start_time, ShowCard.show_id)
+        .yield_per(batch_size)
+    )
+    for venue_id, venue_name, artist_id, artist_name, image_link, start in rows:
+        yield {
+            "venue_id": venue_id,
+            "venue_name": venue_name,
+            "artist_id": artist_id,
+            "artist_name": artist_name,
+            "artist_image_link": image_link,
+            "start_time": start,
+        }
+
+
+def show_partition(entity_column, entity_id, counterpart, now, per_page, **cursors):
+    # Shows of one venue (entity_column=Show.venue_id, counterpart=Artist) or
+    # one artist (Show.artist_id, Venue): an aggregate for both counts, then
+    # one bounded page each of upcoming (soonest first) and past (latest
+    # first) shows, projected to the counterpart columns the page shows.
+    upcoming_count, past_count = (
+        db.session.query(
+            func.count(case((Show.start_time > now, Show.id))),
+            func.count(case((Show.start_time <= now, Show.id))),
+        )
+        .filter(entity_column == entity_id)
+        .one()
+    )
+    join_column = Show.artist_id if counterpart is Artist else Show.venue_id
+    shows = (
+        db.session.query(
+            Show.id,
+            Show.start_time,
+            counterpart.id.label("counterpart_id"),
+            counterpart.name.label("counterpart_name"),
+            counterpart.image_link.label("counterpart_image_link"),
+        )
+        .join(counterpart, counterpart.id == join_column)
+        .filter(entity_column == entity_id)
+    )
+    order_by = [Show.start_time, Show.id]
+    key = lambda row: (row.start_time, row.id)
+    upcoming = keyset_page(
+        shows.filter(Show.start_time > now),
+        order_by,
+        key,
+        after=cursors.get("upcoming_after"),
+        per_page=per_page,
+    )
+    past = keyset_page(
+        shows.filter(Show.start_time <= now),
+        order_by,
+        key,
+        after=cursors.get("past_after"),
+        per_page=per_page,
+        descending=True,
+    )
+    return upcoming_count, past_count, upcoming, past
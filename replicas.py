@@ -0,0 +1,197 @@
+import itertools
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm, text
+from sqlalchemy.sql.dml import UpdateBase
+
+# Read replicas (REPLICA_DATABASE_URLS) for the read-only views. A view
+# marked with @replica_reads runs its GET queries on one replica, picked
+# round-robin among those that passed their last health check; everything
+# else, and every flush, goes to the primary. A client that wrote recently
+# keeps reading from the primary for REPLICA_MAX_LAG seconds (a cookie), so
+# the redirect after a form shows its own change; a replica further behind
+# than that is taken out of rotation until it catches up.
+
+log = logging.getLogger(__name__)
+
+PRIMARY_COOKIE = "read_primary_until"
+
+# Postgres: seconds of replay lag, 0 when the standby has replayed all it
+# received (an idle primary makes the replay timestamp look old).
+PG_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery()"
+    " OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class Replica:
+    def __init__(self, bind, engine):
+        self.bind = bind
+        self.engine = engine
+        self.healthy = True
+        self.checked_at = None
+        self.lag = None
+
+    def check(self, max_lag):
+        try:
+            with self.engine.connect() as connection:
+                if self.engine.dialect.name == "postgresql":
+                    self.lag = float(connection.execute(PG_LAG).scalar() or 0)
+                else:
+                    # No replication to measure; only whether it answers.
+                    connection.execute(text("SELECT 1"))
+                    self.lag = 0.0
+            healthy = self.lag <= max_lag
+        except Exception as e:
+            log.warning("replica %s failed its health check: %s", self.bind, e)
+            healthy = False
+        if healthy != self.healthy:
+            log.warning(
+                "replica %s is %s", self.bind, "back" if healthy else "out of rotation"
+            )
+        self.healthy = healthy
+        self.checked_at = time.monotonic()
+
+
+class ReplicaSet:
+    def __init__(self, replicas, max_lag, check_interval):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.turn = itertools.count()
+        self.lock = threading.Lock()
+
+    def _due(self, replica):
+        return (
+            replica.checked_at is None
+            or time.monotonic() - replica.checked_at >= self.check_interval
+        )
+
+    def pick(self):
+        # Next healthy replica in turn, or None for the primary. Checks run
+        # inline, at most once per check_interval per replica.
+        start = next(self.turn)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if self._due(replica):
+                with self.lock:
+                    if self._due(replica):
+                        replica.check(self.max_lag)
+            if replica.healthy:
+                return replica
+        return None
+
+    def failed(self, engine):
+        # A query error on a replica takes it out until the next check.
+        for replica in self.replicas:
+            if replica.engine is engine and replica.healthy:
+                replica.healthy = False
+                replica.checked_at = time.monotonic()
+                log.warning(
+                    "replica %s is out of rotation after an error", replica.bind
+                )
+
+
+def _replica_engine():
+    if not has_request_context() or not g.get("read_replica"):
+        return None
+    if "replica" not in g:
+        replicas = current_app.extensions.get("replicas")
+        g.replica = None
+        if replicas is not None and not _reads_own_writes():
+            g.replica = replicas.pick()
+    return g.replica.engine if g.replica is not None else None
+
+
+def _reads_own_writes():
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and not isinstance(clause, UpdateBase):
+            engine = _replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Called with every engine created: the primary and each bind.
+        self.engine_hooks = []
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        for hook in self.engine_hooks:
+            hook(engine)
+        return engine
+
+
+def replica_reads(view):
+    # Outermost under @app.route, so version checks read the same replica.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == "GET":
+            g.read_replica = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def init_replicas(app):
+    urls = app.config.get("REPLICA_DATABASE_URLS")
+    if not urls:
+        return
+    binds = app.config["SQLALCHEMY_BINDS"] = dict(app.config["SQLALCHEMY_BINDS"] or {})
+    names = []
+    for i, url in enumerate(urls, 1):
+        names.append("replica_{}".format(i))
+        binds[names[-1]] = url
+
+    db = app.extensions["sqlalchemy"].db
+    with app.app_context():
+        replicas = ReplicaSet(
+            [Replica(name, db.get_engine(app, name)) for name in names],
+            app.config["REPLICA_MAX_LAG"],
+            app.config["REPLICA_CHECK_INTERVAL"],
+        )
+    app.extensions["replicas"] = replicas
+
+    for replica in replicas.replicas:
+        event.listen(
+            replica.engine,
+            "handle_error",
+            lambda context: (
+                replicas.failed(context.engine) if context.is_disconnect else None
+            ),
+        )
+
+    @event.listens_for(RoutingSession, "after_flush")
+    def wrote(session, flush_context):
+        if has_request_context():
+            g.wrote_primary = True
+
+    @app.after_request
+    def read_own_writes(response):
+        if g.get("wrote_primary"):
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                str(time.time() + replicas.max_lag),
+                max_age=int(replicas.max_lag) + 1,
+                httponly=True,
+            )
+        return response
@@ -0,0 +1,222 @@
+import datetime
+from collections import Counter
+
+import dateutil.parser
+from sqlalchemy import and_, cast, event, func, select
+from sqlalchemy.orm import attributes
+
+from models import db, Venue, Show, ShowDay, UPSERTS
+
+# show_days: shows per (day, venue city, venue state), so calendar counts
+# read a few rows per day instead of the shows themselves. Kept in step by
+# the mapper events below and by the bulk paths (importer, synthetic), and
+# rebuilt from scratch by `flask calendar rebuild`.
+
+days = ShowDay.__table__
+shows = Show.__table__
+venues = Venue.__table__
+
+
+def day_of(column, dialect):
+    # SQLite stores datetimes as text; CAST would keep only the year.
+    if dialect.name == "sqlite":
+        return func.date(column, type_=db.Date)
+    return cast(column, db.Date)
+
+
+def _day(start_time):
+    # The create form may still pass start_time through as a string.
+    if isinstance(start_time, str):
+        start_time = dateutil.parser.parse(start_time)
+    return start_time.date()
+
+
+def bump(connection, deltas):
+    # deltas: Counter of (day, city, state) -> change in the show count.
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    insert = UPSERTS.get(connection.dialect.name)
+    for (day, city, state), delta in deltas.items():
+        key = and_(days.c.day == day, days.c.city == city, days.c.state == state)
+        if insert is not None:
+            statement = insert(days).values(
+                day=day, city=city, state=state, show_count=delta
+            )
+            connection.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[days.c.day, days.c.city, days.c.state],
+                    set_={
+                        "show_count": days.c.show_count + statement.excluded.show_count
+                    },
+                )
+            )
+        elif not connection.execute(
+            days.update().where(key).values(show_count=days.c.show_count + delta)
+        ).rowcount:
+            connection.execute(
+                days.insert().values(day=day, city=city, state=state, show_count=delta)
+            )
+        if delta < 0:
+            connection.execute(days.delete().where(and_(key, days.c.show_count <= 0)))
+
+
+def _places(connection, venue_ids):
+    rows = connection.execute(
+        select(venues.c.id, venues.c.city, venues.c.state).where(
+            venues.c.id.in_(set(venue_ids))
+        )
+    )
+    return {id: (city or "", state or "") for id, city, state in rows}
+
+
+def shows_added(connection, rows, sign=1):
+    # rows: (venue_id, start_time) of new shows; sign=-1 for removed ones.
+    rows = list(rows)
+    places = _places(connection, [venue_id for venue_id, _ in rows])
+    deltas = Counter()
+    for venue_id, start_time in rows:
+        deltas[(_day(start_time),) + places[venue_id]] += sign
+    bump(connection, deltas)
+
+
+def after_insert(mapper, connection, show):
+    shows_added(connection, [(show.venue_id, show.start_time)])
+
+
+def after_delete(mapper, connection, show):
+    shows_added(connection, [(show.venue_id, show.start_time)], sign=-1)
+
+
+def after_update(mapper, connection, show):
+    venue = attributes.get_history(show, "venue_id")
+    start = attributes.get_history(show, "start_time")
+    if not venue.has_changes() and not start.has_changes():
+        return
+    old_venue = venue.deleted[0] if venue.deleted else show.venue_id
+    old_start = start.deleted[0] if start.deleted else show.start_time
+    shows_added(connection, [(old_venue, old_start)], sign=-1)
+    shows_added(connection, [(show.venue_id, show.start_time)])
+
+
+def venue_moved(mapper, connection, venue):
+    # A venue changing city or state takes its shows' counts along.
+    city = attributes.get_history(venue, "city")
+    state = attributes.get_history(venue, "state")
+    if not city.has_changes() and not state.has_changes():
+        return
+    old = (
+        (city.deleted[0] if city.deleted else venue.city) or "",
+        (state.deleted[0] if state.deleted else venue.state) or "",
+    )
+    new = (venue.city or "", venue.state or "")
+    if old == new:
+        return
+    day = day_of(shows.c.start_time, connection.dialect)
+    deltas = Counter()
+    for show_day, count in connection.execute(
+        select(day, func.count()).where(shows.c.venue_id == venue.id).group_by(day)
+    ):
+        deltas[(show_day,) + old] -= count
+        deltas[(show_day,) + new] += count
+    bump(connection, deltas)
+
+
+def actual_days(connection):
+    # The rollup computed from the shows table.
+    day = day_of(shows.c.start_time, connection.dialect)
+    city = func.coalesce(venues.c.city, "")
+    state = func.coalesce(venues.c.state, "")
+    return (
+        select(day.label("day"), city.label("city"), state.label("state"), func.count())
+        .select_from(shows.join(venues, venues.c.id == shows.c.venue_id))
+        .group_by(day, city, state)
+    )
+
+
+def rebuild_days(connection):
+    connection.execute(days.delete())
+    connection.execute(
+        days.insert().from_select(
+            ["day", "city", "state", "show_count"], actual_days(connection)
+        )
+    )
+
+
+def day_drift(connection):
+    # [(day, city, state, stored, actual)] where the two differ.
+    stored = {
+        (day, city, state): count
+        for day, city, state, count in connection.execute(select(days))
+    }
+    actual = {
+        (day, city, state): count
+        for day, city, state, count in connection.execute(actual_days(connection))
+    }
+    return sorted(
+        key + (stored.get(key, 0), actual.get(key, 0))
+        for key in stored.keys() | actual.keys()
+        if stored.get(key, 0) != actual.get(key, 0)
+    )
+
+
+def day_counts(start, end, city=None, state=None):
+    # {day: shows} for start <= day < end, from the rollup.
+    query = (
+        db.session.query(ShowDay.day, func.sum(ShowDay.show_count))
+        .filter(ShowDay.day >= start, ShowDay.day < end)
+        .group_by(ShowDay.day)
+    )
+    if city:
+        query = query.filter(ShowDay.city == city)
+    if state:
+        query = query.filter(ShowDay.state == state)
+    return {day: int(count) for day, count in query}
+
+
+def buckets(start, end, bucket, counts):
+    # [{"start": date, "count": n}] for every day or ISO week (from Monday)
+    # in the window, empty ones included. A week that begins before start
+    # is reported from start, the first day it counts.
+    step = datetime.timedelta(days=7 if bucket == "week" else 1)
+    first = (
+        start - datetime.timedelta(days=start.weekday()) if bucket == "week" else start
+    )
+    result = []
+    day = first
+    while day < end:
+        result.append({"start": max(day, start), "count": 0})
+        day += step
+    for day, count in counts.items():
+        result[(day - first) // step]["count"] += count
+    return result
+
+
+def init_rollups(app):
+    event.listen(Show, "after_insert", after_insert)
+    event.listen(Show, "after_delete", after_delete)
+    event.listen(Show, "after_update", after_update)
+    event.listen(Venue, "after_update", venue_moved)
+
+    @app.cli.group("calendar")
+    def calendar():
+        """Maintain the per-day show counts behind /shows/calendar."""
+
+    @calendar.command("rebuild")
+    def rebuild():
+        """Recompute show_days from the shows table."""
+        rebuild_days(db.session.connection())
+        db.session.commit()
+        print("{} day rows".format(db.session.query(ShowDay).count()))
+
+    @calendar.command("check")
+    def check():
+        """Compare show_days against the shows table."""
+        drift = day_drift(db.session.connection())
+        if not drift:
+            print("show_days matches the shows table")
+            return
+        print("{} day rows drifted".format(len(drift)))
+        for row in drift[:20]:
+            print("  {} {} {}: stored {}, actual {}".format(*row))
+        raise SystemExit(1)
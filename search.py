@@ -0,0 +1,158 @@
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import func, inspect, literal_column, column, table
+
+from models import db
+from name_index import get_name_index
+from pagination import keyset_page, list_page, page_args
+
+# FTS5's trigram tokenizer and pg_trgm both need at least three characters
+# to produce a trigram; shorter terms fall back to a plain scan.
+MIN_INDEXED_TERM = 3
+
+
+# query selects id and name (plus rank for ranked backends); rows are
+# ordered by order_by ascending, key(row) is the matching cursor tuple and
+# types are used to decode that cursor from the query string.
+SearchPlan = namedtuple("SearchPlan", ["query", "order_by", "key", "types"])
+
+
+class ScanSearch:
+    name = "scan"
+
+    def plan(self, model, term):
+        return SearchPlan(
+            db.session.query(model.id, model.name).filter(
+                model.name.ilike("%{}%".format(term))
+            ),
+            [model.id],
+            lambda row: (row.id,),
+            (int,),
+        )
+
+    def search(self, model, term):
+        plan = self.plan(model, term)
+        return plan.query.order_by(*plan.order_by).all()
+
+    def page(self, model, term, after=None, before=None, per_page=50):
+        plan = self.plan(model, term)
+        return keyset_page(plan.query, plan.order_by, plan.key, after, before, per_page)
+
+    def count(self, model, term):
+        return self.plan(model, term).query.order_by(None).count()
+
+    def cursor_types(self, model, term):
+        return self.plan(model, term).types
+
+
+class TrigramSearch(ScanSearch):
+    # Postgres: the GIN gin_trgm_ops index serves ILIKE '%term%' directly, so
+    # the filter stays a substring match and only the ordering changes.
+    name = "trigram"
+
+    def plan(self, model, term):
+        if len(term) < MIN_INDEXED_TERM:
+            return super().plan(model, term)
+        rank = -func.similarity(model.name, term)
+        return SearchPlan(
+            db.session.query(model.id, model.name, rank.label("rank")).filter(
+                model.name.ilike("%{}%".format(term))
+            ),
+            [rank, model.id],
+            lambda row: (row.rank, row.id),
+            (float, int),
+        )
+
+
+class Fts5Search(ScanSearch):
+    # SQLite: <table>_fts is an external-content FTS5 table using the trigram
+    # tokenizer, kept in sync by triggers created in the migration.
+    name = "fts5"
+
+    def plan(self, model, term):
+        if len(term) < MIN_INDEXED_TERM:
+            return super().plan(model, term)
+        fts = table(fts_table_name(model), column("rowid"), column("rank"))
+        phrase = '"{}"'.format(term.replace('"', '""'))
+        return SearchPlan(
+            db.session.query(model.id, model.name, fts.c.rank.label("rank"))
+            .join(fts, fts.c.rowid == model.id)
+            .filter(literal_column(fts.name).op("MATCH")(phrase)),
+            [fts.c.rank, model.id],
+            lambda row: (row.rank, row.id),
+            (float, int),
+        )
+
+
+class MemorySearch(ScanSearch):
+    # In-process trigram index (name_index.py); the database is not queried
+    # for candidates once the index has been built.
+    name = "memory"
+
+    def search(self, model, term):
+        return get_name_index(model).search(term)
+
+    def page(self, model, term, after=None, before=None, per_page=50):
+        return list_page(
+            self.search(model, term),
+            lambda hit: (hit.rank, hit.id),
+            after,
+            before,
+            per_page,
+        )
+
+    def count(self, model, term):
+        return len(self.search(model, term))
+
+    def cursor_types(self, model, term):
+        return (float, int)
+
+
+def fts_table_name(model):
+    return model.__tablename__ + "_fts"
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (ScanSearch, TrigramSearch, Fts5Search, MemorySearch)
+}
+
+_backend = None
+
+
+def auto_backend():
+    engine = db.get_engine()
+    if engine.dialect.name == "postgresql":
+        return TrigramSearch()
+    if engine.dialect.name == "sqlite":
+        # Only use FTS5 once the migration has created the virtual tables;
+        # a database built with create_all() has no index to query.
+        if inspect(engine).has_table("venues_fts"):
+            return Fts5Search()
+    return ScanSearch()
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        name = current_app.config.get("SEARCH_BACKEND", "auto")
+        if name == "auto":
+            _backend = auto_backend()
+        else:
+            _backend = BACKENDS[name]()
+    return _backend
+
+
+def search_by_name(model, term):
+    return get_search_backend().search(model, term)
+
+
+def search_page(model, term):
+    # (page, total count) for the current request's cursor arguments.
+    backend = get_search_backend()
+    after, before, per_page = page_args(backend.cursor_types(model, term))
+    return (
+        backend.page(model, term, after, before, per_page),
+        backend.count(model, term),
+    )
@@ -0,0 +1,245 @@
+import datetime
+import os
+import random
+import time
+from array import array
+from itertools import accumulate
+
+import click
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
+
+from bookings import DEFAULT_SHOW_MINUTES
+from cards import rebuild_cards
+from counters import COUNTED, counter_values
+from forms import VenueForm
+from importer import allocate_ids, insert_rows
+from models import db, Genre, Venue, Artist, Show, venue_genres, artist_genres
+from rollups import rebuild_days
+from versions import bump_versions
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# The early history cannot be replayed as is: f47178854fe9 creates a shows
+# table that abbb7dc75821 cannot extend on SQLite and 71343ff28a32 creates
+# again. A fresh database is migrated up to just before those, drops the
+# first shows table and continues from 71343ff28a32.
+BEFORE_SHOWS_REBUILD = "925da3a80dbc"
+SHOWS_REBUILT_FROM = "abbb7dc75821"
+
+CITIES = [
+    ("San Francisco", "CA"),
+    ("Los Angeles", "CA"),
+    ("Oakland", "CA"),
+    ("New York", "NY"),
+    ("Brooklyn", "NY"),
+    ("Austin", "TX"),
+    ("Houston", "TX"),
+    ("Chicago", "IL"),
+    ("Seattle", "WA"),
+    ("Portland", "OR"),
+    ("Denver", "CO"),
+    ("Nashville", "TN"),
+    ("Memphis", "TN"),
+    ("New Orleans", "LA"),
+    ("Atlanta", "GA"),
+    ("Miami", "FL"),
+    ("Boston", "MA"),
+    ("Philadelphia", "PA"),
+    ("Detroit", "MI"),
+    ("Minneapolis", "MN"),
+]
+
+WORDS = (
+    "blue moon park square hop live hall room club union garden station "
+    "cellar attic loft dust velvet echo harbor lantern copper river north "
+    "south east west grand little old new golden silver midnight electric"
+).split()
+
+VENUE_SUFFIXES = ["Hall", "Club", "Room", "Lounge", "Theatre", "Bar", "Tavern"]
+ARTIST_SUFFIXES = ["Band", "Trio", "Quartet", "Collective", "Orchestra", "Project"]
+
+# Mostly evening shows, a few matinees.
+SHOW_HOURS = [12, 14, 17, 18, 19, 19, 20, 20, 20, 21, 21, 22]
+
+# Venue / artist picks a show tries before waiting for a busy pair.
+BOOKING_TRIES = 10
+
+GENRES = [value for value, _ in VenueForm.genres.kwargs["choices"]]
+
+
+def create_schema():
+    # Brings an empty database to the head revision; a database that already
+    # has tables is only upgraded.
+    if inspect(db.engine).has_table("venues"):
+        upgrade(directory=MIGRATIONS)
+        return
+    upgrade(directory=MIGRATIONS, revision=BEFORE_SHOWS_REBUILD)
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE shows")
+    stamp(directory=MIGRATIONS, revision=SHOWS_REBUILT_FROM)
+    upgrade(directory=MIGRATIONS)
+
+
+def _name(rnd, suffixes):
+    words = [rnd.choice(WORDS).title() for _ in range(rnd.randint(1, 3))]
+    return "The {} {}".format(" ".join(words), rnd.choice(suffixes))
+
+
+def _skewed(rnd, ids):
+    # A few venues and artists get most of the shows, like real listings.
+    weights = list(accumulate(1.0 / (rank + 1) ** 0.8 for rank in range(len(ids))))
+    shuffled = list(ids)
+    rnd.shuffle(shuffled)
+    return lambda: rnd.choices(shuffled, cum_weights=weights)[0]
+
+
+def _entities(rnd, model, count, association, fk, genre_ids, batch_size):
+    suffixes = VENUE_SUFFIXES if model is Venue else ARTIST_SUFFIXES
+    slug = model.__tablename__
+    ids = []
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        batch_ids = allocate_ids(model.__table__, size)
+        rows, links = [], []
+        for id in batch_ids:
+            city, state = rnd.choice(CITIES)
+            row = {
+                "id": id,
+                "name": _name(rnd, suffixes),
+                "city": city,
+                "state": state,
+                "phone": "{:03d}-{:03d}-{:04d}".format(
+                    rnd.randrange(200, 999), rnd.randrange(1000), rnd.randrange(10000)
+                ),
+                "website": "https://example.com/{}/{}".format(slug, id),
+                "facebook_link": "https://www.facebook.com/{}{}".format(slug, id),
+                "image_link": "https://example.com/{}/{}.jpg".format(slug, id),
+                "seeking_description": "",
+                "updated_at": datetime.datetime.now(),
+            }
+            if model is Venue:
+                row["address"] = "{} {} St".format(
+                    rnd.randrange(1, 2000), rnd.choice(WORDS).title()
+                )
+                row["seeking_talent"] = rnd.random() < 0.3
+            else:
+                row["seeking_venue"] = rnd.random() < 0.3
+            rows.append(row)
+            for genre in rnd.sample(GENRES, rnd.randint(1, 3)):
+                links.append({fk: id, "genre_id": genre_ids[genre]})
+        insert_rows(model.__table__, rows)
+        insert_rows(association, links)
+        bump_versions(db.session.connection(), model.__tablename__)
+        db.session.commit()
+        ids.extend(batch_ids)
+    return ids
+
+
+def generate(shows, seed=42, anchor=None, batch_size=5000):
+    # Venues, artists (with genres) and shows for an empty database: one
+    # venue per 20 shows and one artist per 10, shows spread from two
+    # years before anchor to one year after. The same seed and anchor give
+    # the same rows.
+    rnd = random.Random(seed)
+    if anchor is None:
+        anchor = datetime.datetime.combine(datetime.date.today(), datetime.time())
+
+    existing = dict(db.session.query(Genre.name, Genre.id))
+    missing = [name for name in GENRES if name not in existing]
+    if missing:
+        insert_rows(Genre.__table__, [{"name": name} for name in missing])
+    genre_ids = dict(db.session.query(Genre.name, Genre.id))
+
+    venue_ids = _entities(
+        rnd, Venue, max(shows // 20, 1), venue_genres, "venue_id", genre_ids, batch_size
+    )
+    artist_ids = _entities(
+        rnd,
+        Artist,
+        max(shows // 10, 1),
+        artist_genres,
+        "artist_id",
+        genre_ids,
+        batch_size,
+    )
+
+    venue, artist = _skewed(rnd, venue_ids), _skewed(rnd, artist_ids)
+    earliest = anchor - datetime.timedelta(days=730)
+    # Start times (minutes after earliest) are drawn first and booked in
+    # time order, so a venue or artist is free once the end of its last
+    # show, its cursor, is not after the start. A show whose picks are busy
+    # tries others, then waits for the last pair. Rows keep the order they
+    # were drawn in, so ids stay unrelated to start times.
+    minutes = [
+        rnd.randrange(1095) * 1440
+        + rnd.choice(SHOW_HOURS) * 60
+        + rnd.choice((0, 15, 30, 45))
+        for _ in range(shows)
+    ]
+    show_venues, show_artists = array("l", [0]) * shows, array("l", [0]) * shows
+    venue_free, artist_free = {}, {}
+    for i in sorted(range(shows), key=minutes.__getitem__):
+        start = minutes[i]
+        for _ in range(BOOKING_TRIES):
+            venue_id, artist_id = venue(), artist()
+            if (
+                venue_free.get(venue_id, start) <= start
+                and artist_free.get(artist_id, start) <= start
+            ):
+                break
+        else:
+            start = max(
+                start,
+                venue_free.get(venue_id, start),
+                artist_free.get(artist_id, start),
+            )
+        minutes[i] = start
+        venue_free[venue_id] = artist_free[artist_id] = start + DEFAULT_SHOW_MINUTES
+        show_venues[i], show_artists[i] = venue_id, artist_id
+
+    for start in range(0, shows, batch_size):
+        now = datetime.datetime.now()
+        insert_rows(
+            Show.__table__,
+            [
+                {
+                    "venue_id": show_venues[i],
+                    "artist_id": show_artists[i],
+                    "start_time": earliest + datetime.timedelta(minutes=minutes[i]),
+                    "duration": DEFAULT_SHOW_MINUTES,
+                    "updated_at": now,
+                }
+                for i in range(start, min(start + batch_size, shows))
+            ],
+        )
+        db.session.commit()
+
+    connection = db.session.connection()
+    for table, fk in COUNTED:
+        connection.execute(
+            table.update().values(counter_values(table, fk, datetime.datetime.now()))
+        )
+    rebuild_days(connection)
+    rebuild_cards(connection)
+    db.session.commit()
+    return len(venue_ids), len(artist_ids)
+
+
+def init_synthetic(app):
+    @app.cli.command("seed")
+    @click.option("--shows", default=10000, show_default=True)
+    @click.option("--seed", default=42, show_default=True)
+    @click.option("--batch-size", default=5000, show_default=True)
+    def seed_command(shows, seed, batch_size):
+        """Fill an empty database with generated venues, artists and shows."""
+        create_schema()
+        if db.session.query(Venue.id).first() is not None:
+            raise click.ClickException("the database already has venues")
+        started = time.perf_counter()
+        venues, artists = generate(shows, seed, batch_size=batch_size)
+        print(
+            "{} venues, {} artists, {} shows in {:.1f}s".format(
+                venues, artists, shows, time.perf_counter() - started
+            )
+        )
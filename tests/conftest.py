@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import app as flask_app  # noqa: E402
+from models import db  # noqa: E402
+from synthetic import create_schema, generate  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    # One scratch SQLite database for the session, migrated to head.
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///{}".format(
+        os.path.join(tempfile.mkdtemp(), "fyyur_test.db")
+    )
+    flask_app.config["WTF_CSRF_ENABLED"] = False
+    with flask_app.app_context():
+        create_schema()
+    return flask_app
+
+
+@pytest.fixture
+def statements(app):
+    # Requests a URL (a POST when data is given), checks it answered 200
+    # and returns the number of statements it sent to the database.
+    client = app.test_client()
+
+    def count(url, data=None):
+        executed = []
+
+        def before_cursor_execute(*args):
+            executed.append(args[2])
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            if data is None:
+                response = client.get(url)
+            else:
+                response = client.post(url, data=data)
+            response.get_data()
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        assert response.status_code == 200, url
+        return len(executed)
+
+    return count
+
+
+@pytest.fixture(scope="session")
+def seeded(app):
+    # A database big enough for the planner to prefer indexes over scans,
+    # from the same generator as `flask seed`. FYYUR_TEST_SHOWS sets the
+    # number of shows.
+    with app.app_context():
+        generate(int(os.environ.get("FYYUR_TEST_SHOWS", "100000")))
+    return app
@@ -0,0 +1,35 @@
+from models import Artist, Show, Venue, db
+
+
+def book(client, venue_id, artist_id, start_time, duration=None):
+    data = {"venue_id": venue_id, "artist_id": artist_id, "start_time": start_time}
+    if duration is not None:
+        data["duration"] = duration
+    return client.post("/shows/create", data=data)
+
+
+def test_overlapping_bookings_are_rejected(app):
+    client = app.test_client()
+    with app.app_context():
+        venues = [Venue(name=name, city="Austin", state="TX") for name in "AB"]
+        artists = [Artist(name=name, city="Austin", state="TX") for name in "XY"]
+        db.session.add_all(venues + artists)
+        db.session.commit()
+        a, b = [venue.id for venue in venues]
+        x, y = [artist.id for artist in artists]
+
+    assert book(client, a, x, "2035-03-01 20:00:00").status_code == 200
+
+    # Another artist at the same venue, and the same artist elsewhere,
+    # while the first show (120 minutes by default) is still on.
+    response = book(client, a, y, "2035-03-01 21:00:00")
+    assert response.status_code == 409
+    assert "The venue is already booked" in response.get_data(as_text=True)
+    response = book(client, b, x, "2035-03-01 21:30:00", duration=30)
+    assert response.status_code == 409
+    assert "The artist is already booked" in response.get_data(as_text=True)
+
+    # Back to back is not an overlap.
+    assert book(client, a, y, "2035-03-01 22:00:00").status_code == 200
+    with app.app_context():
+        assert Show.query.filter(Show.venue_id.in_([a, b])).count() == 2
@@ -0,0 +1,147 @@
+import datetime
+
+import pytest
+
+from cache import MemoryBackend
+from importer import import_file
+from models import Artist, Show, Venue, db
+
+VENUE_FORM = {
+    "city": "Austin",
+    "state": "TX",
+    "address": "1 Main St",
+    "phone": "",
+    "facebook_link": "",
+    "image_link": "",
+    "website": "",
+    "seeking_description": "",
+}
+
+ARTIST_FORM = {
+    "city": "Austin",
+    "state": "TX",
+    "phone": "",
+    "facebook_link": "",
+    "image_link": "",
+    "website": "",
+    "seeking_description": "",
+}
+
+
+@pytest.fixture
+def cached(app):
+    # Pages are read with a client of their own: the writes flash a message,
+    # and a session with pending flashes bypasses the cache.
+    response_cache = app.extensions["response_cache"]
+    response_cache.backend = MemoryBackend()
+    try:
+        yield app.test_client(), app.test_client()
+    finally:
+        response_cache.backend = None
+
+
+def add_booking(app, venue_name, artist_name):
+    # The show is dated far in the past so it leads the first /shows page.
+    with app.app_context():
+        venue = Venue(name=venue_name, city="Austin", state="TX")
+        artist = Artist(name=artist_name, city="Austin", state="TX")
+        db.session.add(
+            Show(
+                venue=venue,
+                artist=artist,
+                start_time=datetime.datetime(1990, 1, 1, 20, 0),
+            )
+        )
+        db.session.commit()
+        return venue.id, artist.id
+
+
+def page(reader, url):
+    response = reader.get(url)
+    assert response.status_code == 200, url
+    return response.get_data(as_text=True)
+
+
+def test_venue_edit_purges_pages(app, cached):
+    reader, writer = cached
+    venue_id, artist_id = add_booking(app, "Velvet Attic", "Ochre Lanterns")
+    urls = ["/venues", "/venues/{}".format(venue_id), "/shows"]
+    for url in urls:
+        assert "Velvet Attic" in page(reader, url)
+
+    writer.post(
+        "/venues/{}/edit".format(venue_id), data=dict(VENUE_FORM, name="Velvet Loft")
+    )
+
+    for url in urls:
+        body = page(reader, url)
+        assert "Velvet Loft" in body and "Velvet Attic" not in body, url
+
+
+def test_artist_edit_purges_pages(app, cached):
+    reader, writer = cached
+    venue_id, artist_id = add_booking(app, "Copper Cellar", "Quiet Harbours")
+    urls = ["/venues/{}".format(venue_id), "/shows"]
+    for url in urls:
+        assert "Quiet Harbours" in page(reader, url)
+
+    writer.post(
+        "/artists/{}/edit".format(artist_id),
+        data=dict(ARTIST_FORM, name="Loud Harbours"),
+    )
+
+    for url in urls:
+        body = page(reader, url)
+        assert "Loud Harbours" in body and "Quiet Harbours" not in body, url
+
+
+def test_show_create_purges_pages(app, cached):
+    reader, writer = cached
+    venue_id, artist_id = add_booking(app, "Tin Pavilion", "Paper Comets")
+    with app.app_context():
+        other = Artist(name="Glass Orchard", city="Austin", state="TX")
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+    urls = ["/venues/{}".format(venue_id), "/shows"]
+    for url in urls:
+        assert "Glass Orchard" not in page(reader, url)
+
+    writer.post(
+        "/shows/create",
+        data={
+            "artist_id": other_id,
+            "venue_id": venue_id,
+            "start_time": "1990-01-01 23:00:00",
+        },
+    )
+
+    for url in urls:
+        assert "Glass Orchard" in page(reader, url), url
+
+
+def test_import_purges_pages(app, cached, tmp_path):
+    reader, writer = cached
+    venue_id, artist_id = add_booking(app, "Marble Yard", "Static Gardens")
+    urls = ["/venues", "/venues/{}".format(venue_id), "/shows"]
+    before = {url: page(reader, url) for url in urls}
+
+    venues = tmp_path / "venues.csv"
+    venues.write_text(
+        "name,city,state,address,phone,genres\n"
+        "Brass Lantern,Austin,TX,2 Main St,512-555-0100,Jazz\n"
+    )
+    shows = tmp_path / "shows.csv"
+    shows.write_text(
+        "venue_id,artist_id,start_time\n{},{},1990-01-01 23:00:00\n".format(
+            venue_id, artist_id
+        )
+    )
+    with app.app_context():
+        assert import_file("venues", str(venues))[0] == 1
+        assert import_file("shows", str(shows))[0] == 1
+
+    assert "Brass Lantern" in page(reader, "/venues")
+    for url in urls[1:]:
+        body = page(reader, url)
+        assert body.count("Static Gardens") == before[url].count("Static Gardens") + 1
@@ -0,0 +1,76 @@
+import datetime
+
+from cards import card_drift
+from models import Artist, Show, ShowCard, Venue, db
+
+VENUE_FORM = {
+    "address": "1 Main St",
+    "phone": "",
+    "facebook_link": "",
+    "image_link": "",
+    "website": "",
+    "seeking_description": "",
+}
+
+ARTIST_FORM = {
+    "city": "Alpine",
+    "state": "TX",
+    "phone": "",
+    "facebook_link": "",
+    "image_link": "",
+    "website": "",
+    "seeking_description": "",
+}
+
+
+def drift(app):
+    with app.app_context():
+        return card_drift(db.session.connection())
+
+
+def test_cards_follow_writes(app):
+    client = app.test_client()
+    with app.app_context():
+        venue = Venue(name="Juniper Hall", city="Alpine", state="TX")
+        artists = [Artist(name=name, city="Alpine", state="TX") for name in "JK"]
+        db.session.add_all([venue] + artists)
+        db.session.commit()
+        venue_id = venue.id
+        artist_ids = [artist.id for artist in artists]
+
+    for artist_id, hour in zip(artist_ids, (12, 18)):
+        client.post(
+            "/shows/create",
+            data={
+                "venue_id": venue_id,
+                "artist_id": artist_id,
+                "start_time": "2037-02-01 {}:00:00".format(hour),
+            },
+        )
+    assert drift(app) == []
+
+    with app.app_context():
+        first, second = Show.query.filter_by(venue_id=venue_id).order_by(
+            Show.start_time
+        )
+        db.session.delete(first)
+        second.start_time = datetime.datetime(2037, 2, 2, 18, 0)
+        db.session.commit()
+    assert drift(app) == []
+
+    client.post(
+        "/artists/{}/edit".format(artist_ids[1]),
+        data=dict(ARTIST_FORM, name="Kestrel Choir"),
+    )
+    client.post(
+        "/venues/{}/edit".format(venue_id),
+        data=dict(VENUE_FORM, name="Juniper Barn", city="Marfa", state="TX"),
+    )
+    assert drift(app) == []
+    with app.app_context():
+        card = ShowCard.query.filter_by(venue_id=venue_id).one()
+        assert (card.venue_name, card.venue_city, card.artist_name) == (
+            "Juniper Barn",
+            "Marfa",
+            "Kestrel Choir",
+        )
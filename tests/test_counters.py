@@ -0,0 +1,63 @@
+import datetime
+import time
+
+from counters import COUNTED, counter_drift, roll_counters
+from models import Artist, Show, Venue, db
+
+
+def drift(app, ids):
+    # Drifted rows among the venue and artist ids under test; rows seeded
+    # with core inserts elsewhere in the session bypass the counters.
+    with app.app_context():
+        return [
+            row
+            for table, fk in COUNTED
+            for row in counter_drift(table, fk)
+            if row[0] in ids[table.name]
+        ]
+
+
+def test_counters_follow_show_writes(app):
+    client = app.test_client()
+    tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+    with app.app_context():
+        venue = Venue(name="Lumen Room", city="Austin", state="TX")
+        artist = Artist(name="Northern Static", city="Austin", state="TX")
+        db.session.add(Show(venue=venue, artist=artist, start_time=tomorrow))
+        db.session.commit()
+        ids = {"venues": {venue.id}, "artists": {artist.id}}
+        venue_id, artist_id = venue.id, artist.id
+    assert drift(app, ids) == []
+
+    client.post(
+        "/shows/create",
+        data={
+            "artist_id": artist_id,
+            "venue_id": venue_id,
+            "start_time": "2040-06-01 20:00:00",
+        },
+    )
+    assert drift(app, ids) == []
+    with app.app_context():
+        assert Venue.query.get(venue_id).upcoming_show_count == 2
+
+    with app.app_context():
+        db.session.delete(Show.query.filter_by(start_time=tomorrow).one())
+        db.session.commit()
+        assert Venue.query.get(venue_id).upcoming_show_count == 1
+    assert drift(app, ids) == []
+
+    # A show that has started is counted until the next roll.
+    starts = datetime.datetime.now() + datetime.timedelta(milliseconds=200)
+    with app.app_context():
+        db.session.add(Show(venue_id=venue_id, artist_id=artist_id, start_time=starts))
+        db.session.commit()
+        assert Artist.query.get(artist_id).upcoming_show_count == 2
+    time.sleep(0.3)
+    with app.app_context():
+        roll_counters()
+        assert Artist.query.get(artist_id).upcoming_show_count == 1
+        assert Artist.query.get(artist_id).next_show_at == datetime.datetime(
+            2040, 6, 1, 20, 0
+        )
+    assert drift(app, ids) == []
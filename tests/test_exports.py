@@ -0,0 +1,54 @@
+import datetime
+import gzip
+import json
+
+from models import Artist, Show, Venue, db
+
+
+def export(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, url
+    lines = response.get_data(as_text=True).splitlines()
+    return [json.loads(line) for line in lines], response.headers["X-Next-Since"]
+
+
+def test_since_exports_only_changed_rows(app):
+    client = app.test_client()
+    with app.app_context():
+        venue = Venue(name="Harbor Stage", city="Austin", state="TX")
+        artist = Artist(name="Iron Meadows", city="Austin", state="TX")
+        db.session.add(
+            Show(venue=venue, artist=artist, start_time=datetime.datetime(2030, 5, 1))
+        )
+        db.session.commit()
+        venue_id = venue.id
+
+    since = datetime.datetime.now().isoformat()
+    with app.app_context():
+        Venue.query.get(venue_id).name = "Harbor Hall"
+        db.session.commit()
+
+    venues, next_since = export(client, "/export/venues.ndjson?since=" + since)
+    assert [row["name"] for row in venues] == ["Harbor Hall"]
+    # The show did not change, but the venue name it carries did.
+    shows, _ = export(client, "/export/shows.ndjson?since=" + since)
+    assert [(row["venue_name"], row["artist_name"]) for row in shows] == [
+        ("Harbor Hall", "Iron Meadows")
+    ]
+    artists, _ = export(client, "/export/artists.ndjson?since=" + since)
+    assert artists == []
+
+    venues, _ = export(client, "/export/venues.ndjson?since=" + next_since)
+    assert venues == []
+
+
+def test_gzip_follows_accept_encoding(app):
+    client = app.test_client()
+    url = "/export/venues.csv?since=2999-01-01T00:00:00"
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()).startswith(b"id,name")
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.get_data().startswith(b"id,name")
@@ -0,0 +1,34 @@
+from sqlalchemy import event
+
+from models import Genre, Venue, db
+
+
+def test_get_or_create_survives_a_concurrent_insert(app):
+    with app.app_context():
+        db.session.add(Genre(name="Bluegrass"))
+        db.session.commit()
+
+        # Another request adds the genre between the lookup and the insert.
+        looked_up = []
+
+        def lookup(connection, clause, *args):
+            looked_up.append("FROM genres" in str(clause))
+
+        def other_request(connection, clause, *args):
+            if looked_up and looked_up[0]:
+                looked_up.clear()
+                connection.exec_driver_sql(
+                    "INSERT INTO genres (name) VALUES ('Zydeco')"
+                )
+
+        event.listen(db.engine, "after_execute", lookup, once=True)
+        event.listen(db.engine, "before_execute", other_request)
+        try:
+            genres = Genre.get_or_create(["Zydeco", "Bluegrass", "Zydeco", ""])
+            venue = Venue(name="Bayou Room", city="Austin", state="TX", genres=genres)
+            db.session.add(venue)
+            db.session.commit()
+        finally:
+            event.remove(db.engine, "before_execute", other_request)
+        assert [genre.name for genre in venue.genres] == ["Bluegrass", "Zydeco"]
+        assert Genre.query.filter_by(name="Zydeco").count() == 1
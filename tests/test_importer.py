@@ -0,0 +1,26 @@
+from importer import copy_value, import_file
+from models import Venue
+
+
+def test_blank_optional_fields_are_null(app, tmp_path):
+    path = tmp_path / "venues.csv"
+    path.write_text(
+        "name,city,state,address,phone,genres,facebook_link,website\n"
+        "Null Island,Austin,TX,3 Main St,512-555-0101,Jazz,,\n"
+    )
+    with app.app_context():
+        assert import_file("venues", str(path))[0] == 1
+        venue = Venue.query.filter_by(name="Null Island").one()
+        # No column default: NULL, not an empty string.
+        assert venue.facebook_link is None
+        # The column defaults still apply.
+        assert venue.website == ""
+        assert venue.image_link.startswith("https://")
+        assert venue.seeking_talent is False
+
+
+def test_copy_values_keep_null_apart_from_strings():
+    assert copy_value(None) == r"\N"
+    assert copy_value("") == '""'
+    assert copy_value(r"\N") == r'"\N"'
+    assert copy_value('say "hi"') == '"say ""hi"""'
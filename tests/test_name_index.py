@@ -0,0 +1,61 @@
+import pytest
+
+from models import Venue, db
+from name_index import (
+    build_name_index,
+    get_name_index,
+    index_drift,
+    name_indexes,
+    request_rebuild,
+)
+
+
+@pytest.fixture
+def live_index(app):
+    # Syncs on every lookup, as if INDEX_SYNC_INTERVAL had passed.
+    interval = app.config["INDEX_SYNC_INTERVAL"]
+    app.config["INDEX_SYNC_INTERVAL"] = 0
+    try:
+        with app.app_context():
+            name_indexes.pop(Venue, None)
+            yield get_name_index(Venue)
+    finally:
+        app.config["INDEX_SYNC_INTERVAL"] = interval
+        name_indexes.pop(Venue, None)
+
+
+def test_check_finds_drift(app):
+    with app.app_context():
+        db.session.add(Venue(name="Cobalt Stage", city="Austin", state="TX"))
+        db.session.commit()
+        index = build_name_index(Venue)
+        assert not any(index_drift(Venue, index).values())
+
+        id = next(iter(index.names))
+        index.names[id] += " (renamed)"
+        del index.postings["cob"][0]
+        drift = index_drift(Venue, index)
+        assert drift["stale"] == [id]
+        assert "cob" in drift["postings"]
+
+
+def test_rebuild_drops_rows_other_workers_deleted(app, live_index):
+    with app.app_context():
+        venue = Venue(name="Vanishing Point", city="Austin", state="TX")
+        db.session.add(venue)
+        db.session.commit()
+        venue_id = venue.id
+        assert [hit.id for hit in get_name_index(Venue).search("vanishing")] == [
+            venue_id
+        ]
+
+        # A delete made elsewhere never reaches this worker's write-through.
+        db.session.execute(Venue.__table__.delete().where(Venue.id == venue_id))
+        db.session.commit()
+        assert get_name_index(Venue).search("vanishing")
+
+        request_rebuild()
+        index = get_name_index(Venue)
+        assert index is not live_index
+        assert index.search("vanishing") == []
+        assert not any(index_drift(Venue, index).values())
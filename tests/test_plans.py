@@ -0,0 +1,9 @@
+from plans import check_plans
+
+
+def test_read_routes_use_indexes(seeded):
+    # The same check as `flask check-plans`, against the seeded database.
+    regressions = check_plans(seeded)
+    assert not regressions, [
+        (url, problem) for url, problem, statement, plan in regressions
+    ]
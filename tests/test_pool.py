@@ -0,0 +1,42 @@
+from sqlalchemy import create_engine, text
+
+from pool import TimedQueuePool, metrics_text, watch_engine
+
+
+def test_metrics_are_labelled_by_pool(app):
+    client = app.test_client()
+    client.get("/venues")
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'pool="primary"' in body
+    checkouts = [
+        line for line in body.splitlines() if line.startswith("fyyur_db_pool_checkouts")
+    ]
+    assert len(checkouts) == 1 and int(checkouts[0].split()[-1]) > 0
+
+
+def test_each_engine_keeps_its_own_stats(tmp_path):
+    primary, replica = (
+        create_engine("sqlite:///{}".format(tmp_path / name), poolclass=TimedQueuePool)
+        for name in ("primary.db", "replica.db")
+    )
+    for engine in (primary, replica):
+        watch_engine(engine)
+    for _ in range(3):
+        with primary.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    with replica.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+    lines = metrics_text([("primary", primary), ("replica_1", replica)]).splitlines()
+    assert lines.count("# TYPE fyyur_db_pool_checkouts_total counter") == 1
+    checkouts = {
+        line.split('pool="')[1].split('"')[0]: int(line.split()[-1])
+        for line in lines
+        if line.startswith("fyyur_db_pool_checkouts_total")
+    }
+    assert checkouts == {"primary": 3, "replica_1": 1}
+    assert any(
+        line.startswith("fyyur_db_pool_wait_seconds_count")
+        and 'pool="replica_1"' in line
+        for line in lines
+    )
@@ -0,0 +1,34 @@
+import os
+
+from flask import Flask
+
+from profiling import init_profiling
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+
+def profiled_app(app, token):
+    # A separate app: the page is registered at startup, from the config.
+    profiled = Flask("profiled", template_folder=TEMPLATES)
+    profiled.config.update(SQL_PROFILING=True, SLOW_QUERY_LOG="", PROFILE_TOKEN=token)
+    profiled.jinja_env.filters.update(app.jinja_env.filters)
+    # The layout links to the app's pages.
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint != "static":
+            profiled.url_map.add(rule.empty())
+    init_profiling(profiled)
+    return profiled.test_client()
+
+
+def test_profile_page_needs_the_token(app):
+    client = profiled_app(app, "s3cret")
+    assert client.get("/_profile").status_code == 404
+    assert client.get("/_profile?token=guess").status_code == 404
+    response = client.get("/_profile", headers={"X-Profile-Token": "s3cret"})
+    assert response.status_code == 200
+    assert client.get("/_profile?token=s3cret").status_code == 200
+
+
+def test_profile_page_is_off_without_a_token(app):
+    client = profiled_app(app, "")
+    assert client.get("/_profile").status_code == 404
@@ -0,0 +1,36 @@
+from models import db, Venue, Artist
+
+
+def add_rows(app, model, count, name="The Moon Room"):
+    with app.app_context():
+        db.session.execute(
+            model.__table__.insert(),
+            [
+                {"name": "{} {}".format(name, i), "city": "Austin", "state": "TX"}
+                for i in range(count)
+            ],
+        )
+        db.session.commit()
+
+
+def test_venue_list_statements_do_not_grow_with_venues(app, statements):
+    # N venues, then 10N: the list page sends the same statements.
+    add_rows(app, Venue, 20)
+    few = statements("/venues")
+    add_rows(app, Venue, 180)
+    assert statements("/venues") == few
+
+
+def test_search_statements_do_not_grow_with_matches(app, statements):
+    # From a few matches to many: the hits and their upcoming show counts
+    # take the same statements however many there are. The first search
+    # also picks the search backend, so it is left out.
+    for model, url in ((Venue, "/venues/search"), (Artist, "/artists/search")):
+        form = {"search_term": "zebra"}
+        statements(url, form)
+        add_rows(app, model, 3, "Zebra Crossing")
+        few = statements(url, form)
+        add_rows(app, model, 40, "Zebra Crossing")
+        assert statements(url, form) == few, url
+        body = app.test_client().post(url, data=form).get_data(as_text=True)
+        assert '"zebra": 43' in body
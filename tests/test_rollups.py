@@ -0,0 +1,63 @@
+import datetime
+
+from models import Artist, Show, Venue, db
+from rollups import day_counts, day_drift
+
+VENUE_FORM = {
+    "name": "Desert Annex",
+    "address": "1 Main St",
+    "phone": "",
+    "facebook_link": "",
+    "image_link": "",
+    "website": "",
+    "seeking_description": "",
+}
+
+
+def drift(app):
+    with app.app_context():
+        return day_drift(db.session.connection())
+
+
+def test_day_rollup_follows_writes(app):
+    client = app.test_client()
+    day = datetime.date(2036, 7, 4)
+    with app.app_context():
+        venue = Venue(name="Desert Annex", city="Alpine", state="TX")
+        artists = [Artist(name=name, city="Alpine", state="TX") for name in "PQR"]
+        db.session.add_all([venue] + artists)
+        db.session.commit()
+        venue_id = venue.id
+        artist_ids = [artist.id for artist in artists]
+
+    for artist_id, hour in zip(artist_ids, (12, 15, 18)):
+        client.post(
+            "/shows/create",
+            data={
+                "venue_id": venue_id,
+                "artist_id": artist_id,
+                "start_time": "{} {}:00:00".format(day, hour),
+            },
+        )
+    assert drift(app) == []
+
+    with app.app_context():
+        shows = Show.query.filter_by(venue_id=venue_id).order_by(Show.start_time)
+        first, second, _ = shows.all()
+        db.session.delete(first)
+        second.start_time = datetime.datetime(2036, 7, 5, 15, 0)
+        db.session.commit()
+    assert drift(app) == []
+
+    client.post(
+        "/venues/{}/edit".format(venue_id),
+        data=dict(VENUE_FORM, city="Marfa", state="TX"),
+    )
+    assert drift(app) == []
+    with app.app_context():
+        end = day + datetime.timedelta(days=2)
+        assert day_counts(day, end, city="Marfa") == {
+            day: 1,
+            datetime.date(2036, 7, 5): 1,
+        }
+        assert day_counts(day, end, city="Alpine") == {}
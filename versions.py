@@ -0,0 +1,175 @@
+import datetime
+import hashlib
+from functools import wraps
+
+from flask import current_app, request, session
+from sqlalchemy import event, func
+
+from models import db, Venue, Artist, Show, ShowCard, TableVersion
+
+# A version is a tuple of values that changes whenever the rendered page
+# would: row timestamps catch edits, the table_versions counters (and, on
+# detail pages, the count of the entity's shows) catch deletes, and the
+# latest start time already passed catches shows moving from "upcoming" to
+# "past" without any write. Every value is a primary key lookup or one
+# probe of an index, whatever the size of the tables. Shows are only
+# deleted along with their venue, so the list versions do not count shows.
+
+# Models whose writes bump their table_versions row.
+VERSIONED = (Venue, Artist)
+
+versions = TableVersion.__table__
+
+
+def _detail_version(model, fk, card_fk, id, now):
+    # The entity row, and per show: the count and the latest past start
+    # from the (fk, start_time) index, and the latest change to any card
+    # (the show, or a rename of the venue or artist on it) from the
+    # (fk, changed_at) index.
+    return (
+        db.session.query(
+            model.updated_at,
+            db.session.query(func.count()).filter(fk == id).scalar_subquery(),
+            db.session.query(func.max(Show.start_time))
+            .filter(fk == id, Show.start_time <= now)
+            .scalar_subquery(),
+            db.session.query(func.max(ShowCard.changed_at))
+            .filter(card_fk == id)
+            .scalar_subquery(),
+        )
+        .filter(model.id == id)
+        .one_or_none()
+    )
+
+
+def venue_version(venue_id, now):
+    return _detail_version(Venue, Show.venue_id, ShowCard.venue_id, venue_id, now)
+
+
+def artist_version(artist_id, now):
+    return _detail_version(Artist, Show.artist_id, ShowCard.artist_id, artist_id, now)
+
+
+def _table_columns(model):
+    return [
+        db.session.query(TableVersion.version)
+        .filter(TableVersion.name == model.__tablename__)
+        .scalar_subquery(),
+        db.session.query(TableVersion.changed_at)
+        .filter(TableVersion.name == model.__tablename__)
+        .scalar_subquery(),
+        db.session.query(func.max(model.updated_at)).scalar_subquery(),
+    ]
+
+
+def _shows_subqueries(now):
+    # Both are a single probe of the updated_at / start_time indexes rather
+    # than an aggregate over every show.
+    return [
+        db.session.query(func.max(Show.updated_at)).scalar_subquery(),
+        db.session.query(func.max(Show.start_time))
+        .filter(Show.start_time <= now)
+        .scalar_subquery(),
+    ]
+
+
+def venues_version(now):
+    return db.session.query(*_table_columns(Venue), *_shows_subqueries(now)).one()
+
+
+def artists_version(now):
+    return db.session.query(*_table_columns(Artist)).one()
+
+
+def shows_version(now):
+    return db.session.query(
+        *_table_columns(Venue), *_table_columns(Artist), *_shows_subqueries(now)
+    ).one()
+
+
+def table_version(model):
+    return (
+        db.session.query(TableVersion.version)
+        .filter(TableVersion.name == model.__tablename__)
+        .scalar()
+    )
+
+
+def bump_versions(connection, *tables):
+    # Also called by bulk paths that write with Core statements.
+    if tables:
+        connection.execute(
+            versions.update()
+            .where(versions.c.name.in_(tables))
+            .values(version=versions.c.version + 1, changed_at=datetime.datetime.now())
+        )
+
+
+def _after_flush(session, flush_context):
+    tables = {
+        obj.__tablename__
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, VERSIONED)
+    }
+    bump_versions(session.connection(), *sorted(tables))
+
+
+def init_versions(app):
+    event.listen(db.session, "after_flush", _after_flush)
+
+
+def _http_time(value):
+    # Naive datetimes in this app are local time; HTTP dates are whole
+    # seconds in UTC.
+    return value.astimezone(datetime.timezone.utc).replace(microsecond=0)
+
+
+def conditional(version_func):
+    # Answers If-None-Match / If-Modified-Since with 304 from the version
+    # query alone; the wrapped view (and its joins and template) only runs
+    # when the client's copy is stale. Must wrap response_cache.cached.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pages render flashed messages, which are not part of the version.
+            if "_flashes" in session:
+                return view(*args, **kwargs)
+
+            now = datetime.datetime.now()
+            version = version_func(*args, now=now, **kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            etag = hashlib.sha1(
+                repr((request.full_path, tuple(version))).encode()
+            ).hexdigest()
+            timestamps = [
+                value for value in version if isinstance(value, datetime.datetime)
+            ]
+            last_modified = _http_time(max(timestamps)) if timestamps else None
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = (
+                    since is not None
+                    and last_modified is not None
+                    and last_modified <= since
+                )
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
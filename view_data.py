@@ -0,0 +1,306 @@
+import datetime
+
+from flask import abort, current_app, request
+
+from cache import cache_tags
+from facets import FLAG_FACETS, VALUE_FACETS, browse_page
+from models import db, Genre, Venue, Artist, Show, ShowCard
+from pagination import cursor_arg, keyset_page, page_args
+from queries import show_partition, upcoming_show_counts, with_genre
+from rollups import buckets, day_counts
+from search import search_page
+
+# The dicts the HTML pages render, shared with the JSON API. fields, when
+# given, is the set of keys the caller wants; only the columns and queries
+# those keys need are loaded. None means everything. List builders return
+# the result rows themselves (named columns, no ORM identity or change
+# tracking) rather than copying each into a dict; the API turns them into
+# dicts with api.project.
+
+VENUE_FIELDS = [
+    "id",
+    "name",
+    "genres",
+    "address",
+    "city",
+    "state",
+    "phone",
+    "website",
+    "facebook_link",
+    "seeking_talent",
+    "seeking_description",
+    "image_link",
+]
+
+ARTIST_FIELDS = [
+    "id",
+    "name",
+    "genres",
+    "city",
+    "state",
+    "phone",
+    "website",
+    "facebook_link",
+    "seeking_venue",
+    "seeking_description",
+    "image_link",
+]
+
+SHOW_FIELDS = [
+    "upcoming_shows",
+    "past_shows",
+    "upcoming_shows_count",
+    "past_shows_count",
+]
+
+# Default and largest /shows/calendar windows, in days.
+CALENDAR_DAYS = 31
+MAX_CALENDAR_DAYS = 366
+
+# Accepted values of the seeking / upcoming browse facets.
+FLAGS = {"1": True, "true": True, "0": False, "false": False}
+
+SHOW_LIST_COLUMNS = {
+    "venue_id": ShowCard.venue_id,
+    "venue_name": ShowCard.venue_name,
+    "artist_id": ShowCard.artist_id,
+    "artist_name": ShowCard.artist_name,
+    "artist_image_link": ShowCard.artist_image_link,
+    "start_time": ShowCard.start_time,
+}
+
+
+def _wanted(fields, name):
+    return fields is None or name in fields
+
+
+def _detail(model, entity_id, entity_fields, entity_column, counterpart, fields):
+    # (response, upcoming page, past page) for a venue or artist page, or
+    # None when it does not exist.
+    columns = [
+        name for name in entity_fields if name != "genres" and _wanted(fields, name)
+    ]
+    entity = (
+        db.session.query(
+            *[getattr(model, name) for name in dict.fromkeys(["id"] + columns)]
+        )
+        .filter(model.id == entity_id)
+        .one_or_none()
+    )
+    if entity is None:
+        return None
+
+    response = {name: getattr(entity, name) for name in columns}
+    if _wanted(fields, "genres"):
+        response["genres"] = [
+            name
+            for name, in db.session.query(Genre.name)
+            .select_from(model)
+            .join(model.genres)
+            .filter(model.id == entity_id)
+            .order_by(Genre.name)
+        ]
+    if not any(_wanted(fields, name) for name in SHOW_FIELDS):
+        return response, None, None
+
+    upcoming_count, past_count, upcoming, past = show_partition(
+        entity_column,
+        entity_id,
+        counterpart,
+        datetime.datetime.now(),
+        current_app.config["PER_PAGE"],
+        upcoming_after=cursor_arg("upcoming_after", (datetime.datetime, int)),
+        past_after=cursor_arg("past_after", (datetime.datetime, int)),
+    )
+    prefix = counterpart.__name__.lower()
+    tag = prefix + ":{}"
+    for key, count, page in (
+        ("upcoming_shows", upcoming_count, upcoming),
+        ("past_shows", past_count, past),
+    ):
+        if _wanted(fields, key + "_count"):
+            response[key + "_count"] = count
+        if not _wanted(fields, key):
+            continue
+        response[key] = []
+        for show in page.items:
+            cache_tags(tag.format(show.counterpart_id))
+            response[key].append(
+                {
+                    prefix + "_id": show.counterpart_id,
+                    prefix + "_name": show.counterpart_name,
+                    prefix + "_image_link": show.counterpart_image_link,
+                    "start_time": show.start_time,
+                }
+            )
+    return response, upcoming, past
+
+
+def venue_detail(venue_id, fields=None):
+    return _detail(Venue, venue_id, VENUE_FIELDS, Show.venue_id, Artist, fields)
+
+
+def artist_detail(artist_id, fields=None):
+    return _detail(Artist, artist_id, ARTIST_FIELDS, Show.artist_id, Venue, fields)
+
+
+def search_results(model, term):
+    # (response, page) for a venue or artist search; page is None for an
+    # empty term.
+    response = {"count": 0, "data": []}
+    if not term:
+        return response, None
+    page, response["count"] = search_page(model, term)
+    counts = upcoming_show_counts(model, [row.id for row in page.items])
+    for row in page.items:
+        response["data"].append(
+            {"id": row.id, "name": row.name, "num_upcoming_shows": counts[row.id]}
+        )
+    return response, page
+
+
+def artist_list(genre=None):
+    # (artists, page) for the current cursor; artists are (id, name) rows.
+    after, before, per_page = page_args((int,))
+    query = db.session.query(Artist.id, Artist.name)
+    if genre:
+        query = with_genre(query, Artist, genre)
+    page = keyset_page(
+        query, [Artist.id], lambda artist: (artist.id,), after, before, per_page
+    )
+    return page.items, page
+
+
+def show_fields(fields=None):
+    # The SHOW_LIST_COLUMNS keys wanted, in order.
+    return [name for name in SHOW_LIST_COLUMNS if _wanted(fields, name)]
+
+
+def show_list(fields=None, start=None, end=None, city=None, state=None):
+    # (shows, page) for the current cursor, optionally only those starting
+    # in [start, end) at venues in city / state, read from show_cards alone.
+    # Rows always carry id, start_time, venue_id and artist_id (the cursor
+    # and the cache tags need them) besides the wanted show_fields.
+    after, before, per_page = page_args((datetime.datetime, int))
+    names = show_fields(fields)
+    query = db.session.query(
+        *[SHOW_LIST_COLUMNS[name].label(name) for name in names],
+        *[
+            SHOW_LIST_COLUMNS[name]
+            for name in ("start_time", "venue_id", "artist_id")
+            if name not in names
+        ],
+        ShowCard.show_id.label("id"),
+    )
+    if city:
+        query = query.filter(ShowCard.venue_city == city)
+    if state:
+        query = query.filter(ShowCard.venue_state == state)
+    if start is not None:
+        query = query.filter(ShowCard.start_time >= start)
+    if end is not None:
+        query = query.filter(ShowCard.start_time < end)
+    page = keyset_page(
+        query,
+        [ShowCard.start_time, ShowCard.show_id],
+        lambda row: (row.start_time, row.id),
+        after,
+        before,
+        per_page,
+    )
+    for row in page.items:
+        cache_tags("venue:{}".format(row.venue_id), "artist:{}".format(row.artist_id))
+    return page.items, page
+
+
+def calendar_args():
+    # (start, end, bucket, city, state) from the query string. from and to
+    # are ISO dates, to inclusive; end is the day after it.
+    try:
+        start = datetime.date.fromisoformat(
+            request.args.get("from") or datetime.date.today().isoformat()
+        )
+        end = datetime.date.fromisoformat(
+            request.args.get("to")
+            or (start + datetime.timedelta(days=CALENDAR_DAYS - 1)).isoformat()
+        ) + datetime.timedelta(days=1)
+    except ValueError:
+        abort(400, "from and to must be dates (YYYY-MM-DD).")
+    if not 0 < (end - start).days <= MAX_CALENDAR_DAYS:
+        abort(400, "to must be after from, at most {} days.".format(MAX_CALENDAR_DAYS))
+    bucket = request.args.get("bucket", "day")
+    if bucket not in ("day", "week"):
+        abort(400, "bucket must be day or week.")
+    return start, end, bucket, request.args.get("city"), request.args.get("state")
+
+
+def show_calendar(start, end, bucket="day", city=None, state=None, fields=None):
+    # Per-day or per-week show counts for start <= day < end, from the
+    # show_days rollup, and the first page of the shows themselves. "to" is
+    # the last day, as the caller gave it.
+    counts = day_counts(start, end, city or None, state or None)
+    shows, page = show_list(
+        fields,
+        datetime.datetime.combine(start, datetime.time()),
+        datetime.datetime.combine(end, datetime.time()),
+        city or None,
+        state or None,
+    )
+    response = {
+        "from": start,
+        "to": end - datetime.timedelta(days=1),
+        "bucket": bucket,
+        "total": sum(counts.values()),
+        "buckets": buckets(start, end, bucket, counts),
+        "shows": shows,
+    }
+    return response, page
+
+
+def browse_args():
+    # Facet selections from the query string: state, city and genre may be
+    # repeated (any of the values matches), seeking and upcoming are 1 or 0.
+    selected = {facet: set(request.args.getlist(facet)) for facet in VALUE_FACETS}
+    for facet in FLAG_FACETS:
+        value = request.args.get(facet)
+        if value:
+            if value.lower() not in FLAGS:
+                abort(400, "{} must be 1 or 0.".format(facet))
+            selected[facet] = FLAGS[value.lower()]
+    return selected
+
+
+def browse(model, selected):
+    # (response, page) for venues or artists matching every selected facet,
+    # in id order, with the count each facet value would have next to the
+    # other facets' selections.
+    page, total, counts = browse_page(model, selected, *page_args((int,)))
+    rows = {
+        row.id: row
+        for row in db.session.query(
+            model.id, model.name, model.city, model.state, model.upcoming_show_count
+        ).filter(model.id.in_(page.items))
+    }
+    response = {"count": total, "data": [], "facets": {}}
+    for id in page.items:
+        row = rows.get(id)
+        if row is None:
+            # Deleted since the index was last patched.
+            continue
+        response["data"].append(
+            {
+                "id": id,
+                "name": row.name,
+                "city": row.city,
+                "state": row.state,
+                "num_upcoming_shows": row.upcoming_show_count,
+            }
+        )
+    for facet, values in counts.items():
+        response["facets"][facet] = [
+            {"value": value, "count": count}
+            for value, count in sorted(
+                values.items(), key=lambda item: (-item[1], item[0])
+            )
+        ]
+    return response, page